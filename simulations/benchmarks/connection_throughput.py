@@ -0,0 +1,157 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Measure how much of the simulator's CPU time receiving messages takes.
+
+Client connections in a separate process each send insert order messages
+to a Connection server at a fixed rate (10,000 messages a second by
+default) in batches every millisecond, written in small pieces so that
+messages straddle reads. The server's CPU time per message and the rate it
+received messages at are printed when the clients are done.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import pathlib
+import socket
+import sys
+import time
+
+from typing import Optional, Tuple
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from ready_trader_go.messages import (  # noqa: E402
+    HEADER,
+    INSERT_MESSAGE,
+    INSERT_MESSAGE_SIZE,
+    Connection,
+    MessageType,
+)
+
+# Size of the pieces each batch of messages is written in
+PIECE_SIZE = 97
+
+
+def send_messages(
+    address: Tuple[str, int], connections: int, rate: int, seconds: float
+) -> None:
+    """Send insert order messages to the server at rate messages per second
+    on each of a number of connections."""
+    sockets = [socket.create_connection(address) for _ in range(connections)]
+    per_batch: int = max(1, rate // 1000)
+    batch: bytes = b"".join(
+        HEADER.pack(INSERT_MESSAGE_SIZE, MessageType.INSERT_ORDER)
+        + INSERT_MESSAGE.pack(i + 1, 0, 100, 1, 0)
+        for i in range(per_batch)
+    )
+
+    start: float = time.perf_counter()
+    sent: int = 0
+    while sent < rate * seconds:
+        for sock in sockets:
+            for i in range(0, len(batch), PIECE_SIZE):
+                sock.sendall(batch[i : i + PIECE_SIZE])
+        sent += per_batch
+        delay: float = start + sent / rate - time.perf_counter()
+        if delay > 0.0:
+            time.sleep(delay)
+
+    for sock in sockets:
+        sock.close()
+
+
+class CountingConnection(Connection):
+    """A connection that decodes and counts insert order messages."""
+
+    count: int = 0
+    first_time: float = 0.0
+    last_time: float = 0.0
+    remaining: int = 0
+    done: Optional[asyncio.Future] = None
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        """Called when a client closes its connection."""
+        Connection.connection_lost(self, exc)
+        CountingConnection.remaining -= 1
+        if CountingConnection.remaining == 0:
+            CountingConnection.done.set_result(None)
+
+    def on_message(self, typ: int, data: bytes, start: int, length: int) -> None:
+        """Called when a message is received."""
+        INSERT_MESSAGE.unpack_from(data, start)
+        if CountingConnection.count == 0:
+            CountingConnection.first_time = time.perf_counter()
+        CountingConnection.last_time = time.perf_counter()
+        CountingConnection.count += 1
+
+
+async def run(connections: int, rate: int, seconds: float) -> None:
+    """Run the benchmark and print the results."""
+    loop = asyncio.get_running_loop()
+    CountingConnection.done = loop.create_future()
+    CountingConnection.remaining = connections
+    server = await loop.create_server(CountingConnection, "127.0.0.1", 0)
+
+    client = multiprocessing.Process(
+        target=send_messages,
+        args=(server.sockets[0].getsockname()[:2], connections, rate, seconds),
+    )
+    cpu_time: float = time.process_time()
+    client.start()
+    await CountingConnection.done
+    cpu_time = time.process_time() - cpu_time
+    client.join()
+    server.close()
+
+    count: int = CountingConnection.count
+    elapsed: float = CountingConnection.last_time - CountingConnection.first_time
+    print(
+        "connections=%d messages=%d received_rate=%.0f/s per_connection=%.0f/s"
+        " server_cpu=%.3fs (%.1f%% of one core) per_message=%.2fus"
+        % (
+            connections,
+            count,
+            count / elapsed if elapsed else 0.0,
+            count / elapsed / connections if elapsed else 0.0,
+            cpu_time,
+            100.0 * cpu_time / elapsed if elapsed else 0.0,
+            1e6 * cpu_time / count if count else 0.0,
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--connections", type=int, default=1, help="number of client connections"
+    )
+    parser.add_argument(
+        "--rate",
+        type=int,
+        default=10000,
+        help="messages sent per second on each connection",
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=5.0, help="how long to send messages for"
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.connections, args.rate, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Measure the round trip time of the execution channel over TCP and over a
+Unix domain socket.
+
+A client in a separate process sends an insert order message and waits for
+the order filled and order status messages a Connection server replies
+with, one request at a time. The mean, 50th and 99th percentile round trip
+times are printed for each type of socket.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import pathlib
+import socket
+import sys
+import tempfile
+import time
+
+from typing import List, Optional
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from ready_trader_go.messages import (  # noqa: E402
+    EXECUTION_TYPES,
+    HEADER,
+    INSERT_MESSAGE,
+    INSERT_MESSAGE_SIZE,
+    MESSAGES,
+    ORDER_FILLED_MESSAGE_SIZE,
+    ORDER_STATUS_MESSAGE_SIZE,
+    Connection,
+    MessageType,
+)
+
+# Share of the requests sent first whose round trips are not counted
+WARM_UP_SHARE = 0.1
+
+
+def send_requests(kind: str, address, requests: int, results) -> None:
+    """Send insert order messages one at a time and put the round trip
+    times in nanoseconds on the results queue."""
+    if kind == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+    else:
+        sock = socket.create_connection(address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    request: bytes = HEADER.pack(
+        INSERT_MESSAGE_SIZE, MessageType.INSERT_ORDER
+    ) + INSERT_MESSAGE.pack(1, 0, 100, 1, 0)
+    reply_size: int = ORDER_FILLED_MESSAGE_SIZE + ORDER_STATUS_MESSAGE_SIZE
+    times: List[int] = list()
+    for _ in range(requests):
+        start: int = time.perf_counter_ns()
+        sock.sendall(request)
+        received: int = 0
+        while received < reply_size:
+            received += len(sock.recv(65536))
+        times.append(time.perf_counter_ns() - start)
+
+    sock.close()
+    results.put(times[int(requests * WARM_UP_SHARE) :])
+
+
+class ReplyingConnection(Connection):
+    """A connection that replies to every message with an order filled and
+    an order status message, as an insert that trades would get."""
+
+    done: Optional[asyncio.Future] = None
+
+    def __init__(self):
+        """Initialise a new instance of the ReplyingConnection class."""
+        Connection.__init__(self)
+        self.__order_filled_message = MESSAGES[MessageType.ORDER_FILLED].new_message()
+        self.__order_status_message = MESSAGES[MessageType.ORDER_STATUS].new_message()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        """Called when the client closes its connection."""
+        Connection.connection_lost(self, exc)
+        ReplyingConnection.done.set_result(None)
+
+    def on_message(self, typ: int, data: bytes, start: int, length: int) -> None:
+        """Called when a message is received."""
+        self._write(self.__order_filled_message)
+        self._write(self.__order_status_message)
+
+
+async def run(kind: str, requests: int) -> None:
+    """Run the benchmark for one type of socket and print the results."""
+    loop = asyncio.get_running_loop()
+    ReplyingConnection.done = loop.create_future()
+    with tempfile.TemporaryDirectory() as directory:
+        if kind == "unix":
+            address = os.path.join(directory, "exchange.sock")
+            server = await loop.create_unix_server(ReplyingConnection, address)
+        else:
+            server = await loop.create_server(ReplyingConnection, "127.0.0.1", 0)
+            address = server.sockets[0].getsockname()[:2]
+
+        results = multiprocessing.Queue()
+        client = multiprocessing.Process(
+            target=send_requests, args=(kind, address, requests, results)
+        )
+        client.start()
+        await ReplyingConnection.done
+        times: List[int] = sorted(results.get())
+        client.join()
+        server.close()
+
+    print(
+        "%-4s requests=%d mean=%.1fus p50=%.1fus p99=%.1fus"
+        % (
+            kind,
+            len(times),
+            sum(times) / len(times) / 1000.0,
+            times[len(times) // 2] / 1000.0,
+            times[int(len(times) * 0.99)] / 1000.0,
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--requests", type=int, default=20000, help="requests sent for each type"
+    )
+    parser.add_argument(
+        "--type",
+        choices=EXECUTION_TYPES,
+        action="append",
+        help="type of socket to measure (default: all)",
+    )
+    args = parser.parse_args()
+    for kind in args.type or EXECUTION_TYPES:
+        asyncio.run(run(kind, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+"""Measure how long reading a market data file in each format takes.
+
+A CSV market data file is copied into a temporary directory, compressed
+with gzip, xz and bzip2 and converted to the binary format. Each copy is
+then read in a process of its own and the wall time, the peak resident
+set size of that process and the number of market seconds read per
+second are printed.
+"""
+import argparse
+import bz2
+import gzip
+import lzma
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from ready_trader_go.market_data import (  # noqa: E402
+    BINARY_MARKET_DATA_SUFFIX,
+    convert_market_data_file,
+)
+from ready_trader_go.market_events import read_market_events  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+COMPRESSORS = {".gz": gzip.open, ".xz": lzma.open, ".bz2": bz2.open}
+
+
+def peak_rss_megabytes() -> float:
+    """Return the peak resident set size of this process in megabytes."""
+    if resource is None:
+        return float("nan")
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def read(filename: str) -> None:
+    """Read every event in a market data file and print the results."""
+    start: float = time.perf_counter()
+    count: int = 0
+    market_time: float = 0.0
+    for event in read_market_events(filename):
+        count += 1
+        market_time = event.time
+    elapsed: float = time.perf_counter() - start
+
+    print(
+        "%-20s events=%d wall=%.3fs peak_rss=%.0fMB speed=%.0fx"
+        % (
+            pathlib.Path(filename).name,
+            count,
+            elapsed,
+            peak_rss_megabytes(),
+            market_time / elapsed if elapsed else 0.0,
+        ),
+        flush=True,
+    )
+
+
+def prepare(source: pathlib.Path, directory: pathlib.Path) -> None:
+    """Write the market data file in each format into a directory."""
+    csv_path = directory / "market_data.csv"
+    shutil.copyfile(source, csv_path)
+    for suffix, opener in COMPRESSORS.items():
+        with csv_path.open("rb") as plain, opener(
+            csv_path.with_name(csv_path.name + suffix), "wb"
+        ) as compressed:
+            shutil.copyfileobj(plain, compressed)
+    convert_market_data_file(csv_path)
+
+
+def run(source: pathlib.Path) -> None:
+    """Write the market data file in each format and read each copy."""
+    with tempfile.TemporaryDirectory() as directory:
+        # The peak resident set size of a process is inherited by its
+        # children on Linux, so everything memory hungry (such as xz
+        # compression) happens in a process of its own
+        subprocess.run(
+            [sys.executable, __file__, "--prepare", directory, str(source)],
+            check=True,
+        )
+        for name in (
+            ["market_data.csv"]
+            + ["market_data.csv" + suffix for suffix in COMPRESSORS]
+            + ["market_data" + BINARY_MARKET_DATA_SUFFIX]
+        ):
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--read",
+                    str(pathlib.Path(directory, name)),
+                ],
+                check=True,
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "filename", type=pathlib.Path, help="CSV market data file to read"
+    )
+    parser.add_argument(
+        "--prepare",
+        metavar="DIRECTORY",
+        type=pathlib.Path,
+        help="just write the file in each format (used by the benchmark itself)",
+    )
+    parser.add_argument(
+        "--read",
+        action="store_true",
+        help="just read the given file (used by the benchmark itself)",
+    )
+    args = parser.parse_args()
+    if args.prepare is not None:
+        prepare(args.filename, args.prepare)
+    elif args.read:
+        read(str(args.filename))
+    else:
+        run(args.filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -22,18 +22,44 @@ import pathlib
 import signal
 import sys
 
-from typing import Callable, Optional
+from typing import Any, Callable, Optional
 
 
 class Application(object):
     """Standard application setup."""
 
-    def __init__(self, name: str, config_validator: Optional[Callable] = None):
-        """Initialise a new instance of the Application class."""
-        self.event_loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    def __init__(
+        self,
+        name: str,
+        config_validator: Optional[Callable] = None,
+        event_loop_factory: Optional[Callable[[Any], asyncio.AbstractEventLoop]] = None,
+    ):
+        """Initialise a new instance of the Application class.
+
+        If given, the event loop factory is called with the configuration to
+        create the application's event loop.
+        """
         self.logger = logging.getLogger("APP")
         self.name: str = name
 
+        self.config = None
+        config_path = pathlib.Path(name + ".json")
+        if config_path.exists():
+            with config_path.open("r") as config:
+                self.config = json.load(config)
+            if config_validator is not None and not config_validator(self.config):
+                raise Exception(
+                    "configuration failed validation: %s" % config_path.resolve()
+                )
+        elif config_validator is not None:
+            raise Exception("configuration file does not exist: %s" % str(config_path))
+
+        if event_loop_factory is not None:
+            self.event_loop: asyncio.AbstractEventLoop = event_loop_factory(self.config)
+            asyncio.set_event_loop(self.event_loop)
+        else:
+            self.event_loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+
         # Turn on debugging if you're having trouble with the event loop
         # self.event_loop.set_debug(True)
 
@@ -48,18 +74,6 @@ class Application(object):
             # Signal handlers are only implemented on Unix
             pass
 
-        self.config = None
-        config_path = pathlib.Path(name + ".json")
-        if config_path.exists():
-            with config_path.open("r") as config:
-                self.config = json.load(config)
-            if config_validator is not None and not config_validator(self.config):
-                raise Exception(
-                    "configuration failed validation: %s" % config_path.resolve()
-                )
-        elif config_validator is not None:
-            raise Exception("configuration file does not exist: %s" % str(config_path))
-
         logging.basicConfig(
             filename=f"{name}.log",
             format="%(asctime)s [%(levelname)-7s] [%(name)s] %(message)s",
@@ -25,31 +25,17 @@ from .messages import (
     AMEND_MESSAGE_SIZE,
     CANCEL_MESSAGE,
     CANCEL_MESSAGE_SIZE,
-    ERROR_MESSAGE,
-    ERROR_MESSAGE_SIZE,
     HEDGE_MESSAGE,
     HEDGE_MESSAGE_SIZE,
-    HEDGE_FILLED_MESSAGE,
-    HEDGE_FILLED_MESSAGE_SIZE,
     INSERT_MESSAGE,
     INSERT_MESSAGE_SIZE,
     LOGIN_MESSAGE,
     LOGIN_MESSAGE_SIZE,
-    ORDER_BOOK_HEADER,
-    ORDER_BOOK_HEADER_SIZE,
-    ORDER_BOOK_MESSAGE_SIZE,
-    BOOK_PART,
-    ORDER_FILLED_MESSAGE,
-    ORDER_FILLED_MESSAGE_SIZE,
-    ORDER_STATUS_MESSAGE,
-    ORDER_STATUS_MESSAGE_SIZE,
-    TRADE_TICKS_HEADER,
-    TRADE_TICKS_HEADER_SIZE,
-    TRADE_TICKS_MESSAGE_SIZE,
-    TICKS_PART,
     Connection,
+    DispatchTable,
     MessageType,
     Subscription,
+    dispatch_table,
 )
 from .types import Lifespan, Side
 
@@ -67,6 +53,21 @@ class BaseAutoTrader(Connection, Subscription):
         self.team_name: bytes = team_name.encode()
         self.secret: bytes = secret.encode()
 
+        self.__execution_dispatch: DispatchTable = dispatch_table(
+            {
+                MessageType.ERROR: self.__on_error_message,
+                MessageType.HEDGE_FILLED: self.on_hedge_filled_message,
+                MessageType.ORDER_FILLED: self.on_order_filled_message,
+                MessageType.ORDER_STATUS: self.on_order_status_message,
+            }
+        )
+        self.__information_dispatch: DispatchTable = dispatch_table(
+            {
+                MessageType.ORDER_BOOK_UPDATE: self.on_order_book_update_message,
+                MessageType.TRADE_TICKS: self.on_trade_ticks_message,
+            }
+        )
+
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         """Called twice, when the execution connection and the information channel are established."""
         if transport.get_extra_info("peername") is not None:
@@ -94,16 +95,9 @@ class BaseAutoTrader(Connection, Subscription):
 
     def on_datagram(self, typ: int, data: bytes, start: int, length: int) -> None:
         """Called when an information message is received from the matching engine."""
-        if typ == MessageType.ORDER_BOOK_UPDATE and length == ORDER_BOOK_MESSAGE_SIZE:
-            inst, seq = ORDER_BOOK_HEADER.unpack_from(data, start)
-            self.on_order_book_update_message(
-                inst, seq, *BOOK_PART.iter_unpack(data[ORDER_BOOK_HEADER_SIZE:])
-            )
-        elif typ == MessageType.TRADE_TICKS and length == TRADE_TICKS_MESSAGE_SIZE:
-            inst, seq = TRADE_TICKS_HEADER.unpack_from(data, start)
-            self.on_trade_ticks_message(
-                inst, seq, *TICKS_PART.iter_unpack(data[TRADE_TICKS_HEADER_SIZE:])
-            )
+        entry = self.__information_dispatch.get(typ)
+        if entry is not None and entry[0] == length:
+            entry[2](*entry[1](data, start))
         else:
             self.logger.error(
                 "received invalid information message: length=%d type=%d", length, typ
@@ -122,21 +116,19 @@ class BaseAutoTrader(Connection, Subscription):
 
     def on_message(self, typ: int, data: bytes, start: int, length: int) -> None:
         """Called when an execution message is received from the matching engine."""
-        if typ == MessageType.ERROR and length == ERROR_MESSAGE_SIZE:
-            client_order_id, error_message = ERROR_MESSAGE.unpack_from(data, start)
-            self.on_error_message(client_order_id, error_message.rstrip(b"\x00"))
-        elif typ == MessageType.HEDGE_FILLED and length == HEDGE_FILLED_MESSAGE_SIZE:
-            self.on_hedge_filled_message(*HEDGE_FILLED_MESSAGE.unpack_from(data, start))
-        elif typ == MessageType.ORDER_FILLED and length == ORDER_FILLED_MESSAGE_SIZE:
-            self.on_order_filled_message(*ORDER_FILLED_MESSAGE.unpack_from(data, start))
-        elif typ == MessageType.ORDER_STATUS and length == ORDER_STATUS_MESSAGE_SIZE:
-            self.on_order_status_message(*ORDER_STATUS_MESSAGE.unpack_from(data, start))
+        entry = self.__execution_dispatch.get(typ)
+        if entry is not None and entry[0] == length:
+            entry[2](*entry[1](data, start))
         else:
             self.logger.error(
                 "received invalid execution message: length=%d type=%d", length, typ
             )
             self.event_loop.stop()
 
+    def __on_error_message(self, client_order_id: int, error_message: bytes) -> None:
+        """Called when an error message is received."""
+        self.on_error_message(client_order_id, error_message.rstrip(b"\x00"))
+
     def on_error_message(self, client_order_id: int, error_message: bytes):
         """Called when the matching engine detects an error."""
 
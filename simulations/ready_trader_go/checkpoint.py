@@ -0,0 +1,384 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import bisect
+import itertools
+import os
+import struct
+
+from typing import BinaryIO, Dict, List, Optional
+
+from .competitor import Competitor, CompetitorManager
+from .market_events import MarketEventsReader, read_market_events
+from .match_events import MatchEvents
+from .order_book import IOrderListener, Order, OrderBook
+from .types import Instrument, Lifespan, Side
+
+# A checkpoint file contains a header, a record for each order book followed
+# by the orders resting in it (in time priority) and then a record for each
+# competitor. Orders are owned by the market (the market events reader) or
+# by a competitor, numbered from one in the order in which they appear.
+CHECKPOINT_MAGIC = b"RTGC"
+CHECKPOINT_VERSION = 1
+
+MARKET_OWNER = 0
+NO_OWNER = 0xFFFF
+NO_PRICE = -(2**63)
+NO_TIME = -1.0
+
+# Magic, version, market time, market events applied and competitor count
+CHECKPOINT_HEADER = struct.Struct("!4sHdQH")
+# Instrument, version, last traded price and resting order count
+BOOK_RECORD = struct.Struct("!BQqI")
+# Owner, client order id, lifespan, side, price, volume, remaining and fees
+ORDER_RECORD = struct.Struct("!HQBBqIIq")
+# Name, last client order id, active volume, breached, account balance,
+# buy volume, ETF position, future position, max drawdown, max profit,
+# profit or loss, sell volume, total fees, relative position and unhedged
+# lots time remaining
+COMPETITOR_RECORD = struct.Struct("!50sqq?qqqqqqqqqqd")
+
+# A market data index is a sidecar file (named after the market data file
+# with INDEX_SUFFIX appended) holding a header and an entry every
+# INDEX_INTERVAL seconds of market time. Each entry records the number of
+# market events that occur before its time followed by a book record and
+# the resting (market) orders for each order book at that time.
+INDEX_MAGIC = b"RTGI"
+INDEX_VERSION = 1
+INDEX_INTERVAL = 60.0
+INDEX_SUFFIX = ".idx"
+
+# Magic, version, market data file size and modification time (in
+# nanoseconds) and the interval between entries
+INDEX_HEADER = struct.Struct("!4sHQqd")
+# Market time and market events applied
+INDEX_ENTRY = struct.Struct("!dQ")
+
+
+class CheckpointError(Exception):
+    """Raised when a checkpoint file cannot be restored."""
+
+
+def __read(file: BinaryIO, record: struct.Struct) -> tuple:
+    """Read and unpack a single record from the file."""
+    data = file.read(record.size)
+    if len(data) != record.size:
+        raise CheckpointError("checkpoint file is truncated")
+    return record.unpack(data)
+
+
+def __write_book(file: BinaryIO, book: OrderBook, owners: Dict[int, int]) -> None:
+    """Write an order book record followed by the orders resting in it."""
+    orders: List[Order] = list(book.resting_orders())
+    last_traded_price: Optional[int] = book.last_traded_price()
+    file.write(
+        BOOK_RECORD.pack(
+            book.instrument,
+            book.version,
+            last_traded_price if last_traded_price is not None else NO_PRICE,
+            len(orders),
+        )
+    )
+    file.write(
+        b"".join(
+            ORDER_RECORD.pack(
+                owners.get(id(o.listener), NO_OWNER),
+                o.client_order_id,
+                o.lifespan,
+                o.side,
+                o.price,
+                o.volume,
+                o.remaining_volume,
+                o.total_fees,
+            )
+            for o in orders
+        )
+    )
+
+
+def __read_book(file: BinaryIO, book: OrderBook) -> tuple:
+    """Read an order book record and its orders, returning the book version,
+    last traded price and a list of unpacked order records.
+    """
+    instrument, book_version, last_traded_price, order_count = __read(file, BOOK_RECORD)
+    if instrument != book.instrument:
+        raise CheckpointError("order books are out of sequence")
+    data = file.read(ORDER_RECORD.size * order_count)
+    if len(data) != ORDER_RECORD.size * order_count:
+        raise CheckpointError("checkpoint file is truncated")
+    return (
+        book_version,
+        None if last_traded_price == NO_PRICE else last_traded_price,
+        list(ORDER_RECORD.iter_unpack(data)),
+    )
+
+
+def __restore_book(
+    book: OrderBook,
+    state: tuple,
+    listeners: List[IOrderListener],
+    market_orders: Dict[int, Order],
+) -> None:
+    """Place the orders read by __read_book into an empty order book."""
+    book_version, last_traded_price, records = state
+    orders: List[Order] = list()
+    for owner, order_id, lifespan, side, price, volume, remaining, fees in records:
+        listener = listeners[owner] if owner < len(listeners) else None
+        order = Order(
+            order_id,
+            book.instrument,
+            Lifespan(lifespan),
+            Side(side),
+            price,
+            volume,
+            listener,
+        )
+        order.remaining_volume = remaining
+        order.total_fees = fees
+        orders.append(order)
+
+        if owner == MARKET_OWNER:
+            market_orders[order_id] = order
+        elif isinstance(listener, Competitor):
+            listener.orders[order_id] = order
+            if order.side == Side.BUY:
+                bisect.insort(listener.buy_prices, order.price)
+            else:
+                bisect.insort(listener.sell_prices, -order.price)
+    book.restore(orders, last_traded_price, book_version)
+
+
+def write_checkpoint(
+    file: BinaryIO,
+    now: float,
+    future_book: OrderBook,
+    etf_book: OrderBook,
+    market_events_reader: MarketEventsReader,
+    competitor_manager: CompetitorManager,
+) -> None:
+    """Write the state of a match in progress to a binary file."""
+    competitors: List[Competitor] = list(competitor_manager.get_competitors())
+    owners: Dict[int, int] = {id(market_events_reader): MARKET_OWNER}
+    for i, competitor in enumerate(competitors, 1):
+        owners[id(competitor)] = i
+
+    file.write(
+        CHECKPOINT_HEADER.pack(
+            CHECKPOINT_MAGIC,
+            CHECKPOINT_VERSION,
+            now,
+            market_events_reader.event_count,
+            len(competitors),
+        )
+    )
+
+    for book in (future_book, etf_book):
+        __write_book(file, book, owners)
+
+    for competitor in competitors:
+        account = competitor.account
+        remaining_time = competitor.unhedged_etf_lots.remaining_time()
+        file.write(
+            COMPETITOR_RECORD.pack(
+                competitor.name.encode(),
+                competitor.last_client_order_id,
+                competitor.active_volume,
+                competitor.status != "OK",
+                account.account_balance,
+                account.buy_volume,
+                account.etf_position,
+                account.future_position,
+                account.max_drawdown,
+                account.max_profit,
+                account.profit_or_loss,
+                account.sell_volume,
+                account.total_fees,
+                competitor.unhedged_etf_lots.relative_position,
+                remaining_time if remaining_time is not None else NO_TIME,
+            )
+        )
+
+
+def read_checkpoint(
+    file: BinaryIO,
+    future_book: OrderBook,
+    etf_book: OrderBook,
+    market_events_reader: MarketEventsReader,
+    competitor_manager: CompetitorManager,
+) -> float:
+    """Restore the state of a match from a binary file and return the market
+    time at which the checkpoint was taken.
+
+    The order books must be empty and the market events reader must not have
+    been started. Competitors are restored in a disconnected state, ready for
+    their auto-traders to log in.
+    """
+    magic, version, now, event_count, competitor_count = __read(file, CHECKPOINT_HEADER)
+    if magic != CHECKPOINT_MAGIC:
+        raise CheckpointError("not a checkpoint file")
+    if version != CHECKPOINT_VERSION:
+        raise CheckpointError("unsupported checkpoint version: %d" % version)
+
+    books: List[OrderBook] = [future_book, etf_book]
+    book_states: List[tuple] = [__read_book(file, book) for book in books]
+
+    listeners: List[IOrderListener] = [market_events_reader]
+    for _ in range(competitor_count):
+        (
+            name,
+            last_client_order_id,
+            active_volume,
+            breached,
+            *account_fields,
+            relative_position,
+            remaining_time,
+        ) = __read(file, COMPETITOR_RECORD)
+        competitor = competitor_manager.restore_competitor(name.rstrip(b"\0").decode())
+        competitor.last_client_order_id = last_client_order_id
+        competitor.active_volume = active_volume
+        competitor.status = "BREACH" if breached else "OK"
+        account = competitor.account
+        (
+            account.account_balance,
+            account.buy_volume,
+            account.etf_position,
+            account.future_position,
+            account.max_drawdown,
+            account.max_profit,
+            account.profit_or_loss,
+            account.sell_volume,
+            account.total_fees,
+        ) = account_fields
+        competitor.unhedged_etf_lots.restore(
+            relative_position, None if remaining_time < 0.0 else remaining_time
+        )
+        listeners.append(competitor)
+
+    for book, state, market_orders in zip(
+        books,
+        book_states,
+        (market_events_reader.future_orders, market_events_reader.etf_orders),
+    ):
+        __restore_book(book, state, listeners, market_orders)
+
+    market_events_reader.event_count = event_count
+    return now
+
+
+def market_index_filename(market_data_filename: str) -> str:
+    """Return the name of the index file for a market data file."""
+    return market_data_filename + INDEX_SUFFIX
+
+
+def __market_data_stamp(market_data_filename: str) -> tuple:
+    """Return the size and modification time of a market data file."""
+    stat = os.stat(market_data_filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_market_index(
+    file: BinaryIO, market_data_filename: str, interval: float = INDEX_INTERVAL
+) -> int:
+    """Replay a market data file and write an index of it to a binary file,
+    returning the number of entries written.
+    """
+    future_book = OrderBook(Instrument.FUTURE, 0.0, 0.0)
+    etf_book = OrderBook(Instrument.ETF, 0.0, 0.0)
+    reader = MarketEventsReader(
+        market_data_filename, None, future_book, etf_book, MatchEvents()
+    )
+    owners: Dict[int, int] = {id(reader): MARKET_OWNER}
+
+    size, mtime = __market_data_stamp(market_data_filename)
+    file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, size, mtime, interval))
+
+    events = read_market_events(market_data_filename)
+    evt = next(events, None)
+    entry_time: float = interval
+    entry_count: int = 0
+    while evt is not None:
+        evt = reader.replay(itertools.chain((evt,), events), entry_time)
+        file.write(INDEX_ENTRY.pack(entry_time, reader.event_count))
+        for book in (future_book, etf_book):
+            __write_book(file, book, owners)
+        entry_time += interval
+        entry_count += 1
+
+    return entry_count
+
+
+def build_market_index(
+    market_data_filename: str, interval: float = INDEX_INTERVAL
+) -> str:
+    """Write the index file for a market data file and return its name."""
+    filename: str = market_index_filename(market_data_filename)
+    with open(filename, "wb") as index:
+        write_market_index(index, market_data_filename, interval)
+    return filename
+
+
+def read_market_index(
+    file: BinaryIO,
+    start_time: float,
+    future_book: OrderBook,
+    etf_book: OrderBook,
+    market_events_reader: MarketEventsReader,
+) -> float:
+    """Restore the order books from the last index entry at or before the
+    given market time and return the time of that entry.
+
+    The order books must be empty and the market events reader must not have
+    been started. If the index has no such entry, nothing is restored and
+    zero is returned. Raises CheckpointError if the index does not match the
+    market data file.
+    """
+    magic, version, size, mtime, _ = __read(file, INDEX_HEADER)
+    if magic != INDEX_MAGIC:
+        raise CheckpointError("not a market data index file")
+    if version != INDEX_VERSION:
+        raise CheckpointError("unsupported market data index version: %d" % version)
+    if (size, mtime) != __market_data_stamp(market_events_reader.filename):
+        raise CheckpointError("market data index is out of date")
+
+    books: List[OrderBook] = [future_book, etf_book]
+    entry_time: float = 0.0
+    event_count: int = 0
+    entry_offset: Optional[int] = None
+    data = file.read(INDEX_ENTRY.size)
+    while len(data) == INDEX_ENTRY.size:
+        time, count = INDEX_ENTRY.unpack(data)
+        if time > start_time:
+            break
+        entry_time, event_count, entry_offset = time, count, file.tell()
+        for _ in books:
+            order_count = __read(file, BOOK_RECORD)[3]
+            file.seek(ORDER_RECORD.size * order_count, os.SEEK_CUR)
+        data = file.read(INDEX_ENTRY.size)
+
+    if entry_offset is None:
+        return 0.0
+
+    file.seek(entry_offset)
+    for book, market_orders in zip(
+        books, (market_events_reader.future_orders, market_events_reader.etf_orders)
+    ):
+        __restore_book(
+            book, __read_book(file, book), [market_events_reader], market_orders
+        )
+
+    market_events_reader.event_count = event_count
+    return entry_time
@@ -17,10 +17,12 @@
 #     <https://www.gnu.org/licenses/>.
 import bisect
 import logging
+import time
 
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from .account import AccountFactory, CompetitorAccount
+from .latency import ORDER_BOOK, LatencyRecorder
 from .match_events import MatchEvents
 from .order_book import IOrderListener, Order, OrderBook, MINIMUM_BID, MAXIMUM_ASK
 from .score_board import ScoreBoardWriter
@@ -39,6 +41,8 @@ from .unhedged_lots import UnhedgedLots, UnhedgedLotsFactory
 class Competitor(ICompetitor, IOrderListener):
     """A competitor in the Ready Trader Go competition."""
 
+    aggregate_fills: bool = True
+
     def __init__(
         self,
         name: str,
@@ -65,6 +69,7 @@ class Competitor(ICompetitor, IOrderListener):
         self.buy_prices: List[int] = list()
         self.exec_connection: IExecutionConnection = exec_channel
         self.last_client_order_id: int = -1
+        self.latency: Optional[LatencyRecorder] = None
         self.logger: logging.Logger = logging.getLogger("COMPETITOR")
         self.match_events: MatchEvents = match_events
         self.order_count_limit: int = order_count_limit
@@ -79,6 +84,17 @@ class Competitor(ICompetitor, IOrderListener):
             self.on_unhedged_lots_expiry
         )
 
+    def cancel_restored_orders(self, now: float) -> None:
+        """Cancel the orders restored from a checkpoint.
+
+        The auto-trader is not told, since it did not place these orders.
+        """
+        exec_connection: Optional[IExecutionConnection] = self.exec_connection
+        self.exec_connection = None
+        for o in tuple(self.orders.values()):
+            self.etf_book.cancel(now, o)
+        self.exec_connection = exec_connection
+
     def disconnect(self, now: float) -> None:
         """Disconnect this competitor."""
         if self.exec_connection is not None:
@@ -161,48 +177,55 @@ class Competitor(ICompetitor, IOrderListener):
                 order.client_order_id, 0, order.remaining_volume, order.total_fees
             )
 
-    def on_order_filled(
-        self, now: float, order: Order, price: int, volume: int, fee: int
-    ) -> None:
-        """Called when an order is partially or completely filled."""
-        self.active_volume -= volume
+    def on_orders_filled(self, now: float, fills: List[Tuple]) -> None:
+        """Called with the fills of this competitor's orders caused by an
+        aggressive order.
+        """
+        exec_connection = self.exec_connection
+        filled: Dict[int, Order] = dict()
+        position_delta: int = 0
+        price: int = 0
+
+        for order, price, volume, fee in fills:
+            self.active_volume -= volume
+            position_delta += volume if order.side == Side.BUY else -volume
+            self.match_events.fill(
+                now,
+                self.name,
+                order.client_order_id,
+                order.instrument,
+                order.side,
+                price,
+                volume,
+                fee,
+            )
+            self.account.transact(Instrument.ETF, order.side, price, volume, fee)
+            if exec_connection is not None:
+                exec_connection.send_order_filled(order.client_order_id, price, volume)
+            filled[order.client_order_id] = order
+
+        for order in filled.values():
+            if order.remaining_volume == 0:
+                del self.orders[order.client_order_id]
+                if order.side == Side.BUY:
+                    self.buy_prices.pop()
+                else:
+                    self.sell_prices.pop()
+            if exec_connection is not None:
+                exec_connection.send_order_status(
+                    order.client_order_id,
+                    order.volume - order.remaining_volume,
+                    order.remaining_volume,
+                    order.total_fees,
+                )
 
-        if order.remaining_volume == 0:
-            del self.orders[order.client_order_id]
-            if order.side == Side.BUY:
-                self.buy_prices.pop()
-            else:
-                self.sell_prices.pop()
+        self.unhedged_etf_lots.apply_position_delta(position_delta)
 
-        self.unhedged_etf_lots.apply_position_delta(
-            volume if order.side == Side.BUY else -volume
-        )
-
-        self.match_events.fill(
-            now,
-            self.name,
-            order.client_order_id,
-            order.instrument,
-            order.side,
-            price,
-            volume,
-            fee,
-        )
         last_traded: int = self.future_book.last_traded_price() or round(
             self.future_book.midpoint_price()
         )
-        self.account.transact(Instrument.ETF, order.side, price, volume, fee)
         self.account.update(last_traded, price)
 
-        if self.exec_connection is not None:
-            self.exec_connection.send_order_filled(order.client_order_id, price, volume)
-            self.exec_connection.send_order_status(
-                order.client_order_id,
-                order.volume - order.remaining_volume,
-                order.remaining_volume,
-                order.total_fees,
-            )
-
         if not (
             -self.position_limit <= self.account.etf_position <= self.position_limit
         ):
@@ -219,7 +242,13 @@ class Competitor(ICompetitor, IOrderListener):
         )
 
         now: float = self.controller.advance_time()
-        self.hard_breach(now, 0, b"held unhedged lots for longer than the time limit")
+        self.controller.call_in_order(
+            now,
+            self.hard_breach,
+            now,
+            0,
+            b"held unhedged lots for longer than the time limit",
+        )
 
     # Message callbacks
     def on_amend_message(self, now: float, client_order_id: int, volume: int) -> None:
@@ -438,7 +467,12 @@ class Competitor(ICompetitor, IOrderListener):
             order.lifespan,
         )
         self.active_volume += volume
-        self.etf_book.insert(now, order)
+        if self.latency is not None:
+            start: int = time.perf_counter_ns()
+            self.etf_book.insert(now, order)
+            self.latency.lap(ORDER_BOOK, start)
+        else:
+            self.etf_book.insert(now, order)
 
     def on_timer_tick(self, now: float, future_price: int, etf_price: int) -> None:
         """Called on each timer tick to update the auto-trader."""
@@ -493,6 +527,8 @@ class CompetitorManager:
         self.__match_events: MatchEvents = match_events
         self.__order_count_limit: int = limits_config["ActiveOrderCountLimit"]
         self.__position_limit: int = limits_config["PositionLimit"]
+        self.__restored: Set[str] = set()
+        self.__restored_orders: List[Competitor] = list()
         self.__score_board_writer: ScoreBoardWriter = score_board_writer
         self.__start_time: float = 0.0
         self.__traders: Dict[str, str] = traders_config
@@ -515,11 +551,20 @@ class CompetitorManager:
         self, name: str, secret: str, exec_channel: IExecutionConnection
     ) -> Optional[ICompetitor]:
         """Return the competitor object for the given name."""
-        if (
-            name in self.__competitors
-            or name not in self.__traders
-            or self.__traders[name] != secret
-        ):
+        if name not in self.__traders or self.__traders[name] != secret:
+            return None
+
+        if name in self.__restored:
+            # The auto-trader starts afresh, so its client order ids do too
+            self.__restored.remove(name)
+            competitor = self.__competitors[name]
+            competitor.exec_connection = exec_channel
+            competitor.last_client_order_id = -1
+            for callback in self.competitor_logged_in:
+                callback(name)
+            return competitor
+
+        if name in self.__competitors:
             return None
 
         competitor = Competitor(
@@ -549,6 +594,33 @@ class CompetitorManager:
 
         return competitor
 
+    def restore_competitor(self, name: str) -> Competitor:
+        """Return a new competitor, for state being restored from a checkpoint,
+        which will be connected when the named auto-trader logs in.
+        """
+        if name not in self.__traders:
+            raise ValueError("competitor '%s' is not a configured trader" % name)
+
+        competitor = Competitor(
+            name,
+            None,
+            self.__etf_book,
+            self.__future_book,
+            self.__account_factory.create(),
+            self.__match_events,
+            self.__score_board_writer,
+            self.__position_limit,
+            self.__order_count_limit,
+            self.__active_volume_limit,
+            self.__tick_size,
+            self.__unhedged_lots_factory,
+            self.controller,
+        )
+        self.__competitors[name] = competitor
+        self.__restored.add(name)
+        self.__restored_orders.append(competitor)
+        return competitor
+
     def on_competitor_connect(self) -> None:
         """Notify this competitor manager that a competitor has connected."""
         self.active_competitor_count += 1
@@ -557,9 +629,19 @@ class CompetitorManager:
         """Notify this competitor manager that a competitor has disconnected."""
         self.active_competitor_count -= 1
 
-    def on_timer_started(self, _: Timer, start_time: float) -> None:
-        """Called when the market opens."""
+    def on_timer_started(self, timer: Timer, start_time: float) -> None:
+        """Called when the market opens.
+
+        Orders restored from a checkpoint are cancelled, since the auto-traders
+        logging in to the restored match do not know about them.
+        """
         self.__start_time = start_time
+        now: float = timer.advance()
+        for competitor in self.__restored_orders:
+            competitor.cancel_restored_orders(now)
+        self.__restored_orders.clear()
+        for competitor in self.__competitors.values():
+            competitor.unhedged_etf_lots.resume()
 
     def on_timer_stopped(self, _: Timer, end_time: float) -> None:
         """Called when the market closes."""
@@ -16,10 +16,20 @@
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
 import asyncio
+import collections
 import logging
 
-from typing import Any, Optional
+from typing import Any, Callable, Deque, Optional, Tuple
 
+from .checkpoint import (
+    CheckpointError,
+    build_market_index,
+    market_index_filename,
+    read_checkpoint,
+    read_market_index,
+    write_checkpoint,
+)
+from .competitor import CompetitorManager
 from .execution import ExecutionServer
 from .heads_up import HeadsUpDisplayServer
 from .information import InformationPublisher
@@ -28,6 +38,15 @@ from .match_events import MatchEventsWriter
 from .score_board import ScoreBoardWriter
 from .timer import Timer
 from .types import IController
+from .virtual_clock import VirtualClockEventLoop
+
+# Default for the largest number of market events applied at a time before
+# other callbacks (such as competitor messages) get a turn
+DEFAULT_MARKET_EVENT_BUDGET = 1000
+
+# The market pump wakes this many (simulated) seconds after the next market
+# event is due, so that events close together are applied in one go
+MARKET_EVENT_COALESCE_TIME = 0.0005
 
 
 class Controller(IController):
@@ -36,6 +55,7 @@ class Controller(IController):
     def __init__(
         self,
         market_open_delay: float,
+        competitor_manager: CompetitorManager,
         exec_server: ExecutionServer,
         info_publisher: InformationPublisher,
         market_events_reader: MarketEventsReader,
@@ -43,46 +63,172 @@ class Controller(IController):
         score_board_writer: ScoreBoardWriter,
         market_timer: Timer,
         tick_timer: Timer,
+        market_event_budget: int = DEFAULT_MARKET_EVENT_BUDGET,
     ):
         """Initialise a new instance of the Controller class."""
         self.heads_up_display_server: Optional[HeadsUpDisplayServer] = None
 
+        # Market event backlog metrics
+        self.backlog_count: int = 0
+        self.max_backlog_depth: int = 0
+        self.max_backlog_time: float = 0.0
+
+        self.__backlog_depth: Optional[int] = None
+        self.__checkpoint_file: Optional[str] = None
+        self.__checkpoint_time: Optional[float] = None
+        self.__deferred: Deque[
+            Tuple[float, Callable[..., Any], tuple]
+        ] = collections.deque()
+        self.__competitor_manager: CompetitorManager = competitor_manager
         self.__done: bool = False
         self.__execution_server: ExecutionServer = exec_server
         self.__information_publisher: InformationPublisher = info_publisher
         self.__logger: logging.Logger = logging.getLogger("CONTROLLER")
         self.__market_events_reader = market_events_reader
         self.__market_open_delay: float = market_open_delay
+        self.__market_event_budget: int = market_event_budget
+        self.__market_pump: Optional[asyncio.Handle] = None
         self.__market_timer: Timer = market_timer
         self.__match_events_writer = match_events_writer
+        self.__restored_time: float = 0.0
         self.__score_board_writer = score_board_writer
         self.__tick_timer: Timer = tick_timer
 
         # Connect signals
         self.__match_events_writer.task_complete.append(self.on_task_complete)
         self.__market_events_reader.task_complete.append(self.on_task_complete)
-        self.__market_timer.timer_ticked.append(self.on_market_timer_ticked)
         self.__score_board_writer.task_complete.append(self.on_task_complete)
         self.__tick_timer.timer_stopped.append(self.on_tick_timer_stopped)
         self.__tick_timer.timer_ticked.append(self.on_tick_timer_ticked)
 
     def advance_time(self):
-        """Return the current time after accounting for events."""
+        """Return the current time after accounting for events.
+
+        At most the market event budget of market events are applied. If more
+        are due, the market pump finishes them in later callbacks, so anything
+        which must follow them should be done through call_in_order.
+        """
         now: float = self.__market_timer.advance()
-        self.__market_events_reader.process_market_events(now)
+        reader = self.__market_events_reader
+        count: int = reader.process_market_events(
+            self.__deferred[0][0] if self.__deferred else now,
+            self.__market_event_budget,
+        )
+        if self.__track_backlog(now, now, count) and self.__market_pump is not None:
+            # Finish the backlog as soon as other callbacks have had a turn
+            self.__market_pump.cancel()
+            self.__market_pump = asyncio.get_running_loop().call_soon(
+                self.__pump_market_events
+            )
         return now
 
+    def backlogged(self, now: float) -> bool:
+        """Return True if market events due before the given time, or calls
+        waiting for such events (see call_in_order), are still pending."""
+        if self.__deferred:
+            return True
+        evt = self.__market_events_reader.next_event
+        return evt is not None and evt.time < now
+
+    def call_in_order(self, now: float, callback: Callable[..., Any], *args) -> None:
+        """Call the callback, with the given arguments, for something which
+        happened at the given time.
+
+        The callback is called straight away unless a backlog is holding up
+        market events due before that time (see backlogged), in which case
+        it is called by the market pump once they have been applied. Calls
+        held up in this way are made in the order they were requested.
+        """
+        if self.backlogged(now):
+            self.__deferred.append((now, callback, args))
+        else:
+            callback(*args)
+
+    def __call_deferred(self) -> None:
+        """Make the calls held up by a backlog which are no longer waiting for
+        any market event."""
+        deferred = self.__deferred
+        reader = self.__market_events_reader
+        while deferred and (
+            reader.next_event is None or reader.next_event.time >= deferred[0][0]
+        ):
+            _, callback, args = deferred.popleft()
+            callback(*args)
+
     def cleanup(self) -> None:
         """Ensure the controller shuts down gracefully"""
+        self.__execution_server.close()
+
         if self.__match_events_writer:
             self.__match_events_writer.finish()
 
         if self.__score_board_writer:
             self.__score_board_writer.finish()
 
-    def on_market_timer_ticked(self, timer: Timer, now: float, _: int):
-        """Called when it is time to process market events."""
-        self.__market_events_reader.process_market_events(now)
+    def __pump_market_events(self) -> None:
+        """Apply the market events that are due and arrange to be called again
+        when the next one is.
+
+        Rather than polling, the pump wakes MARKET_EVENT_COALESCE_TIME after
+        the next pending market event (or at a scheduled checkpoint) and
+        applies every event due by then, so events close together are applied
+        together but never before they are due. If more events are due than
+        the market event budget allows, the pump calls itself again as soon as
+        other callbacks have had a turn. Calls held up by the backlog are made
+        as soon as the market events before them have been applied.
+        """
+        now: float = self.__market_timer.advance()
+        reader = self.__market_events_reader
+        # Events after the first call held up by the backlog must wait for it
+        count: int = reader.process_market_events(
+            self.__deferred[0][0] if self.__deferred else now,
+            self.__market_event_budget,
+        )
+        backlogged: bool = self.__track_backlog(now, now, count)
+        self.__call_deferred()
+        if backlogged or self.__deferred:
+            self.__market_pump = asyncio.get_running_loop().call_soon(
+                self.__pump_market_events
+            )
+            return
+
+        if self.__checkpoint_time is not None and now >= self.__checkpoint_time:
+            self.__checkpoint_time = None
+            self.save_checkpoint(self.__checkpoint_file)
+
+        self.__market_pump = None
+        if reader.next_event is not None:
+            due: float = reader.next_event.time + MARKET_EVENT_COALESCE_TIME
+            if self.__checkpoint_time is not None and self.__checkpoint_time < due:
+                due = self.__checkpoint_time
+            self.__market_pump = self.__market_timer.schedule(
+                due, self.__pump_market_events
+            )
+
+    def __track_backlog(self, now: float, due: float, count: int) -> bool:
+        """Update the backlog metrics after count market events have been
+        applied and return True if any events due before the given time are
+        still waiting.
+
+        A backlog starts when the market event budget runs out and ends when
+        every due event has been applied; its depth is the number of events
+        applied in the meantime.
+        """
+        evt = self.__market_events_reader.next_event
+        if self.__backlog_depth is not None:
+            self.__backlog_depth += count
+        if evt is not None and evt.time < due:
+            if self.__backlog_depth is None:
+                self.__backlog_depth = 0
+                self.backlog_count += 1
+            if now - evt.time > self.max_backlog_time:
+                self.max_backlog_time = now - evt.time
+            return True
+        if self.__backlog_depth is not None:
+            if self.__backlog_depth > self.max_backlog_depth:
+                self.max_backlog_depth = self.__backlog_depth
+            self.__backlog_depth = None
+        return False
 
     def on_task_complete(self, task: Any) -> None:
         """Called when a reader or writer task is complete"""
@@ -98,6 +244,24 @@ class Controller(IController):
 
     def on_tick_timer_stopped(self, timer: Timer, now: float) -> None:
         """Shut down the match."""
+        if self.__market_pump is not None:
+            self.__market_pump.cancel()
+            self.__market_pump = None
+        self.__deferred.clear()
+        self.__execution_server.close()
+        self.__logger.info(
+            "market event backlogs: count=%d max_depth=%d max_time=%.6f",
+            self.backlog_count,
+            self.max_backlog_depth,
+            self.max_backlog_time,
+        )
+        loop = asyncio.get_running_loop()
+        if isinstance(loop, VirtualClockEventLoop):
+            self.__logger.info(
+                "virtual clock jumped %d times skipping %.6f seconds",
+                loop.jump_count,
+                loop.skipped_time,
+            )
         self.__match_events_writer.finish()
         self.__score_board_writer.finish()
 
@@ -107,6 +271,90 @@ class Controller(IController):
             timer.shutdown(now, "match complete")
             return
 
+    def restore_checkpoint(self, filename: str) -> None:
+        """Restore the state of a match from a checkpoint file.
+
+        This must be called before the match is started. The match then
+        resumes from the market time at which the checkpoint was taken.
+        """
+        reader = self.__market_events_reader
+        with open(filename, "rb") as checkpoint:
+            self.__restored_time = read_checkpoint(
+                checkpoint,
+                reader.future_book,
+                reader.etf_book,
+                reader,
+                self.__competitor_manager,
+            )
+        self.__logger.info(
+            "restored checkpoint: filename='%s' time=%.6f events=%d",
+            filename,
+            self.__restored_time,
+            reader.event_count,
+        )
+
+    def start_at(self, start_time: float) -> None:
+        """Start the match at the given market time rather than at the
+        beginning of the market data file.
+
+        This must be called before the match is started. The order books are
+        restored from the nearest earlier entry in the market data index
+        (which is built if it is missing or out of date) and only the market
+        events after that entry are replayed.
+        """
+        reader = self.__market_events_reader
+        filename: str = market_index_filename(reader.filename)
+        try:
+            with open(filename, "rb") as index:
+                entry_time = read_market_index(
+                    index, start_time, reader.future_book, reader.etf_book, reader
+                )
+        except (OSError, CheckpointError) as e:
+            self.__logger.info(
+                "building market data index: filename='%s' reason='%s'", filename, e
+            )
+            build_market_index(reader.filename)
+            with open(filename, "rb") as index:
+                entry_time = read_market_index(
+                    index, start_time, reader.future_book, reader.etf_book, reader
+                )
+
+        restored_count: int = reader.event_count
+        reader.fast_forward(start_time)
+        self.__restored_time = start_time
+        self.__logger.info(
+            "starting at time=%.6f from index entry time=%.6f events=%d replayed=%d",
+            start_time,
+            entry_time,
+            restored_count,
+            reader.event_count - restored_count,
+        )
+
+    def save_checkpoint(self, filename: str) -> None:
+        """Write the current state of the match to a checkpoint file."""
+        now = self.advance_time()
+        reader = self.__market_events_reader
+        with open(filename, "wb") as checkpoint:
+            write_checkpoint(
+                checkpoint,
+                now,
+                reader.future_book,
+                reader.etf_book,
+                reader,
+                self.__competitor_manager,
+            )
+        self.__logger.info(
+            "saved checkpoint: filename='%s' time=%.6f events=%d",
+            filename,
+            now,
+            reader.event_count,
+        )
+
+    def schedule_checkpoint(self, filename: str, market_time: float) -> None:
+        """Save a checkpoint once the market time reaches the given value."""
+        self.__checkpoint_file = filename
+        self.__checkpoint_time = market_time
+
     async def start(self) -> None:
         """Start running the match."""
         self.__logger.info("starting the match")
@@ -122,8 +370,16 @@ class Controller(IController):
 
         # Give the auto-traders time to start up and connect
         await asyncio.sleep(self.__market_open_delay)
-        # self.__execution_server.close()
 
         self.__logger.info("market open")
-        self.__market_timer.start()
-        self.__tick_timer.start()
+        loop = asyncio.get_running_loop()
+        if isinstance(loop, VirtualClockEventLoop):
+            # Trades and ticks send information to the auto-traders
+            reader = self.__market_events_reader
+            for book in (reader.future_book, reader.etf_book):
+                book.trade_occurred.append(lambda _: loop.notify_output())
+            self.__tick_timer.timer_ticked.append(lambda *_: loop.notify_output())
+            loop.start_virtual_time()
+        self.__market_timer.start(self.__restored_time)
+        self.__tick_timer.start(self.__restored_time)
+        self.__pump_market_events()
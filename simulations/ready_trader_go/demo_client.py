@@ -94,6 +94,14 @@ class DemoClient:
         self.__orders: Dict = dict()
         self.__sock: Optional[socket.socket] = None
 
+        self.__dispatch: DispatchTable = dispatch_table(
+            {
+                MessageType.ERROR: self.__on_error_message,
+                MessageType.ORDER_FILLED: self.__on_order_filled_message,
+                MessageType.ORDER_STATUS: self.__on_order_status_message,
+            }
+        )
+
     @staticmethod
     def display_error(message: str) -> None:
         """Display an error message."""
@@ -204,23 +212,16 @@ class DemoClient:
 
     @staticmethod
     def __on_error_message(order_id: int, message: bytes) -> None:
+        message = message.rstrip(b"\x00")
         if order_id != 0:
             print("Error with order %d: %s" % (order_id, message.decode()))
         else:
             print("Error reported: %s" % message.decode())
 
     def __on_message(self, typ: int, data: bytearray, start: int, length: int) -> None:
-        if typ == MessageType.ERROR and length == ERROR_MESSAGE_SIZE:
-            client_order_id, error_message = ERROR_MESSAGE.unpack_from(data, start)
-            self.__on_error_message(client_order_id, error_message.rstrip(b"\x00"))
-        elif typ == MessageType.ORDER_FILLED and length == ORDER_FILLED_MESSAGE_SIZE:
-            self.__on_order_filled_message(
-                *ORDER_FILLED_MESSAGE.unpack_from(data, start)
-            )
-        elif typ == MessageType.ORDER_STATUS and length == ORDER_STATUS_MESSAGE_SIZE:
-            self.__on_order_status_message(
-                *ORDER_STATUS_MESSAGE.unpack_from(data, start)
-            )
+        entry = self.__dispatch.get(typ)
+        if entry is not None and entry[0] == length:
+            entry[2](*entry[1](data, start))
         else:
             print("received invalid message: length=%d type=%d", length, typ)
 
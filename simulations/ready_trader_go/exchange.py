@@ -15,24 +15,31 @@
 #     You should have received a copy of the GNU Affero General Public
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
+import asyncio
 import socket
 
+from typing import Any
+
 from .account import AccountFactory
 from .application import Application
 from .competitor import CompetitorManager
-from .controller import Controller
+from .controller import DEFAULT_MARKET_EVENT_BUDGET, Controller
 from .execution import ExecutionServer
 from .heads_up import HeadsUpDisplayServer
 from .information import InformationPublisher
+from .latency import LATENCY_REPORT_INTERVAL, LatencyRecorder
 from .limiter import FrequencyLimiterFactory
+from .market_data import MARKET_DATA_CACHE_SIZE, MarketDataCache
 from .market_events import MarketEventsReader
-from .match_events import MatchEvents, MatchEventsWriter
-from .order_book import OrderBook
+from .match_events import BookKeyframes, MatchEvents, MatchEventsWriter
+from .messages import EXECUTION_TYPES
+from .order_book import ORDER_BOOK_TYPES, OrderBookFactory
 from .pubsub import PublisherFactory
 from .score_board import ScoreBoardWriter
 from .timer import Timer
 from .types import Instrument
 from .unhedged_lots import UnhedgedLotsFactory
+from .virtual_clock import DEFAULT_IDLE_TIME, VirtualClockEventLoop
 
 
 def __validate_hostname(config, section, key):
@@ -54,6 +61,25 @@ def __validate_object(config, section, required_keys, value_types):
         raise Exception("Element of inappropriate type in %s configuration" % section)
 
 
+def __validate_execution(config):
+    execution = config["Execution"]
+    if type(execution) is not dict:
+        raise Exception("Execution configuration should be a JSON object")
+    if type(execution.get("Type", "tcp")) is not str:
+        raise Exception("Element of inappropriate type in Execution configuration")
+    if execution.get("Type", "tcp") not in EXECUTION_TYPES:
+        raise Exception(
+            "Execution.Type must be one of: %s" % ", ".join(EXECUTION_TYPES)
+        )
+    if execution.get("Type", "tcp") == "unix":
+        if not hasattr(socket, "AF_UNIX"):
+            raise Exception("Unix domain sockets are not supported on this platform")
+        __validate_object(config, "Execution", ("Path",), (str,))
+    else:
+        __validate_object(config, "Execution", ("Host", "Port"), (str, int))
+        __validate_hostname(config, "Execution", "Host")
+
+
 def __exchange_config_validator(config):
     """Return True if the specified config is valid, otherwise raise an exception."""
     if type(config) is not dict:
@@ -77,16 +103,15 @@ def __exchange_config_validator(config):
         "Engine",
         (
             "MarketDataFile",
-            "MarketEventInterval",
             "MarketOpenDelay",
             "MatchEventsFile",
             "ScoreBoardFile",
             "Speed",
             "TickInterval",
         ),
-        (str, float, float, str, str, float, float),
+        (str, float, str, str, float, float),
     )
-    __validate_object(config, "Execution", ("Host", "Port"), (str, int))
+    __validate_execution(config)
     __validate_object(config, "Fees", ("Maker", "Taker"), (float, float))
     __validate_object(config, "Information", ("Type", "Name"), (str, str))
     __validate_object(
@@ -110,7 +135,64 @@ def __exchange_config_validator(config):
         ),
         (int, int, float, int, int),
     )
-    __validate_hostname(config, "Execution", "Host")
+
+    if "OrderBook" in config["Engine"]:
+        if type(config["Engine"]["OrderBook"]) is not str:
+            raise Exception("Element of inappropriate type in Engine configuration")
+        if config["Engine"]["OrderBook"] not in ORDER_BOOK_TYPES:
+            raise Exception(
+                "Engine.OrderBook must be one of: %s" % ", ".join(ORDER_BOOK_TYPES)
+            )
+
+    if "CheckpointFile" in config["Engine"] or "CheckpointTime" in config["Engine"]:
+        __validate_object(
+            config, "Engine", ("CheckpointFile", "CheckpointTime"), (str, float)
+        )
+
+    if "RestoreFile" in config["Engine"]:
+        if type(config["Engine"]["RestoreFile"]) is not str:
+            raise Exception("Element of inappropriate type in Engine configuration")
+
+    if "MarketDataCache" in config["Engine"]:
+        if type(config["Engine"]["MarketDataCache"]) is not str:
+            raise Exception("Element of inappropriate type in Engine configuration")
+    if "MarketDataCacheSize" in config["Engine"]:
+        if type(config["Engine"]["MarketDataCacheSize"]) is not int:
+            raise Exception("Element of inappropriate type in Engine configuration")
+
+    if "BookKeyframeInterval" in config["Engine"]:
+        if type(config["Engine"]["BookKeyframeInterval"]) is not float:
+            raise Exception("Element of inappropriate type in Engine configuration")
+        if config["Engine"]["BookKeyframeInterval"] <= 0.0:
+            raise Exception("Engine.BookKeyframeInterval must be positive")
+
+    if "MarketEventBudget" in config["Engine"]:
+        if type(config["Engine"]["MarketEventBudget"]) is not int:
+            raise Exception("Element of inappropriate type in Engine configuration")
+        if config["Engine"]["MarketEventBudget"] < 0:
+            raise Exception("Engine.MarketEventBudget must not be negative")
+
+    if "LatencyFile" in config["Engine"]:
+        if type(config["Engine"]["LatencyFile"]) is not str:
+            raise Exception("Element of inappropriate type in Engine configuration")
+    if "LatencyReportInterval" in config["Engine"]:
+        if type(config["Engine"]["LatencyReportInterval"]) is not float:
+            raise Exception("Element of inappropriate type in Engine configuration")
+        if config["Engine"]["LatencyReportInterval"] <= 0.0:
+            raise Exception("Engine.LatencyReportInterval must be positive")
+
+    if "VirtualClock" in config["Engine"]:
+        if type(config["Engine"]["VirtualClock"]) is not bool:
+            raise Exception("Element of inappropriate type in Engine configuration")
+    if "VirtualClockIdleTime" in config["Engine"]:
+        if type(config["Engine"]["VirtualClockIdleTime"]) is not float:
+            raise Exception("Element of inappropriate type in Engine configuration")
+
+    if "StartTime" in config["Engine"]:
+        if type(config["Engine"]["StartTime"]) is not float:
+            raise Exception("Element of inappropriate type in Engine configuration")
+        if "RestoreFile" in config["Engine"]:
+            raise Exception("Engine.StartTime cannot be used with Engine.RestoreFile")
 
     if "Hud" in config:
         __validate_object(config, "Hud", ("Host", "Port"), (str, int))
@@ -126,6 +208,16 @@ def __exchange_config_validator(config):
     return True
 
 
+def __event_loop_factory(config: Any) -> asyncio.AbstractEventLoop:
+    """Return a virtual clock event loop if the configuration asks for one."""
+    engine = config["Engine"]
+    if engine.get("VirtualClock", False):
+        return VirtualClockEventLoop(
+            engine.get("VirtualClockIdleTime", DEFAULT_IDLE_TIME)
+        )
+    return asyncio.new_event_loop()
+
+
 def setup(app: Application) -> Controller:
     """Setup the exchange simulator."""
     engine = app.config["Engine"]
@@ -134,8 +226,11 @@ def setup(app: Application) -> Controller:
     instrument = app.config["Instrument"]
     limits = app.config["Limits"]
 
-    future_book = OrderBook(Instrument.FUTURE, 0.0, 0.0)
-    etf_book = OrderBook(
+    book_factory = OrderBookFactory(
+        engine.get("OrderBook", "sorted"), instrument["TickSize"]
+    )
+    future_book = book_factory.create(Instrument.FUTURE, 0.0, 0.0)
+    etf_book = book_factory.create(
         Instrument.ETF, app.config["Fees"]["Maker"], app.config["Fees"]["Taker"]
     )
 
@@ -143,12 +238,32 @@ def setup(app: Application) -> Controller:
     match_events_writer = MatchEventsWriter(
         match_events, engine["MatchEventsFile"], app.event_loop
     )
+    market_data_file = engine["MarketDataFile"]
+    if "MarketDataCache" in engine:
+        cache = MarketDataCache(
+            engine["MarketDataCache"],
+            engine.get("MarketDataCacheSize", MARKET_DATA_CACHE_SIZE) * 2**20,
+        )
+        market_data_file = cache.get(market_data_file)
     market_events_reader = MarketEventsReader(
-        engine["MarketDataFile"], app.event_loop, future_book, etf_book, match_events
+        market_data_file, app.event_loop, future_book, etf_book, match_events
     )
     score_board_writer = ScoreBoardWriter(engine["ScoreBoardFile"], app.event_loop)
 
-    tick_timer = Timer(engine["TickInterval"], engine["Speed"])
+    # Tick jitter is reproducible when the match runs on the virtual clock
+    seed = 0 if engine.get("VirtualClock", False) else None
+    tick_timer = Timer(engine["TickInterval"], engine["Speed"], seed)
+    if "BookKeyframeInterval" in engine:
+        # Record compact keyframes of the order books instead of every market order
+        market_events_reader.log_market_orders = False
+        BookKeyframes(
+            match_events,
+            (future_book, etf_book),
+            market_events_reader,
+            tick_timer,
+            engine["BookKeyframeInterval"],
+        )
+
     account_factory = AccountFactory(instrument["EtfClamp"], instrument["TickSize"])
     unhedged_lots_factory = UnhedgedLotsFactory()
     competitor_manager = CompetitorManager(
@@ -169,7 +284,11 @@ def setup(app: Application) -> Controller:
         limits["MessageFrequencyLimit"],
     )
     exec_server = ExecutionServer(
-        exec_["Host"], exec_["Port"], competitor_manager, limiter_factory
+        exec_.get("Host", ""),
+        exec_.get("Port", 0),
+        competitor_manager,
+        limiter_factory,
+        exec_["Path"] if exec_.get("Type", "tcp") == "unix" else None,
     )
     info_publisher = InformationPublisher(
         app.event_loop,
@@ -178,9 +297,12 @@ def setup(app: Application) -> Controller:
         tick_timer,
     )
 
-    market_timer = Timer(engine["MarketEventInterval"], engine["Speed"])
+    # Market events are pumped as they fall due (see Controller), so the
+    # market timer serves only as a clock
+    market_timer = Timer(0.0, engine["Speed"])
     controller = Controller(
         engine["MarketOpenDelay"],
+        competitor_manager,
         exec_server,
         info_publisher,
         market_events_reader,
@@ -188,10 +310,20 @@ def setup(app: Application) -> Controller:
         score_board_writer,
         market_timer,
         tick_timer,
+        engine.get("MarketEventBudget", DEFAULT_MARKET_EVENT_BUDGET),
     )
     competitor_manager.controller = controller
     exec_server.controller = controller
 
+    if "LatencyFile" in engine:
+        # Opt-in timing of each stage of handling the auto-traders' inserts
+        latency = LatencyRecorder(
+            engine["LatencyFile"],
+            tick_timer,
+            engine.get("LatencyReportInterval", LATENCY_REPORT_INTERVAL),
+        )
+        exec_server.latency = latency
+
     if "Hud" in app.config:
         hud_server = HeadsUpDisplayServer(
             app.config["Hud"]["Host"],
@@ -202,12 +334,21 @@ def setup(app: Application) -> Controller:
         )
         controller.heads_up_display_server = hud_server
 
+    if "RestoreFile" in engine:
+        controller.restore_checkpoint(engine["RestoreFile"])
+    elif "StartTime" in engine:
+        controller.start_at(engine["StartTime"])
+    if "CheckpointFile" in engine:
+        controller.schedule_checkpoint(
+            engine["CheckpointFile"], engine["CheckpointTime"]
+        )
+
     app.event_loop.create_task(controller.start())
     return controller
 
 
 def main():
-    app = Application("exchange", __exchange_config_validator)
+    app = Application("exchange", __exchange_config_validator, __event_loop_factory)
     controller: Controller = setup(app)
     app.run()
     controller.cleanup()
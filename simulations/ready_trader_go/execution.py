@@ -17,34 +17,30 @@
 #     <https://www.gnu.org/licenses/>.
 import asyncio
 import logging
+import os
 
 from typing import Optional
 
 from .competitor import Competitor, CompetitorManager
+from .latency import (
+    ADVANCE_TIME,
+    COMPETITOR,
+    LIMITER,
+    RECEIVE,
+    LatencyRecorder,
+)
 from .limiter import FrequencyLimiter, FrequencyLimiterFactory
 from .messages import (
-    AMEND_MESSAGE,
-    AMEND_MESSAGE_SIZE,
-    CANCEL_MESSAGE,
-    CANCEL_MESSAGE_SIZE,
     ERROR_MESSAGE,
-    ERROR_MESSAGE_SIZE,
-    HEADER,
     HEADER_SIZE,
     HEDGE_FILLED_MESSAGE,
-    HEDGE_FILLED_MESSAGE_SIZE,
-    HEDGE_MESSAGE,
-    HEDGE_MESSAGE_SIZE,
-    INSERT_MESSAGE,
-    INSERT_MESSAGE_SIZE,
-    LOGIN_MESSAGE,
-    LOGIN_MESSAGE_SIZE,
+    MESSAGES,
     ORDER_FILLED_MESSAGE,
-    ORDER_FILLED_MESSAGE_SIZE,
     ORDER_STATUS_MESSAGE,
-    ORDER_STATUS_MESSAGE_SIZE,
     Connection,
+    DispatchTable,
     MessageType,
+    dispatch_table,
 )
 from .types import IController, IExecutionConnection
 
@@ -69,29 +65,14 @@ class ExecutionConnection(Connection, IExecutionConnection):
             1.0, self.close
         )
 
-        self.__error_message = bytearray(ERROR_MESSAGE_SIZE)
-        self.__hedge_filled_message = bytearray(HEDGE_FILLED_MESSAGE_SIZE)
-        self.__order_status_message = bytearray(ORDER_STATUS_MESSAGE_SIZE)
-        self.__order_filled_message = bytearray(ORDER_FILLED_MESSAGE_SIZE)
+        self.__error_message = MESSAGES[MessageType.ERROR].new_message()
+        self.__hedge_filled_message = MESSAGES[MessageType.HEDGE_FILLED].new_message()
+        self.__order_status_message = MESSAGES[MessageType.ORDER_STATUS].new_message()
+        self.__order_filled_message = MESSAGES[MessageType.ORDER_FILLED].new_message()
 
-        HEADER.pack_into(self.__error_message, 0, ERROR_MESSAGE_SIZE, MessageType.ERROR)
-        HEADER.pack_into(
-            self.__hedge_filled_message,
-            0,
-            HEDGE_FILLED_MESSAGE_SIZE,
-            MessageType.HEDGE_FILLED,
-        )
-        HEADER.pack_into(
-            self.__order_status_message,
-            0,
-            ORDER_STATUS_MESSAGE_SIZE,
-            MessageType.ORDER_STATUS,
-        )
-        HEADER.pack_into(
-            self.__order_filled_message,
-            0,
-            ORDER_FILLED_MESSAGE_SIZE,
-            MessageType.ORDER_FILLED,
+        # Only a login message is accepted until the auto-trader has logged in
+        self.__dispatch: DispatchTable = dispatch_table(
+            {MessageType.LOGIN: self.__on_login_message}
         )
 
     def __del__(self):
@@ -112,7 +93,8 @@ class ExecutionConnection(Connection, IExecutionConnection):
 
         self.login_timeout.cancel()
         if self.competitor is not None:
-            self.competitor.on_connection_lost(self.controller.advance_time())
+            now: float = self.controller.advance_time()
+            self.controller.call_in_order(now, self.competitor.on_connection_lost, now)
         self.competitor_manager.on_competitor_disconnect()
         if not self.closing:
             self.logger.warning(
@@ -125,10 +107,60 @@ class ExecutionConnection(Connection, IExecutionConnection):
         self.competitor_manager.on_competitor_connect()
 
     def on_message(self, typ: int, data: bytes, start: int, length: int) -> None:
-        """Called when a message is received from the auto-trader."""
+        """Called when a message is received from the auto-trader.
+
+        If a backlog is holding up market events due before the message
+        arrived, the message is handled once they have been applied.
+        """
+        # Only insert order messages are timed
+        latency: Optional[LatencyRecorder] = self.latency
+        stamp: int = 0
+        if latency is not None and typ == MessageType.INSERT_ORDER:
+            stamp = latency.lap(RECEIVE, self._receive_time)
+        else:
+            latency = None
+
         now: float = self.controller.advance_time()
+        if latency is not None:
+            stamp = latency.lap(ADVANCE_TIME, stamp)
 
-        if self.frequency_limiter.check_event(now):
+        if self.controller.backlogged(now):
+            # The receive buffer is reused, so keep a copy of the message
+            self.controller.call_in_order(
+                now,
+                self.__on_deferred_message,
+                now,
+                typ,
+                bytes(data[start : start + length - HEADER_SIZE]),
+                length,
+            )
+            return
+
+        self.__handle_message(now, typ, data, start, length, latency, stamp)
+
+    def __on_deferred_message(
+        self, now: float, typ: int, data: bytes, length: int
+    ) -> None:
+        """Called to handle a message held up by a market event backlog."""
+        if not self._closing:
+            self.__handle_message(now, typ, data, 0, length, None, 0)
+
+    def __handle_message(
+        self,
+        now: float,
+        typ: int,
+        data: bytes,
+        start: int,
+        length: int,
+        latency: Optional[LatencyRecorder],
+        stamp: int,
+    ) -> None:
+        """Handle a message from the auto-trader received at the given time."""
+        breached: bool = self.frequency_limiter.check_event(now)
+        if latency is not None:
+            stamp = latency.lap(LIMITER, stamp)
+
+        if breached:
             self.logger.info(
                 "fd=%d message frequency limit breached: now=%.6f value=%d limit=%d",
                 self._file_number,
@@ -142,54 +174,44 @@ class ExecutionConnection(Connection, IExecutionConnection):
                 self.close()
             return
 
-        if self.competitor is None:
-            if typ == MessageType.LOGIN and length == LOGIN_MESSAGE_SIZE:
-                raw_name, raw_secret = LOGIN_MESSAGE.unpack_from(data, start)
-                self.on_login(
-                    raw_name.rstrip(b"\x00").decode(),
-                    raw_secret.rstrip(b"\x00").decode(),
-                )
-            else:
-                self.logger.info(
-                    "fd=%d first message received was not a login", self._file_number
-                )
-                self.close()
+        entry = self.__dispatch.get(typ)
+        if entry is not None and entry[0] == length:
+            entry[2](now, *entry[1](data, start))
+            if latency is not None:
+                stamp = latency.lap(COMPETITOR, stamp)
+                if not self._reply_time:
+                    self._reply_time = stamp
             return
 
-        if typ == MessageType.AMEND_ORDER and length == AMEND_MESSAGE_SIZE:
-            self.competitor.on_amend_message(
-                now, *AMEND_MESSAGE.unpack_from(data, start)
-            )
-        elif typ == MessageType.CANCEL_ORDER and length == CANCEL_MESSAGE_SIZE:
-            self.competitor.on_cancel_message(
-                now, *CANCEL_MESSAGE.unpack_from(data, start)
-            )
-        elif typ == MessageType.HEDGE_ORDER and length == HEDGE_MESSAGE_SIZE:
-            self.competitor.on_hedge_message(
-                now, *HEDGE_MESSAGE.unpack_from(data, start)
+        if self.competitor is None:
+            self.logger.info(
+                "fd=%d first message received was not a login", self._file_number
             )
-        elif typ == MessageType.INSERT_ORDER and length == INSERT_MESSAGE_SIZE:
-            self.competitor.on_insert_message(
-                now, *INSERT_MESSAGE.unpack_from(data, start)
+        elif typ == MessageType.LOGIN:
+            self.logger.info(
+                "fd=%d received second login message: time=%.6f name='%s'",
+                self._file_number,
+                now,
+                self.competitor.name,
             )
         else:
-            if typ == MessageType.LOGIN:
-                self.logger.info(
-                    "fd=%d received second login message: time=%.6f name='%s'",
-                    self._file_number,
-                    now,
-                    self.competitor.name,
-                )
-            else:
-                self.logger.info(
-                    "fd=%d '%s' received invalid message: time=%.6f length=%d type=%d",
-                    self._file_number,
-                    self.competitor.name,
-                    now,
-                    length,
-                    typ,
-                )
-            self.close()
+            self.logger.info(
+                "fd=%d '%s' received invalid message: time=%.6f length=%d type=%d",
+                self._file_number,
+                self.competitor.name,
+                now,
+                length,
+                typ,
+            )
+        self.close()
+
+    def __on_login_message(
+        self, now: float, raw_name: bytes, raw_secret: bytes
+    ) -> None:
+        """Called when a login message is received."""
+        self.on_login(
+            raw_name.rstrip(b"\x00").decode(), raw_secret.rstrip(b"\x00").decode()
+        )
 
     def on_login(self, name: str, secret: str) -> None:
         """Called when a login message is received."""
@@ -201,6 +223,15 @@ class ExecutionConnection(Connection, IExecutionConnection):
             self.close()
             return
 
+        self.competitor.latency = self.latency
+        self.__dispatch = dispatch_table(
+            {
+                MessageType.AMEND_ORDER: self.competitor.on_amend_message,
+                MessageType.CANCEL_ORDER: self.competitor.on_cancel_message,
+                MessageType.HEDGE_ORDER: self.competitor.on_hedge_message,
+                MessageType.INSERT_ORDER: self.competitor.on_insert_message,
+            }
+        )
         self.logger.info("fd=%d '%s' is ready!", self._file_number, name)
 
     def send_error(self, client_order_id: int, error_message: bytes) -> None:
@@ -208,7 +239,7 @@ class ExecutionConnection(Connection, IExecutionConnection):
         ERROR_MESSAGE.pack_into(
             self.__error_message, HEADER_SIZE, client_order_id, error_message
         )
-        self._connection_transport.write(self.__error_message)
+        self._write(self.__error_message)
 
     def send_hedge_filled(
         self, client_order_id: int, average_price: int, volume: int
@@ -221,14 +252,14 @@ class ExecutionConnection(Connection, IExecutionConnection):
             average_price,
             volume,
         )
-        self._connection_transport.write(self.__hedge_filled_message)
+        self._write(self.__hedge_filled_message)
 
     def send_order_filled(self, client_order_id: int, price: int, volume: int) -> None:
         """Send an order filled message to the auto-trader."""
         ORDER_FILLED_MESSAGE.pack_into(
             self.__order_filled_message, HEADER_SIZE, client_order_id, price, volume
         )
-        self._connection_transport.write(self.__order_filled_message)
+        self._write(self.__order_filled_message)
 
     def send_order_status(
         self, client_order_id: int, fill_volume: int, remaining_volume: int, fees: int
@@ -242,7 +273,7 @@ class ExecutionConnection(Connection, IExecutionConnection):
             remaining_volume,
             fees,
         )
-        self._connection_transport.write(self.__order_status_message)
+        self._write(self.__order_status_message)
 
 
 class ExecutionServer:
@@ -254,10 +285,17 @@ class ExecutionServer:
         port: int,
         competitor_manager: CompetitorManager,
         limiter_factory: FrequencyLimiterFactory,
+        path: Optional[str] = None,
     ):
-        """Initialise a new instance of the ExecutionServer class."""
+        """Initialise a new instance of the ExecutionServer class.
+
+        If a path is given, the server listens on a Unix domain socket at
+        that path instead of on the host and port.
+        """
         self.controller: Optional[IController] = None
         self.host: str = host
+        self.latency: Optional[LatencyRecorder] = None
+        self.path: Optional[str] = path
         self.port: int = port
 
         self.__competitor_manager: CompetitorManager = competitor_manager
@@ -266,17 +304,38 @@ class ExecutionServer:
         self.__server: Optional[asyncio.AbstractServer] = None
 
     def close(self):
-        """Close the server without affecting existing connections."""
+        """Close the server without affecting existing connections.
+
+        The socket file of a Unix domain socket server is removed. Closing a
+        server which is not running does nothing.
+        """
+        if self.__server is None:
+            return
         self.__server.close()
+        self.__server = None
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
 
     def __on_new_connection(self) -> ExecutionConnection:
         """Callback for when a new connection is accepted."""
-        return ExecutionConnection(
+        connection = ExecutionConnection(
             self.__competitor_manager, self.__limiter_factory.create(), self.controller
         )
+        connection.latency = self.latency
+        return connection
 
     async def start(self) -> None:
         """Start the server."""
+        if self.path is not None:
+            self.__logger.info("starting execution server: path=%s", self.path)
+            self.__server = await asyncio.get_running_loop().create_unix_server(
+                self.__on_new_connection, self.path
+            )
+            return
+
         self.__logger.info(
             "starting execution server: host=%s port=%d", self.host, self.port
         )
@@ -23,32 +23,21 @@ from typing import Dict, Optional
 from .competitor import CompetitorManager
 from .match_events import MatchEvent, MatchEventOperation, MatchEvents
 from .messages import (
-    AMEND_MESSAGE,
-    AMEND_MESSAGE_SIZE,
-    CANCEL_MESSAGE,
-    CANCEL_MESSAGE_SIZE,
-    ERROR_MESSAGE,
-    ERROR_MESSAGE_SIZE,
-    HEADER,
-    HEADER_SIZE,
-    INSERT_MESSAGE,
-    INSERT_MESSAGE_SIZE,
-    LOGIN_MESSAGE,
-    LOGIN_MESSAGE_SIZE,
     AMEND_EVENT_MESSAGE,
-    AMEND_EVENT_MESSAGE_SIZE,
+    BOOK_EVENT_MESSAGE,
     CANCEL_EVENT_MESSAGE,
-    CANCEL_EVENT_MESSAGE_SIZE,
-    INSERT_EVENT_MESSAGE,
-    INSERT_EVENT_MESSAGE_SIZE,
+    ERROR_MESSAGE,
+    HEADER_SIZE,
     HEDGE_EVENT_MESSAGE,
-    HEDGE_EVENT_MESSAGE_SIZE,
+    INSERT_EVENT_MESSAGE,
+    LEVEL_EVENT_MESSAGE,
     LOGIN_EVENT_MESSAGE,
-    LOGIN_EVENT_MESSAGE_SIZE,
+    MESSAGES,
     TRADE_EVENT_MESSAGE,
-    TRADE_EVENT_MESSAGE_SIZE,
     Connection,
+    DispatchTable,
     MessageType,
+    dispatch_table,
 )
 from .types import ICompetitor, IController, IExecutionConnection
 
@@ -71,50 +60,19 @@ class HudConnection(Connection, IExecutionConnection):
         self.__match_events: MatchEvents = match_events
 
         # Message buffers
-        self.__error_message = bytearray(ERROR_MESSAGE_SIZE)
-        self.__amend_event_message = bytearray(AMEND_EVENT_MESSAGE_SIZE)
-        self.__cancel_event_message = bytearray(CANCEL_EVENT_MESSAGE_SIZE)
-        self.__insert_event_message = bytearray(INSERT_EVENT_MESSAGE_SIZE)
-        self.__login_event_message = bytearray(LOGIN_EVENT_MESSAGE_SIZE)
-        self.__hedge_event_message = bytearray(HEDGE_EVENT_MESSAGE_SIZE)
-        self.__trade_event_message = bytearray(TRADE_EVENT_MESSAGE_SIZE)
+        self.__error_message = MESSAGES[MessageType.ERROR].new_message()
+        self.__amend_event_message = MESSAGES[MessageType.AMEND_EVENT].new_message()
+        self.__book_event_message = MESSAGES[MessageType.BOOK_EVENT].new_message()
+        self.__cancel_event_message = MESSAGES[MessageType.CANCEL_EVENT].new_message()
+        self.__insert_event_message = MESSAGES[MessageType.INSERT_EVENT].new_message()
+        self.__login_event_message = MESSAGES[MessageType.LOGIN_EVENT].new_message()
+        self.__hedge_event_message = MESSAGES[MessageType.HEDGE_EVENT].new_message()
+        self.__level_event_message = MESSAGES[MessageType.LEVEL_EVENT].new_message()
+        self.__trade_event_message = MESSAGES[MessageType.TRADE_EVENT].new_message()
 
-        HEADER.pack_into(self.__error_message, 0, ERROR_MESSAGE_SIZE, MessageType.ERROR)
-        HEADER.pack_into(
-            self.__amend_event_message,
-            0,
-            AMEND_EVENT_MESSAGE_SIZE,
-            MessageType.AMEND_EVENT,
-        )
-        HEADER.pack_into(
-            self.__cancel_event_message,
-            0,
-            CANCEL_EVENT_MESSAGE_SIZE,
-            MessageType.CANCEL_EVENT,
-        )
-        HEADER.pack_into(
-            self.__insert_event_message,
-            0,
-            INSERT_EVENT_MESSAGE_SIZE,
-            MessageType.INSERT_EVENT,
-        )
-        HEADER.pack_into(
-            self.__login_event_message,
-            0,
-            LOGIN_EVENT_MESSAGE_SIZE,
-            MessageType.LOGIN_EVENT,
-        )
-        HEADER.pack_into(
-            self.__hedge_event_message,
-            0,
-            HEDGE_EVENT_MESSAGE_SIZE,
-            MessageType.HEDGE_EVENT,
-        )
-        HEADER.pack_into(
-            self.__trade_event_message,
-            0,
-            TRADE_EVENT_MESSAGE_SIZE,
-            MessageType.TRADE_EVENT,
+        # Only a login message is accepted until the heads-up display has logged in
+        self.__dispatch: DispatchTable = dispatch_table(
+            {MessageType.LOGIN: self.__on_login_message}
         )
 
     def connection_lost(self, exc: Optional[Exception]) -> None:
@@ -138,57 +96,86 @@ class HudConnection(Connection, IExecutionConnection):
         self.__match_events.event_occurred.append(self.on_match_event)
 
     def on_message(self, typ: int, data: bytes, start: int, length: int) -> None:
-        """Callback when a message is received from the Heads-Up Display."""
-        now: float = self.__controller.advance_time()
+        """Callback when a message is received from the Heads-Up Display.
 
-        if self.__competitor is None:
-            if typ == MessageType.LOGIN and length == LOGIN_MESSAGE_SIZE:
-                raw_name, raw_secret = LOGIN_MESSAGE.unpack_from(data, start)
-                self.on_login(
-                    raw_name.rstrip(b"\x00").decode(),
-                    raw_secret.rstrip(b"\x00").decode(),
-                )
-            else:
-                self.__logger.info(
-                    "fd=%d first message received was not a login", self._file_number
-                )
-                self._connection_transport.close()
+        If a backlog is holding up market events due before the message
+        arrived, the message is handled once they have been applied.
+        """
+        now: float = self.__controller.advance_time()
+        if self.__controller.backlogged(now):
+            # The receive buffer is reused, so keep a copy of the message
+            self.__controller.call_in_order(
+                now,
+                self.__on_deferred_message,
+                now,
+                typ,
+                bytes(data[start : start + length - HEADER_SIZE]),
+                length,
+            )
             return
 
-        if typ == MessageType.AMEND_ORDER and length == AMEND_MESSAGE_SIZE:
-            self.__competitor.on_amend_message(
-                now, *AMEND_MESSAGE.unpack_from(data, start)
-            )
-        elif typ == MessageType.CANCEL_ORDER and length == CANCEL_MESSAGE_SIZE:
-            self.__competitor.on_cancel_message(
-                now, *CANCEL_MESSAGE.unpack_from(data, start)
-            )
-        elif typ == MessageType.INSERT_ORDER and length == INSERT_MESSAGE_SIZE:
-            self.__competitor.on_insert_message(
-                now, *INSERT_MESSAGE.unpack_from(data, start)
+        self.__handle_message(now, typ, data, start, length)
+
+    def __on_deferred_message(
+        self, now: float, typ: int, data: bytes, length: int
+    ) -> None:
+        """Called to handle a message held up by a market event backlog."""
+        if not self._closing:
+            self.__handle_message(now, typ, data, 0, length)
+
+    def __handle_message(
+        self, now: float, typ: int, data: bytes, start: int, length: int
+    ) -> None:
+        """Handle a message from the Heads-Up Display received at the given
+        time."""
+        entry = self.__dispatch.get(typ)
+        if entry is not None and entry[0] == length:
+            entry[2](now, *entry[1](data, start))
+        elif self.__competitor is None:
+            self.__logger.info(
+                "fd=%d first message received was not a login", self._file_number
             )
+            self._connection_transport.close()
         else:
             self.__logger.warning(
                 "fd=%d '%s' received invalid message: time=%.6f length=%d type=%d",
                 self._file_number,
+                self.__competitor.name,
+                now,
                 length,
                 typ,
             )
             self.close()
 
+    def __on_login_message(
+        self, now: float, raw_name: bytes, raw_secret: bytes
+    ) -> None:
+        """Called when a login message is received."""
+        self.on_login(
+            raw_name.rstrip(b"\x00").decode(), raw_secret.rstrip(b"\x00").decode()
+        )
+
     def on_competitor_logged_in(self, name: str) -> None:
         """Called when a competitor logs in."""
         identifier = self.__competitor_ids[name] = len(self.__competitor_ids) + 1
         LOGIN_EVENT_MESSAGE.pack_into(
             self.__login_event_message, HEADER_SIZE, name.encode(), identifier
         )
-        self._connection_transport.write(self.__login_event_message)
+        self._write(self.__login_event_message)
 
     def on_login(self, name: str, secret: str) -> None:
         """Called when the heads-up display logs in."""
         self.__competitor = self.__competitor_manager.login_competitor(
             name, secret, self
         )
+        if self.__competitor is not None:
+            self.__dispatch = dispatch_table(
+                {
+                    MessageType.AMEND_ORDER: self.__competitor.on_amend_message,
+                    MessageType.CANCEL_ORDER: self.__competitor.on_cancel_message,
+                    MessageType.INSERT_ORDER: self.__competitor.on_insert_message,
+                }
+            )
 
     def on_match_event(self, event: MatchEvent) -> None:
         """Called when a match event occurs."""
@@ -201,7 +188,7 @@ class HudConnection(Connection, IExecutionConnection):
                 event.order_id,
                 event.volume,
             )
-            self._connection_transport.write(self.__amend_event_message)
+            self._write(self.__amend_event_message)
         elif event.operation == MatchEventOperation.CANCEL:
             CANCEL_EVENT_MESSAGE.pack_into(
                 self.__cancel_event_message,
@@ -210,7 +197,7 @@ class HudConnection(Connection, IExecutionConnection):
                 self.__competitor_ids[event.competitor],
                 event.order_id,
             )
-            self._connection_transport.write(self.__cancel_event_message)
+            self._write(self.__cancel_event_message)
         elif event.operation == MatchEventOperation.INSERT:
             INSERT_EVENT_MESSAGE.pack_into(
                 self.__insert_event_message,
@@ -224,7 +211,7 @@ class HudConnection(Connection, IExecutionConnection):
                 event.price,
                 event.lifespan.value,
             )
-            self._connection_transport.write(self.__insert_event_message)
+            self._write(self.__insert_event_message)
         elif event.operation == MatchEventOperation.HEDGE:
             HEDGE_EVENT_MESSAGE.pack_into(
                 self.__hedge_event_message,
@@ -236,7 +223,7 @@ class HudConnection(Connection, IExecutionConnection):
                 event.volume,
                 event.price,
             )
-            self._connection_transport.write(self.__hedge_event_message)
+            self._write(self.__hedge_event_message)
         elif event.operation == MatchEventOperation.TRADE:
             TRADE_EVENT_MESSAGE.pack_into(
                 self.__trade_event_message,
@@ -250,7 +237,27 @@ class HudConnection(Connection, IExecutionConnection):
                 event.price,
                 event.fee,
             )
-            self._connection_transport.write(self.__trade_event_message)
+            self._write(self.__trade_event_message)
+        elif event.operation == MatchEventOperation.BOOK:
+            BOOK_EVENT_MESSAGE.pack_into(
+                self.__book_event_message,
+                HEADER_SIZE,
+                event.time,
+                event.instrument,
+                event.price or 0,
+            )
+            self._write(self.__book_event_message)
+        elif event.operation == MatchEventOperation.LEVEL:
+            LEVEL_EVENT_MESSAGE.pack_into(
+                self.__level_event_message,
+                HEADER_SIZE,
+                event.time,
+                event.instrument,
+                event.side,
+                event.volume,
+                event.price,
+            )
+            self._write(self.__level_event_message)
 
     # IExecutionConnection overrides
 
@@ -263,7 +270,7 @@ class HudConnection(Connection, IExecutionConnection):
         ERROR_MESSAGE.pack_into(
             self.__error_message, HEADER_SIZE, client_order_id, error_message
         )
-        self._connection_transport.write(self.__error_message)
+        self._write(self.__error_message)
 
     def send_order_filled(self, client_order_id: int, price: int, volume: int) -> None:
         """Send an order filled message to the heads-up display."""
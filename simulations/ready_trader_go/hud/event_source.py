@@ -22,6 +22,7 @@ import itertools
 from typing import (
     Callable,
     Dict,
+    Iterable,
     Iterator,
     List,
     NamedTuple,
@@ -35,22 +36,10 @@ from PySide6 import QtCore, QtNetwork
 
 from ready_trader_go.account import AccountFactory, CompetitorAccount
 from ready_trader_go.messages import (
-    AMEND_EVENT_MESSAGE,
-    AMEND_EVENT_MESSAGE_SIZE,
-    CANCEL_EVENT_MESSAGE,
-    CANCEL_EVENT_MESSAGE_SIZE,
-    ERROR_MESSAGE,
-    ERROR_MESSAGE_SIZE,
     HEADER_SIZE,
-    HEDGE_EVENT_MESSAGE,
-    HEDGE_EVENT_MESSAGE_SIZE,
-    INSERT_EVENT_MESSAGE,
-    INSERT_EVENT_MESSAGE_SIZE,
-    LOGIN_EVENT_MESSAGE,
-    LOGIN_EVENT_MESSAGE_SIZE,
-    TRADE_EVENT_MESSAGE,
-    TRADE_EVENT_MESSAGE_SIZE,
+    DispatchTable,
     MessageType,
+    dispatch_table,
 )
 from ready_trader_go.order_book import TOP_LEVEL_COUNT, Order, OrderBook
 from ready_trader_go.types import Instrument, Lifespan, Side
@@ -63,6 +52,73 @@ TICK_INTERVAL_MILLISECONDS = 500
 TICK_INTERVAL_SECONDS = TICK_INTERVAL_MILLISECONDS / 1000.0
 
 
+def restart_order_book(
+    books: List[OrderBook],
+    market_orders: Dict[int, Order],
+    competitor_orders: Iterable[Dict[int, Order]],
+    instrument: Instrument,
+    last_traded_price: Optional[int],
+) -> None:
+    """Replace the market orders in an order book, ready for the levels of a
+    keyframe.
+
+    Market orders (and the levels of the previous keyframe) resting in the
+    old book are forgotten, since their remaining volume is included in the
+    levels of the keyframe. Competitors' orders are kept, in time priority,
+    since they are not.
+    """
+    old_book = books[instrument]
+    competitor: Set[int] = {
+        id(o) for team_orders in competitor_orders for o in team_orders.values()
+    }
+    books[instrument] = OrderBook(instrument, 0.0, 0.0)
+    books[instrument].restore(
+        [o for o in old_book.resting_orders() if id(o) in competitor],
+        last_traded_price,
+        old_book.version + 1,
+    )
+    for order_id in [i for i, o in market_orders.items() if o.instrument == instrument]:
+        del market_orders[order_id]
+
+
+def fill_order(
+    books: List[OrderBook],
+    orders: Dict[int, Order],
+    filled_volumes: Dict[int, int],
+    order_id: int,
+    volume: int,
+) -> None:
+    """Bring a competitor's order into line with a trade reported by the
+    exchange simulator.
+
+    The orders in the HUD's copy of the order books are matched by the HUD
+    itself, but when keyframes stand in for the market orders the market
+    order that traded with a resting competitor order is not among the
+    events, so any traded volume the HUD has not matched is removed here.
+    The filled volumes dictionary holds the volume reported for each order
+    so far.
+    """
+    order = orders.get(order_id)
+    if order is None:
+        return
+
+    filled: int = filled_volumes.get(order_id, 0) + volume
+    unmatched: int = min(
+        filled - (order.volume - order.remaining_volume), order.remaining_volume
+    )
+    if unmatched > 0:
+        book = books[order.instrument]
+        book.remove_volume_from_level(order, unmatched)
+        order.remaining_volume -= unmatched
+        book.version += 1
+
+    if order.remaining_volume == 0:
+        del orders[order_id]
+        filled_volumes.pop(order_id, None)
+    else:
+        filled_volumes[order_id] = filled
+
+
 class EventSource(QtCore.QObject):
     """A source of events for the Ready Trader Go HUD to display."""
 
@@ -138,10 +194,12 @@ class LiveEventSource(EventSource):
         self.port: int = port
 
         self.__accounts: Dict[int, CompetitorAccount] = dict()
+        self.__book_versions: List[int] = [-1 for _ in Instrument]
         self.__now: float = 0.0
         self.__order_books: List[OrderBook] = list(
             OrderBook(i, 0.0, 0.0) for i in Instrument
         )
+        self.__filled_volumes: Dict[int, Dict[int, int]] = {0: dict()}
         self.__orders: Dict[int, Dict[int, Order]] = {0: dict()}
         self.__stop_later: bool = False
         self.__teams: Dict[int, str] = {0: ""}
@@ -158,6 +216,20 @@ class LiveEventSource(EventSource):
         self.__socket.readyRead.connect(self.on_data_received)
         self.__stream = QtCore.QDataStream(self.__socket)
 
+        self.__dispatch: DispatchTable = dispatch_table(
+            {
+                MessageType.AMEND_EVENT: self.on_amend_event_message,
+                MessageType.CANCEL_EVENT: self.on_cancel_event_message,
+                MessageType.INSERT_EVENT: self.on_insert_event_message,
+                MessageType.LOGIN_EVENT: self.__on_login_event_message,
+                MessageType.HEDGE_EVENT: self.on_hedge_event_message,
+                MessageType.TRADE_EVENT: self.on_trade_event_message,
+                MessageType.BOOK_EVENT: self.on_book_event_message,
+                MessageType.LEVEL_EVENT: self.on_level_event_message,
+                MessageType.ERROR: self.__on_error_message,
+            }
+        )
+
     def __del__(self) -> None:
         """Destructor."""
         self.__socket.close()
@@ -188,27 +260,22 @@ class LiveEventSource(EventSource):
 
     def on_message(self, typ: int, data: bytes, length: int):
         """Process a message."""
-        if typ == MessageType.AMEND_EVENT and length == AMEND_EVENT_MESSAGE_SIZE:
-            self.on_amend_event_message(*AMEND_EVENT_MESSAGE.unpack_from(data))
-        elif typ == MessageType.CANCEL_EVENT and length == CANCEL_EVENT_MESSAGE_SIZE:
-            self.on_cancel_event_message(*CANCEL_EVENT_MESSAGE.unpack_from(data))
-        elif typ == MessageType.INSERT_EVENT and length == INSERT_EVENT_MESSAGE_SIZE:
-            self.on_insert_event_message(*INSERT_EVENT_MESSAGE.unpack_from(data))
-        elif typ == MessageType.LOGIN_EVENT and length == LOGIN_EVENT_MESSAGE_SIZE:
-            name, competitor_id = LOGIN_EVENT_MESSAGE.unpack_from(data)
-            self.on_login_event_message(name.rstrip(b"\0").decode(), competitor_id)
-        elif typ == MessageType.HEDGE_EVENT and length == HEDGE_EVENT_MESSAGE_SIZE:
-            self.on_hedge_event_message(*HEDGE_EVENT_MESSAGE.unpack_from(data))
-        elif typ == MessageType.TRADE_EVENT and length == TRADE_EVENT_MESSAGE_SIZE:
-            self.on_trade_event_message(*TRADE_EVENT_MESSAGE.unpack_from(data))
-        elif typ == MessageType.ERROR and length == ERROR_MESSAGE_SIZE:
-            client_order_id, error_message = ERROR_MESSAGE.unpack_from(data)
-            self.on_error_message(client_order_id, error_message.rstrip(b"\x00"))
+        entry = self.__dispatch.get(typ)
+        if entry is not None and entry[0] == length:
+            entry[2](*entry[1](data))
         else:
             self.event_source_error_occurred.emit(
                 "received invalid message: length=%d type=%d" % (length, typ)
             )
 
+    def __on_error_message(self, client_order_id: int, error_message: bytes) -> None:
+        """Callback when an error message is received."""
+        self.on_error_message(client_order_id, error_message.rstrip(b"\x00"))
+
+    def __on_login_event_message(self, name: bytes, competitor_id: int) -> None:
+        """Callback when a login event message is received."""
+        self.on_login_event_message(name.rstrip(b"\0").decode(), competitor_id)
+
     def on_error_message(self, client_order_id: int, error_message: bytes):
         """Callback when an error message is received."""
 
@@ -224,11 +291,26 @@ class LiveEventSource(EventSource):
             )
             if order.remaining_volume == 0:
                 del self.__orders[competitor_id][order_id]
+                self.__filled_volumes[competitor_id].pop(order_id, None)
         if competitor_id != 0:
             self.order_amended.emit(
                 self.__teams[competitor_id], now, order_id, volume_delta
             )
 
+    def on_book_event_message(
+        self, now: float, instrument: int, last_traded_price: int
+    ) -> None:
+        """Callback when a book event message, which starts a keyframe, is
+        received."""
+        self.__now = now
+        restart_order_book(
+            self.__order_books,
+            self.__orders[0],
+            [o for i, o in self.__orders.items() if i != 0],
+            Instrument(instrument),
+            last_traded_price or None,
+        )
+
     def on_cancel_event_message(
         self, now: float, competitor_id: int, order_id: int
     ) -> None:
@@ -237,6 +319,7 @@ class LiveEventSource(EventSource):
         order = self.__orders[competitor_id].pop(order_id, None)
         if order is not None:
             self.__order_books[order.instrument].cancel(now, order)
+            self.__filled_volumes[competitor_id].pop(order_id, None)
         if competitor_id != 0:
             self.order_cancelled.emit(self.__teams[competitor_id], now, order_id)
 
@@ -290,10 +373,27 @@ class LiveEventSource(EventSource):
             Instrument(instrument), Side(side), price, volume, 0
         )
 
+    def on_level_event_message(
+        self, now: float, instrument: int, side: int, volume: int, price: int
+    ) -> None:
+        """Callback when a level event message is received."""
+        self.__order_books[instrument].place(
+            now,
+            Order(
+                0,
+                Instrument(instrument),
+                Lifespan.GOOD_FOR_DAY,
+                Side(side),
+                price,
+                volume,
+            ),
+        )
+
     def on_login_event_message(self, name: str, competitor_id: int) -> None:
         """Callback when an login event message is received."""
         self.__accounts[competitor_id] = self._account_factory.create()
         self.__teams[competitor_id] = name
+        self.__filled_volumes[competitor_id] = dict()
         self.__orders[competitor_id] = dict()
         self.login_occurred.emit(name)
 
@@ -306,20 +406,22 @@ class LiveEventSource(EventSource):
             midpoint_price: float = self.__order_books[i].midpoint_price()
             if midpoint_price is not None:
                 self.midpoint_price_changed.emit(i, self.__now, midpoint_price)
-                self.__order_books[i].top_levels(
-                    self.__ask_prices,
-                    self.__ask_volumes,
-                    self.__bid_prices,
-                    self.__bid_volumes,
-                )
-                self.order_book_changed.emit(
-                    i,
-                    self.__now,
-                    self.__ask_prices,
-                    self.__ask_volumes,
-                    self.__bid_prices,
-                    self.__bid_volumes,
-                )
+                book = self.__order_books[i]
+                top = book.top_levels_if_changed(self.__book_versions[i])
+                if top is not None:
+                    self.__book_versions[i] = book.version
+                    self.__ask_prices[:] = top[0]
+                    self.__ask_volumes[:] = top[1]
+                    self.__bid_prices[:] = top[2]
+                    self.__bid_volumes[:] = top[3]
+                    self.order_book_changed.emit(
+                        i,
+                        self.__now,
+                        self.__ask_prices,
+                        self.__ask_volumes,
+                        self.__bid_prices,
+                        self.__bid_volumes,
+                    )
 
         future_price: int = self.__order_books[Instrument.FUTURE].last_traded_price()
         etf_price: int = self.__order_books[Instrument.ETF].last_traded_price()
@@ -362,9 +464,13 @@ class LiveEventSource(EventSource):
             self.__teams[competitor_id], now, order_id, Side(side), volume, price, fee
         )
 
-        order = self.__orders[competitor_id].get(order_id)
-        if order and order.remaining_volume == 0:
-            del self.__orders[competitor_id][order_id]
+        fill_order(
+            self.__order_books,
+            self.__orders[competitor_id],
+            self.__filled_volumes[competitor_id],
+            order_id,
+            volume,
+        )
 
     def start(self) -> None:
         """Start this live event source."""
@@ -444,7 +550,8 @@ class RecordedEventSource(EventSource):
         accounts: Dict[str, CompetitorAccount] = collections.defaultdict(
             source._account_factory.create
         )
-        books: Tuple[OrderBook, ...] = tuple(OrderBook(i, 0.0, 0.0) for i in Instrument)
+        books: List[OrderBook] = list(OrderBook(i, 0.0, 0.0) for i in Instrument)
+        filled_volumes: Dict[str, Dict[int, int]] = collections.defaultdict(dict)
         orders: Dict[str, Dict[int, Order]] = collections.defaultdict(dict)
 
         ask_prices = [0] * TOP_LEVEL_COUNT
@@ -454,14 +561,15 @@ class RecordedEventSource(EventSource):
 
         def take_snapshot(when: float):
             for i in Instrument:
+                snapshot = books[i].snapshot()
                 events.append(
                     Event(
                         when,
                         source.midpoint_price_changed.emit,
-                        (i, when, books[i].midpoint_price()),
+                        (i, when, snapshot.midpoint_price()),
                     )
                 )
-                books[i].top_levels(ask_prices, ask_volumes, bid_prices, bid_volumes)
+                snapshot.top_levels(ask_prices, ask_volumes, bid_prices, bid_volumes)
                 source.__order_books[i].extend(
                     itertools.chain(ask_prices, ask_volumes, bid_prices, bid_volumes)
                 )
@@ -530,11 +638,15 @@ class RecordedEventSource(EventSource):
                     )
                 )
             elif operation == "Amend":
-                order = orders[team][order_id]
+                order = orders[team].get(order_id)
                 volume_delta = int(row[6])
-                books[order.instrument].amend(tm, order, order.volume + volume_delta)
-                if order.remaining_volume == 0:
-                    del orders[team][order_id]
+                if order is not None:
+                    books[order.instrument].amend(
+                        tm, order, order.volume + volume_delta
+                    )
+                    if order.remaining_volume == 0:
+                        del orders[team][order_id]
+                        filled_volumes[team].pop(order_id, None)
                 events.append(
                     Event(
                         tm,
@@ -546,9 +658,30 @@ class RecordedEventSource(EventSource):
                 order = orders[team].pop(order_id, None)
                 if order:
                     books[order.instrument].cancel(tm, order)
+                    filled_volumes[team].pop(order_id, None)
                 events.append(
                     Event(tm, source.order_cancelled.emit, (team, tm, order_id))
                 )
+            elif operation == "Book":
+                restart_order_book(
+                    books,
+                    orders[""],
+                    [o for t, o in orders.items() if t != ""],
+                    Instrument(int(row[4])),
+                    int(row[7]) if row[7] else None,
+                )
+            elif operation == "Level":
+                books[int(row[4])].place(
+                    tm,
+                    Order(
+                        order_id,
+                        Instrument(int(row[4])),
+                        Lifespan.GOOD_FOR_DAY,
+                        Side[row[5]],
+                        int(row[7]),
+                        int(row[6]),
+                    ),
+                )
             else:  # operation is "Hedge" or "Trade"
                 instrument = Instrument(int(row[4]))
                 side = Side[row[5]]
@@ -557,11 +690,9 @@ class RecordedEventSource(EventSource):
                 fee = int(row[9]) if row[9] else 0
                 accounts[team].transact(instrument, side, price, volume, fee)
                 if operation == "Trade":
-                    if (
-                        order_id in orders[team]
-                        and orders[team][order_id].remaining_volume == 0
-                    ):
-                        del orders[team][order_id]
+                    fill_order(
+                        books, orders[team], filled_volumes[team], order_id, volume
+                    )
                     events.append(
                         Event(
                             tm,
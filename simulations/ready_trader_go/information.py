@@ -21,16 +21,14 @@ import logging
 from typing import Iterable, List, Optional, Tuple
 
 from .messages import (
-    HEADER,
     HEADER_SIZE,
+    MESSAGES,
     ORDER_BOOK_HEADER,
     ORDER_BOOK_HEADER_SIZE,
     ORDER_BOOK_MESSAGE,
-    ORDER_BOOK_MESSAGE_SIZE,
     TRADE_TICKS_HEADER,
     TRADE_TICKS_HEADER_SIZE,
     TRADE_TICKS_MESSAGE,
-    TRADE_TICKS_MESSAGE_SIZE,
     MessageType,
 )
 from .order_book import TOP_LEVEL_COUNT, OrderBook
@@ -73,17 +71,11 @@ class InformationPublisher(asyncio.DatagramProtocol):
         self.__bid_volumes: List[int] = [0] * TOP_LEVEL_COUNT
 
         # Message buffers
-        self.__book_message = bytearray(ORDER_BOOK_MESSAGE_SIZE)
-        self.__ticks_message = bytearray(TRADE_TICKS_MESSAGE_SIZE)
-        HEADER.pack_into(
-            self.__book_message,
-            0,
-            ORDER_BOOK_MESSAGE_SIZE,
-            MessageType.ORDER_BOOK_UPDATE,
-        )
-        HEADER.pack_into(
-            self.__ticks_message, 0, TRADE_TICKS_MESSAGE_SIZE, MessageType.TRADE_TICKS
-        )
+        self.__book_messages = [
+            MESSAGES[MessageType.ORDER_BOOK_UPDATE].new_message() for _ in Instrument
+        ]
+        self.__book_versions: List[int] = [-1 for _ in Instrument]
+        self.__ticks_message = MESSAGES[MessageType.TRADE_TICKS].new_message()
 
     def connection_made(self, transport: asyncio.WriteTransport) -> None:
         """Called when the datagram endpoint is created."""
@@ -91,26 +83,28 @@ class InformationPublisher(asyncio.DatagramProtocol):
         self.__transport = transport
 
     def on_timer_tick(self, timer: Timer, now: float, tick_number: int) -> None:
-        """Called each time the timer ticks."""
+        """Called each time the timer ticks.
+
+        The order book part of each message is only repacked if the book has
+        changed since the last tick.
+        """
         for book in self.__order_books:
-            book.top_levels(
-                self.__ask_prices,
-                self.__ask_volumes,
-                self.__bid_prices,
-                self.__bid_volumes,
-            )
+            book_message = self.__book_messages[book.instrument]
+            top = book.top_levels_if_changed(self.__book_versions[book.instrument])
+            if top is not None:
+                self.__book_versions[book.instrument] = book.version
+                ORDER_BOOK_MESSAGE.pack_into(
+                    book_message,
+                    ORDER_BOOK_HEADER_SIZE,
+                    *top[0],
+                    *top[1],
+                    *top[2],
+                    *top[3]
+                )
             ORDER_BOOK_HEADER.pack_into(
-                self.__book_message, HEADER_SIZE, book.instrument, tick_number
-            )
-            ORDER_BOOK_MESSAGE.pack_into(
-                self.__book_message,
-                ORDER_BOOK_HEADER_SIZE,
-                *self.__ask_prices,
-                *self.__ask_volumes,
-                *self.__bid_prices,
-                *self.__bid_volumes
+                book_message, HEADER_SIZE, book.instrument, tick_number
             )
-            self.__transport.write(self.__book_message)
+            self.__transport.write(book_message)
 
     def on_trade(self, book: OrderBook) -> None:
         """Called when a trade occurs in one of the order books."""
@@ -0,0 +1,203 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import csv
+import logging
+import os
+import time
+
+from typing import Dict, List
+
+from .timer import Timer
+
+# Stages of the handling of an auto-trader's insert order message
+RECEIVE = "receive"  # From data arriving to the message being handled
+LIMITER = "limiter"  # Message frequency limit check
+ADVANCE_TIME = "advance_time"  # Applying the market events that are due
+COMPETITOR = "competitor"  # Competitor.on_insert_message
+ORDER_BOOK = "order_book"  # OrderBook.insert of a competitor's order
+WRITE = "write"  # From the insert being handled to the replies being written
+TOTAL = "total"  # From data arriving to the replies being written
+LATENCY_STAGES = (RECEIVE, LIMITER, ADVANCE_TIME, COMPETITOR, ORDER_BOOK, WRITE, TOTAL)
+
+# Every value below 2**SUB_BUCKET_BITS nanoseconds has its own bucket; above
+# that, each power of two is split into 2**(SUB_BUCKET_BITS - 1) buckets, so a
+# recorded value is never more than 1/64th (about 1.6%) above its true value
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_HALF = 2 ** (SUB_BUCKET_BITS - 1)
+
+# Values are recorded up to 2**MAXIMUM_BITS nanoseconds (about 18 minutes)
+MAXIMUM_BITS = 40
+
+# Default match time in seconds between updates of the latency file
+LATENCY_REPORT_INTERVAL = 10.0
+
+# Percentiles reported for each stage
+LATENCY_PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """A histogram of latencies in nanoseconds.
+
+    Like an HDR histogram, buckets are a constant width up to 128ns and then
+    get wider in proportion to the values they hold, so recording a value
+    takes constant time and memory does not grow with the number of values.
+    """
+
+    def __init__(self):
+        """Initialise a new instance of the LatencyHistogram class."""
+        self.count: int = 0
+        self.maximum: int = 0
+        self.minimum: int = 0
+        self.total: int = 0
+
+        self.__counts: List[int] = [0] * bucket_index(2**MAXIMUM_BITS - 1) + [0]
+
+    def mean(self) -> float:
+        """Return the mean of the recorded values."""
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, value: int) -> None:
+        """Record a value."""
+        if value < 0:
+            value = 0
+        elif value >= 2**MAXIMUM_BITS:
+            value = 2**MAXIMUM_BITS - 1
+        self.__counts[bucket_index(value)] += 1
+        if self.count == 0 or value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.count += 1
+        self.total += value
+
+    def value_at_percentile(self, percentile: float) -> int:
+        """Return the highest value in the bucket holding the given percentile."""
+        if self.count == 0:
+            return 0
+        target: int = max(1, round(self.count * percentile / 100.0))
+        seen: int = 0
+        for index, count in enumerate(self.__counts):
+            seen += count
+            if seen >= target:
+                return min(bucket_highest_value(index), self.maximum)
+        return self.maximum
+
+
+def bucket_index(value: int) -> int:
+    """Return the index of the histogram bucket for a value."""
+    if value < 2 * SUB_BUCKET_HALF:
+        return value
+    shift: int = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKET_HALF * shift + (value >> shift)
+
+
+def bucket_highest_value(index: int) -> int:
+    """Return the highest value held in the histogram bucket with an index."""
+    if index < 2 * SUB_BUCKET_HALF:
+        return index
+    shift: int = index // SUB_BUCKET_HALF - 1
+    return ((index - SUB_BUCKET_HALF * shift + 1) << shift) - 1
+
+
+class LatencyRecorder:
+    """A recorder of how long each stage of handling auto-trader insert
+    order messages takes.
+
+    Each stage has a LatencyHistogram. The histograms are written to a CSV
+    file every report interval (in match time) while the match runs, so the
+    file can be watched, and again when the match ends, when they are also
+    written to the log.
+    """
+
+    def __init__(self, filename: str, timer: Timer, report_interval: float):
+        """Initialise a new instance of the LatencyRecorder class."""
+        self.filename: str = filename
+        self.histograms: Dict[str, LatencyHistogram] = {
+            stage: LatencyHistogram() for stage in LATENCY_STAGES
+        }
+        self.logger: logging.Logger = logging.getLogger("LATENCY")
+        self.report_interval: float = report_interval
+
+        self.__next_report_time: float = report_interval
+
+        # Connect signals
+        timer.timer_stopped.append(self.on_timer_stopped)
+        timer.timer_ticked.append(self.on_timer_tick)
+
+    def lap(self, stage: str, start: int) -> int:
+        """Record the time since start (from perf_counter_ns) as the given
+        stage and return the current perf_counter_ns, from which the next
+        stage can be timed."""
+        now: int = time.perf_counter_ns()
+        self.histograms[stage].record(now - start)
+        return now
+
+    def on_timer_stopped(self, timer: Timer, now: float) -> None:
+        """Called when the match is over."""
+        for stage, histogram in self.histograms.items():
+            self.logger.info(
+                "%s: count=%d mean=%.1fus %s max=%.1fus",
+                stage,
+                histogram.count,
+                histogram.mean() / 1000.0,
+                " ".join(
+                    "p%g=%.1fus" % (p, histogram.value_at_percentile(p) / 1000.0)
+                    for p in LATENCY_PERCENTILES
+                ),
+                histogram.maximum / 1000.0,
+            )
+        self.write()
+
+    def on_timer_tick(self, timer: Timer, now: float, tick_number: int) -> None:
+        """Called each time the timer ticks."""
+        if now >= self.__next_report_time:
+            self.__next_report_time += self.report_interval
+            if self.__next_report_time <= now:
+                self.__next_report_time = now + self.report_interval
+            self.write()
+
+    def record(self, stage: str, nanoseconds: int) -> None:
+        """Record how long a stage took."""
+        self.histograms[stage].record(nanoseconds)
+
+    def write(self) -> None:
+        """Write the histograms to the latency file.
+
+        The file is replaced in one go, so anything reading it never sees it
+        half written.
+        """
+        try:
+            with open(self.filename + ".tmp", "w", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(
+                    ["Stage", "Count", "MeanUs"]
+                    + ["P%gUs" % p for p in LATENCY_PERCENTILES]
+                    + ["MaxUs"]
+                )
+                for stage, histogram in self.histograms.items():
+                    writer.writerow(
+                        [stage, histogram.count, "%.3f" % (histogram.mean() / 1000.0)]
+                        + [
+                            "%.3f" % (histogram.value_at_percentile(p) / 1000.0)
+                            for p in LATENCY_PERCENTILES
+                        ]
+                        + ["%.3f" % (histogram.maximum / 1000.0)]
+                    )
+            os.replace(self.filename + ".tmp", self.filename)
+        except OSError as e:
+            self.logger.error("failed to write latency file: %s", e)
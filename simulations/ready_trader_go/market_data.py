@@ -0,0 +1,302 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import array
+import bz2
+import csv
+import gzip
+import hashlib
+import io
+import logging
+import lzma
+import mmap
+import os
+import pathlib
+import struct
+import sys
+import time
+
+from typing import BinaryIO, Callable, Dict, Iterator, List, TextIO, Tuple
+
+from .types import Lifespan, MarketEventOperation, Side
+
+INPUT_SCALING = 100
+
+# CSV market data files with these extensions are decompressed as they are
+# read, a block of MARKET_DATA_BLOCK_SIZE bytes at a time
+COMPRESSED_MARKET_DATA: Dict[str, Callable[..., BinaryIO]] = {
+    ".bz2": bz2.open,
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+}
+MARKET_DATA_BLOCK_SIZE = 2**20
+
+# A binary market data file starts with a header which is followed by each
+# column of the market data in turn. Columns hold one value per event and
+# start on an eight-byte boundary so that they can be used in place.
+BINARY_MARKET_DATA_SUFFIX = ".bin"
+MARKET_DATA_MAGIC = b"RTGM"
+MARKET_DATA_VERSION = 1
+
+# Magic, version, byte order (1 for little-endian) and number of events
+MARKET_DATA_HEADER = struct.Struct("<4sHHQ")
+
+# Array type codes of the time, instrument, operation, order id, side, volume,
+# price and lifespan columns
+MARKET_DATA_COLUMNS = ("d", "B", "B", "Q", "B", "q", "q", "B")
+
+# Stored in the side and lifespan columns of amend and cancel events
+NO_VALUE = 2
+
+# CSV market data files are cached as binary market data files named after
+# a digest of their size, modification time and contents
+MARKET_DATA_CACHE_SIZE = 1024  # megabytes
+MARKET_DATA_CACHE_KEY = struct.Struct("!Qq")  # Size and modification time
+
+
+class MarketDataError(Exception):
+    """Raised when a binary market data file cannot be read."""
+
+
+def column_offsets(event_count: int) -> List[int]:
+    """Return the file offset of each column."""
+    offsets: List[int] = list()
+    offset: int = MARKET_DATA_HEADER.size
+    for code in MARKET_DATA_COLUMNS:
+        offset = (offset + 7) & ~7
+        offsets.append(offset)
+        offset += event_count * array.array(code).itemsize
+    return offsets
+
+
+def is_binary_market_data(filename: str) -> bool:
+    """Return True if the named market data file is in the binary format."""
+    return filename.lower().endswith(BINARY_MARKET_DATA_SUFFIX)
+
+
+def open_csv_market_data(filename: str) -> TextIO:
+    """Open a CSV market data file for reading, decompressing it on the fly
+    if its extension is one of those in COMPRESSED_MARKET_DATA.
+    """
+    opener = COMPRESSED_MARKET_DATA.get(os.path.splitext(filename)[1].lower())
+    if opener is None:
+        return open(filename, "r", newline="")
+    return io.TextIOWrapper(
+        io.BufferedReader(opener(filename, "rb"), MARKET_DATA_BLOCK_SIZE), newline=""
+    )
+
+
+def convert_market_data(source: TextIO, target: BinaryIO) -> int:
+    """Convert a market data file from CSV to binary and return the number of
+    events converted.
+    """
+    columns = tuple(array.array(code) for code in MARKET_DATA_COLUMNS)
+    (
+        times,
+        instruments,
+        operations,
+        order_ids,
+        sides,
+        volumes,
+        prices,
+        lifespans,
+    ) = columns
+
+    csv_reader = csv.reader(source)
+    next(csv_reader)  # Skip header row
+    for row in csv_reader:
+        # time, instrument, operation, order_id, side, volume, price, lifespan
+        times.append(float(row[0]))
+        instruments.append(int(row[1]))
+        operations.append(MarketEventOperation[row[2]])
+        order_ids.append(int(row[3]))
+        sides.append(Side[row[4]] if row[4] else NO_VALUE)
+        volumes.append(int(float(row[5])) if row[5] else 0)
+        prices.append(int(float(row[6]) * INPUT_SCALING) if row[6] else 0)
+        lifespans.append(Lifespan[row[7]] if row[7] else NO_VALUE)
+
+    event_count: int = len(times)
+    target.write(
+        MARKET_DATA_HEADER.pack(
+            MARKET_DATA_MAGIC,
+            MARKET_DATA_VERSION,
+            sys.byteorder == "little",
+            event_count,
+        )
+    )
+    for column, offset in zip(columns, column_offsets(event_count)):
+        target.write(bytes(offset - target.tell()))
+        column.tofile(target)
+
+    return event_count
+
+
+def convert_market_data_file(filename: pathlib.Path) -> pathlib.Path:
+    """Convert a (possibly compressed) CSV market data file into a binary
+    file alongside it and return the name of the binary file.
+    """
+    output: pathlib.Path = filename
+    if output.suffix.lower() in COMPRESSED_MARKET_DATA:
+        output = output.with_suffix("")
+    output = output.with_suffix(BINARY_MARKET_DATA_SUFFIX)
+    with open_csv_market_data(str(filename)) as source, output.open("wb") as target:
+        convert_market_data(source, target)
+    return output
+
+
+class BinaryMarketData(object):
+    """A memory-mapped binary market data file."""
+
+    def __init__(self, file: BinaryIO):
+        """Initialise a new instance of the BinaryMarketData class."""
+        self.__mmap: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__view: memoryview = memoryview(self.__mmap)
+        self.columns: Tuple[memoryview, ...] = tuple()
+
+        if len(self.__mmap) < MARKET_DATA_HEADER.size:
+            self.close()
+            raise MarketDataError("market data file is truncated")
+
+        (
+            magic,
+            version,
+            little_endian,
+            self.event_count,
+        ) = MARKET_DATA_HEADER.unpack_from(self.__mmap)
+        if magic != MARKET_DATA_MAGIC or version != MARKET_DATA_VERSION:
+            self.close()
+            raise MarketDataError("not a binary market data file")
+        if little_endian != (sys.byteorder == "little"):
+            self.close()
+            raise MarketDataError("market data file has the wrong byte order")
+
+        columns: List[memoryview] = list()
+        for code, offset in zip(MARKET_DATA_COLUMNS, column_offsets(self.event_count)):
+            end: int = offset + self.event_count * array.array(code).itemsize
+            if end > len(self.__mmap):
+                self.close()
+                raise MarketDataError("market data file is truncated")
+            columns.append(self.__view[offset:end].cast(code))
+        self.columns = tuple(columns)
+
+    def __enter__(self):
+        """Return this object for use in a with statement."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the file at the end of a with statement."""
+        self.close()
+
+    def close(self) -> None:
+        """Release the memory-mapped file."""
+        for column in self.columns:
+            column.release()
+        self.columns = tuple()
+        self.__view.release()
+        self.__mmap.close()
+
+    def events(self, start: int = 0) -> Iterator[Tuple]:
+        """Return an iterator over the events from the given index onwards.
+
+        Each event is a tuple of time, instrument, operation, order id, side,
+        volume, price and lifespan with the enumerations given as integers
+        (the side and lifespan are NO_VALUE for amend and cancel events).
+        """
+        return zip(*(column[start:] for column in self.columns))
+
+
+class MarketDataCache(object):
+    """A directory of binary market data files converted from CSV files.
+
+    Each file is used in place of the CSV file it was converted from until
+    that file changes. When the files in the directory take more than the
+    size limit, the least recently used are removed (along with any other
+    files sharing their name, such as a market data index).
+    """
+
+    def __init__(
+        self, directory: str, size_limit: int = MARKET_DATA_CACHE_SIZE * 2**20
+    ):
+        """Initialise a new instance of the MarketDataCache class."""
+        self.directory: pathlib.Path = pathlib.Path(directory)
+        self.logger: logging.Logger = logging.getLogger("MARKET_DATA_CACHE")
+        self.size_limit: int = size_limit
+
+    def evict(self, keep: pathlib.Path) -> None:
+        """Remove the least recently used files until the cache is within its
+        size limit, never removing the given file.
+        """
+        entries: Dict[str, List[os.DirEntry]] = dict()
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and ".tmp" not in entry.name:
+                entries.setdefault(entry.name.split(".")[0], list()).append(entry)
+
+        total_size: int = 0
+        last_used: List[Tuple[float, str]] = list()
+        for key, files in entries.items():
+            total_size += sum(f.stat().st_size for f in files)
+            if key != keep.name.split(".")[0]:
+                last_used.append((max(f.stat().st_atime for f in files), key))
+
+        last_used.sort()
+        for _, key in last_used:
+            if total_size <= self.size_limit:
+                break
+            for f in entries[key]:
+                total_size -= f.stat().st_size
+                os.remove(f.path)
+            self.logger.info("evicted '%s' from the market data cache", key)
+
+    def get(self, filename: str) -> str:
+        """Return the name of a binary market data file holding the events in
+        the given market data file, converting it first if it is not cached.
+        """
+        if is_binary_market_data(filename):
+            return filename
+
+        stat = os.stat(filename)
+        with open(filename, "rb") as source:
+            digest = hashlib.file_digest(source, "blake2b")
+        digest.update(MARKET_DATA_CACHE_KEY.pack(stat.st_size, stat.st_mtime_ns))
+        path: pathlib.Path = self.directory / (
+            digest.hexdigest()[:32] + BINARY_MARKET_DATA_SUFFIX
+        )
+
+        if path.is_file():
+            # Record the use in the access time, keeping the modification
+            # time on which a market data index depends
+            os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+            self.logger.info("using cached market data file '%s'", path)
+            return str(path)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary: pathlib.Path = path.with_name("%s.tmp%d" % (path.name, os.getpid()))
+        try:
+            with open_csv_market_data(filename) as source, temporary.open(
+                "wb"
+            ) as target:
+                event_count: int = convert_market_data(source, target)
+            os.replace(temporary, path)
+        finally:
+            if temporary.exists():
+                temporary.unlink()
+        self.logger.info(
+            "cached %d market events from '%s' in '%s'", event_count, filename, path
+        )
+
+        self.evict(path)
+        return str(path)
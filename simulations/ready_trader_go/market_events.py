@@ -17,28 +17,31 @@
 #     <https://www.gnu.org/licenses/>.
 import asyncio
 import csv
-import enum
+import itertools
 import logging
 import queue
 import threading
 
-from typing import Callable, Dict, List, Optional, TextIO
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
 
+from .market_data import (
+    INPUT_SCALING,
+    BinaryMarketData,
+    is_binary_market_data,
+    open_csv_market_data,
+)
 from .match_events import MatchEvents
-from .order_book import IOrderListener, Order, OrderBook
-from .types import Instrument, Lifespan, Side
+from .order_book import IOrderListener, Order, OrderBook, OrderPool
+from .types import Instrument, Lifespan, MarketEventOperation, Side
 
-MARKET_EVENT_QUEUE_SIZE = 1024
-INPUT_SCALING = 100
+MARKET_EVENT_CHUNK_SIZE = 4096
+MARKET_EVENT_QUEUE_SIZE = 16  # chunks
 
-
-class MarketEventOperation(enum.IntEnum):
-    AMEND = 0
-    CANCEL = 1
-    INSERT = 2
-    Amend = AMEND
-    Cancel = CANCEL
-    Insert = INSERT
+# Enumeration values indexed by their binary market data representation
+INSTRUMENTS = tuple(Instrument)
+LIFESPANS = (Lifespan.FILL_AND_KILL, Lifespan.GOOD_FOR_DAY, None)
+OPERATIONS = tuple(MarketEventOperation)
+SIDES = (Side.SELL, Side.BUY, None)
 
 
 class MarketEvent(object):
@@ -77,9 +80,79 @@ class MarketEvent(object):
         self.lifespan: Optional[Lifespan] = lifespan
 
 
+def binary_market_events(
+    binary_data: BinaryMarketData, skip: int = 0
+) -> Iterator[MarketEvent]:
+    """Return an iterator over the events in binary market data after the
+    first skip events.
+    """
+    return (
+        MarketEvent(
+            time,
+            INSTRUMENTS[instrument],
+            OPERATIONS[operation],
+            order_id,
+            SIDES[side],
+            volume,
+            price,
+            LIFESPANS[lifespan],
+        )
+        for (
+            time,
+            instrument,
+            operation,
+            order_id,
+            side,
+            volume,
+            price,
+            lifespan,
+        ) in binary_data.events(skip)
+    )
+
+
+def csv_market_events(market_data: TextIO, skip: int = 0) -> Iterator[MarketEvent]:
+    """Return an iterator over the events in a CSV market data file after the
+    first skip events, which are passed over without parsing.
+    """
+    csv_reader = csv.reader(market_data)
+    next(csv_reader)  # Skip header row
+    for _ in itertools.islice(market_data, skip):
+        pass
+    # time, instrument, operation, order_id, side, volume, price, lifespan
+    return (
+        MarketEvent(
+            float(row[0]),
+            Instrument(int(row[1])),
+            MarketEventOperation[row[2]],
+            int(row[3]),
+            Side[row[4]] if row[4] else None,
+            int(float(row[5])) if row[5] else 0,
+            int(float(row[6]) * INPUT_SCALING) if row[6] else 0,
+            Lifespan[row[7]] if row[7] else None,
+        )
+        for row in csv_reader
+    )
+
+
+def read_market_events(filename: str, skip: int = 0) -> Iterator[MarketEvent]:
+    """Yield the events in the named market data file (binary or CSV) after
+    the first skip events, closing the file when done.
+    """
+    if is_binary_market_data(filename):
+        with open(filename, "rb") as market_data, BinaryMarketData(
+            market_data
+        ) as binary_data:
+            yield from binary_market_events(binary_data, skip)
+    else:
+        with open_csv_market_data(filename) as market_data:
+            yield from csv_market_events(market_data, skip)
+
+
 class MarketEventsReader(IOrderListener):
     """A processor of market events read from a file."""
 
+    aggregate_fills: bool = True
+
     def __init__(
         self,
         filename: str,
@@ -91,12 +164,20 @@ class MarketEventsReader(IOrderListener):
         """Initialise a new instance of the MarketEvents class."""
         self.etf_book: OrderBook = etf_book
         self.etf_orders: Dict[int, Order] = dict()
+        self.event_count: int = 0
         self.event_loop: asyncio.AbstractEventLoop = loop
         self.filename: str = filename
         self.future_book: OrderBook = future_book
         self.future_orders: Dict[int, Order] = dict()
         self.logger: logging.Logger = logging.getLogger("MARKET_EVENTS")
+        self.__chunk: List[MarketEvent] = list()
+        self.__cursor: int = 0
+        self.__replaying: bool = False
         self.match_events: MatchEvents = match_events
+        # Set to False to leave market orders out of the match events (see
+        # BookKeyframes)
+        self.log_market_orders: bool = True
+        self.order_pool: OrderPool = OrderPool()
         self.queue: queue.Queue = queue.Queue(MARKET_EVENT_QUEUE_SIZE)
         self.reader_task: Optional[threading.Thread] = None
 
@@ -111,15 +192,35 @@ class MarketEventsReader(IOrderListener):
             0,
             Lifespan.FILL_AND_KILL,
         )
+        self.__primer: MarketEvent = self.next_event
 
         # Allow other objects to get a callback when the reader task is complete
         self.task_complete: List[Callable] = list()
 
     # IOrderListener callbacks
 
+    def on_batch_applied(
+        self, now: float, book: OrderBook, events: List[Tuple]
+    ) -> None:
+        """Called when a batch of market events has been applied to a book."""
+        if self.__replaying or not self.log_market_orders:
+            return
+        match_events = self.match_events
+        instrument = book.instrument
+        for time, operation, order_id, side, volume, price, lifespan in events:
+            if operation == MarketEventOperation.INSERT:
+                match_events.insert(
+                    time, "", order_id, instrument, side, volume, price, lifespan
+                )
+            elif operation == MarketEventOperation.CANCEL:
+                match_events.cancel(time, "", order_id, volume)
+            else:
+                match_events.amend(time, "", order_id, volume)
+
     def on_order_amended(self, now: float, order: Order, volume_removed: int) -> None:
         """Called when the order is amended."""
-        self.match_events.amend(now, "", order.client_order_id, -volume_removed)
+        if self.log_market_orders and not self.__replaying:
+            self.match_events.amend(now, "", order.client_order_id, -volume_removed)
         if order.remaining_volume == 0:
             if order.instrument == Instrument.FUTURE:
                 del self.future_orders[order.client_order_id]
@@ -128,7 +229,8 @@ class MarketEventsReader(IOrderListener):
 
     def on_order_cancelled(self, now: float, order: Order, volume_removed: int) -> None:
         """Called when the order is cancelled."""
-        self.match_events.cancel(now, "", order.client_order_id, -volume_removed)
+        if self.log_market_orders and not self.__replaying:
+            self.match_events.cancel(now, "", order.client_order_id, -volume_removed)
         if (
             order.instrument == Instrument.FUTURE
             and order.client_order_id in self.future_orders
@@ -147,21 +249,18 @@ class MarketEventsReader(IOrderListener):
         elif order.instrument == Instrument.ETF:
             self.etf_orders[order.client_order_id] = order
 
-    def on_order_filled(
-        self, now: float, order: Order, price: int, volume: int, fee: int
-    ) -> None:
-        """Called when the order is partially or completely filled."""
-        if order.remaining_volume == 0:
+    def on_orders_filled(self, now: float, fills: List[Tuple]) -> None:
+        """Called with the fills of market orders caused by an aggressive order."""
+        if fills[0][0].instrument == Instrument.FUTURE:
+            orders = self.future_orders
+        else:
+            orders = self.etf_orders
+        for order, _, _, _ in fills:
             if (
-                order.instrument == Instrument.FUTURE
-                and order.client_order_id in self.future_orders
-            ):
-                del self.future_orders[order.client_order_id]
-            elif (
-                order.instrument == Instrument.ETF
-                and order.client_order_id in self.etf_orders
+                order.remaining_volume == 0
+                and orders.pop(order.client_order_id, None) is not None
             ):
-                del self.etf_orders[order.client_order_id]
+                self.order_pool.release(order)
 
     def on_reader_done(self, num_events: int) -> None:
         """Called when the market data reader thread is done."""
@@ -169,85 +268,147 @@ class MarketEventsReader(IOrderListener):
             "reader thread complete after processing %d market events", num_events
         )
 
-    def process_market_events(self, elapsed_time: float) -> None:
-        """Process market events from the queue."""
+    def process_market_events(self, elapsed_time: float, limit: int = 0) -> int:
+        """Process market events from the queue and return the number of
+        events processed.
+
+        The reader thread passes events over in chunks (of up to
+        MARKET_EVENT_CHUNK_SIZE events) which are consumed with a cursor.
+        Consecutive events for the same instrument are applied to the order
+        book as a single batch. If limit is not zero, at most that many events
+        are processed and any others that are due are left for the next call.
+        """
         evt: MarketEvent = self.next_event
+        batch: List[MarketEvent] = list()
+        chunk: List[MarketEvent] = self.__chunk
+        count: int = 0
+        cursor: int = self.__cursor
 
-        while evt and evt.time < elapsed_time:
-            if evt.instrument == Instrument.FUTURE:
-                orders = self.future_orders
-                book = self.future_book
+        while evt and evt.time < elapsed_time and (not limit or count < limit):
+            if batch and evt.instrument != batch[0].instrument:
+                self.__apply_batch(batch)
+                batch = list()
+            batch.append(evt)
+            count += 1
+            if cursor == len(chunk):
+                chunk = self.queue.get() or list()
+                cursor = 0
+            if chunk:
+                evt = chunk[cursor]
+                cursor += 1
             else:
-                orders = self.etf_orders
-                book = self.etf_book
-
-            if evt.operation == MarketEventOperation.INSERT:
-                order = Order(
-                    evt.order_id,
-                    evt.instrument,
-                    evt.lifespan,
-                    evt.side,
-                    evt.price,
-                    evt.volume,
-                    self,
-                )
-                self.match_events.insert(
-                    evt.time,
-                    "",
-                    order.client_order_id,
-                    order.instrument,
-                    order.side,
-                    abs(order.volume),
-                    order.price,
-                    order.lifespan,
-                )
-                book.insert(evt.time, order)
-            elif evt.order_id in orders:
-                order = orders[evt.order_id]
-                if evt.operation == MarketEventOperation.CANCEL:
-                    book.cancel(evt.time, order)
-                elif evt.volume < 0:
-                    # evt.operation must be MarketEventOperation.AMEND
-                    book.amend(evt.time, order, order.volume + evt.volume)
+                evt = None
 
-            evt = self.queue.get()
+        if batch:
+            self.__apply_batch(batch)
 
         self.next_event = evt
+        self.__chunk = chunk
+        self.__cursor = cursor
         if evt is None:
             for c in self.task_complete:
                 c(self)
+        return count
+
+    def __apply_batch(self, batch: List[MarketEvent]) -> None:
+        """Apply a batch of market events for a single instrument."""
+        self.event_count += len(batch)
+        if batch[0] is self.__primer:
+            # The no-op event that primes the pump is not in the market data
+            self.event_count -= 1
+        if batch[0].instrument == Instrument.FUTURE:
+            self.future_book.apply_batch(
+                batch, self.future_orders, self, self.order_pool
+            )
+        else:
+            self.etf_book.apply_batch(batch, self.etf_orders, self, self.order_pool)
+
+    def binary_reader(self, market_data: BinaryIO, skip: int) -> None:
+        """Read a binary market data file and place order events in the queue.
 
-    def reader(self, market_data: TextIO) -> None:
-        """Read the market data file and place order events in the queue."""
+        The first skip events in the file are passed over (see reader).
+        """
+        with market_data, BinaryMarketData(market_data) as binary_data:
+            count: int = self.__put_chunks(binary_market_events(binary_data, skip))
+        self.event_loop.call_soon_threadsafe(self.on_reader_done, skip + count)
+
+    def __put_chunks(self, events: Iterator[MarketEvent]) -> int:
+        """Place the given events in the queue in chunks, followed by None,
+        and return the number of events placed.
+        """
         fifo = self.queue
+        count: int = 0
+        chunk: List[MarketEvent] = list(
+            itertools.islice(events, MARKET_EVENT_CHUNK_SIZE)
+        )
+        while chunk:
+            fifo.put(chunk)
+            count += len(chunk)
+            chunk = list(itertools.islice(events, MARKET_EVENT_CHUNK_SIZE))
+        fifo.put(None)
+        return count
 
+    def reader(self, market_data: TextIO, skip: int) -> None:
+        """Read the market data file and place order events in the queue.
+
+        The first skip events in the file, which have already been applied to
+        the order books (see checkpoint.py), are passed over without parsing.
+        """
         with market_data:
-            csv_reader = csv.reader(market_data)
-            next(csv_reader)  # Skip header row
-            for row in csv_reader:
-                # time, instrument, operation, order_id, side, volume, price, lifespan
-                fifo.put(
-                    MarketEvent(
-                        float(row[0]),
-                        Instrument(int(row[1])),
-                        MarketEventOperation[row[2]],
-                        int(row[3]),
-                        Side[row[4]] if row[4] else None,
-                        int(float(row[5])) if row[5] else 0,
-                        int(float(row[6]) * INPUT_SCALING) if row[6] else 0,
-                        Lifespan[row[7]] if row[7] else None,
-                    )
-                )
-            fifo.put(None)
+            count: int = self.__put_chunks(csv_market_events(market_data, skip))
+        self.event_loop.call_soon_threadsafe(self.on_reader_done, skip + count)
 
-        self.event_loop.call_soon_threadsafe(
-            self.on_reader_done, csv_reader.line_num - 1
-        )
+    def replay(
+        self, events: Iterator[MarketEvent], elapsed_time: float
+    ) -> Optional[MarketEvent]:
+        """Apply the events that occur before the given time directly to the
+        order books, without recording them as match events, and return the
+        first event that was not applied (or None if there are none left).
+        """
+        batch: List[MarketEvent] = list()
+        self.__replaying = True
+        try:
+            for evt in events:
+                if evt.time >= elapsed_time:
+                    break
+                if batch and evt.instrument != batch[0].instrument:
+                    self.__apply_batch(batch)
+                    batch = list()
+                batch.append(evt)
+            else:
+                evt = None
+            if batch:
+                self.__apply_batch(batch)
+        finally:
+            self.__replaying = False
+        return evt
+
+    def fast_forward(self, elapsed_time: float) -> None:
+        """Apply the events from the market data file that occur before the
+        given time, continuing from the events already applied.
+
+        This must be called before the reader thread is started.
+        """
+        events = read_market_events(self.filename, self.event_count)
+        try:
+            self.replay(events, elapsed_time)
+        finally:
+            events.close()
 
     def start(self):
-        """Start the market events reader thread"""
+        """Start the market events reader thread.
+
+        Files with the BINARY_MARKET_DATA_SUFFIX extension are read as binary
+        market data (see market_data.py), anything else as CSV, which is
+        decompressed on the reader thread if it is gzip, xz or bzip2 (see
+        open_csv_market_data).
+        """
+        binary: bool = is_binary_market_data(self.filename)
         try:
-            market_data = open(self.filename)
+            if binary:
+                market_data = open(self.filename, "rb")
+            else:
+                market_data = open_csv_market_data(self.filename)
         except OSError as e:
             self.logger.error(
                 "failed to open market data file: filename='%s'" % self.filename,
@@ -256,6 +417,9 @@ class MarketEventsReader(IOrderListener):
             raise
         else:
             self.reader_task = threading.Thread(
-                target=self.reader, args=(market_data,), daemon=True, name="reader"
+                target=self.binary_reader if binary else self.reader,
+                args=(market_data, self.event_count),
+                daemon=True,
+                name="reader",
             )
             self.reader_task.start()
@@ -0,0 +1,277 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import array
+import math
+import os
+import pathlib
+import random
+import sys
+
+from typing import BinaryIO, Iterator, List, TextIO, Tuple
+
+from .market_data import (
+    COMPRESSED_MARKET_DATA,
+    INPUT_SCALING,
+    MARKET_DATA_COLUMNS,
+    MARKET_DATA_HEADER,
+    MARKET_DATA_MAGIC,
+    MARKET_DATA_VERSION,
+    NO_VALUE,
+    column_offsets,
+    is_binary_market_data,
+)
+from .types import Lifespan, MarketEventOperation, Side
+
+# Events are generated and written a block at a time so that files of any
+# length can be produced in bounded memory
+GENERATOR_BLOCK_SIZE = 65536
+
+DEFAULT_RATE = 1000.0  # events per second of market time
+DEFAULT_DEPTH = 10  # price levels either side of the midpoint
+DEFAULT_CANCEL_RATIO = 0.4
+DEFAULT_VOLATILITY = 0.0005  # standard deviation of log returns per root second
+
+AGGRESSIVE_RATIO = 0.05  # of inserts which cross the midpoint
+AMEND_RATIO = 0.25  # of cancels which are amends instead
+MAX_VOLUME = 50
+ORDERS_PER_LEVEL = 5
+START_PRICE = 100.0
+TICK_SIZE = 1.0
+
+CSV_HEADER = "Time,Instrument,Operation,OrderId,Side,Volume,Price,Lifespan\n"
+CSV_LIFESPANS = ("FAK", "GFD")
+CSV_SIDES = ("A", "B")
+
+
+class MarketDataGenerator(object):
+    """A generator of random market events for both instruments.
+
+    Events arrive as a Poisson process at the given rate. The midpoint price
+    of both instruments follows a geometric random walk with the given
+    volatility. Most orders are good-for-day orders placed within depth
+    price levels of the midpoint; a small share are fill-and-kill orders
+    which cross it. With probability cancel_ratio (or whenever an
+    instrument already has ORDERS_PER_LEVEL orders for each of its price
+    levels) an event cancels or reduces a previously inserted order instead.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        depth: int = DEFAULT_DEPTH,
+        cancel_ratio: float = DEFAULT_CANCEL_RATIO,
+        volatility: float = DEFAULT_VOLATILITY,
+        seed: int = 0,
+    ):
+        """Initialise a new instance of the MarketDataGenerator class."""
+        if rate <= 0.0:
+            raise ValueError("rate must be positive")
+        if depth < 1:
+            raise ValueError("depth must be at least one")
+        if not 0.0 <= cancel_ratio < 1.0:
+            raise ValueError("cancel ratio must be at least zero and less than one")
+        if volatility < 0.0:
+            raise ValueError("volatility must not be negative")
+
+        self.cancel_ratio: float = cancel_ratio
+        self.depth: int = depth
+        self.rate: float = rate
+        self.volatility: float = volatility
+
+        self.__live: Tuple[List[List[int]], ...] = (list(), list())
+        self.__live_limit: int = 2 * depth * ORDERS_PER_LEVEL
+        self.__log_price: float = math.log(START_PRICE / TICK_SIZE)
+        self.__next_order_id: int = 0
+        self.__random: random.Random = random.Random(seed)
+        self.__tick: int = round(TICK_SIZE * INPUT_SCALING)
+        self.__time: float = 0.0
+
+    def blocks(self, event_count: int) -> Iterator[Tuple[array.array, ...]]:
+        """Generate the given number of events, yielding them in blocks of up
+        to GENERATOR_BLOCK_SIZE events.
+
+        Each block is a tuple of arrays holding the columns of the binary
+        market data format (see market_data.py).
+        """
+        rnd = self.__random
+        depth = self.depth
+        tick = self.__tick
+        cancel_ratio = self.cancel_ratio
+        live_limit = self.__live_limit
+        rate = self.rate
+        volatility = self.volatility
+        log_price = self.__log_price
+        now = self.__time
+        order_id = self.__next_order_id
+
+        remaining: int = event_count
+        while remaining > 0:
+            size = min(remaining, GENERATOR_BLOCK_SIZE)
+            remaining -= size
+            columns = tuple(array.array(code) for code in MARKET_DATA_COLUMNS)
+            (
+                times,
+                instruments,
+                operations,
+                order_ids,
+                sides,
+                volumes,
+                prices,
+                lifespans,
+            ) = columns
+
+            for _ in range(size):
+                dt = rnd.expovariate(rate)
+                now += dt
+                log_price += volatility * math.sqrt(dt) * rnd.gauss(0.0, 1.0)
+                midpoint = max(round(math.exp(log_price)), depth + 1)
+
+                instrument = rnd.getrandbits(1)
+                live = self.__live[instrument]
+                times.append(now)
+                instruments.append(instrument)
+
+                if live and (len(live) >= live_limit or rnd.random() < cancel_ratio):
+                    i = rnd.randrange(len(live))
+                    order = live[i]
+                    order_ids.append(order[0])
+                    sides.append(NO_VALUE)
+                    prices.append(0)
+                    lifespans.append(NO_VALUE)
+                    if order[1] > 1 and rnd.random() < AMEND_RATIO:
+                        diff = rnd.randint(1, order[1] - 1)
+                        order[1] -= diff
+                        operations.append(MarketEventOperation.AMEND)
+                        volumes.append(-diff)
+                    else:
+                        live[i] = live[-1]
+                        live.pop()
+                        operations.append(MarketEventOperation.CANCEL)
+                        volumes.append(0)
+                    continue
+
+                side = rnd.getrandbits(1)
+                volume = rnd.randint(1, MAX_VOLUME)
+                if rnd.random() < AGGRESSIVE_RATIO:
+                    offset = -rnd.randint(1, depth)
+                    lifespan = Lifespan.FILL_AND_KILL
+                else:
+                    offset = rnd.randint(1, depth)
+                    lifespan = Lifespan.GOOD_FOR_DAY
+                    live.append([order_id, volume])
+                price = midpoint - offset if side == Side.BUY else midpoint + offset
+
+                operations.append(MarketEventOperation.INSERT)
+                order_ids.append(order_id)
+                sides.append(side)
+                volumes.append(volume)
+                prices.append(price * tick)
+                lifespans.append(lifespan)
+                order_id += 1
+
+            self.__log_price = log_price
+            self.__next_order_id = order_id
+            self.__time = now
+            yield columns
+
+
+def write_binary_market_data(
+    generator: MarketDataGenerator, file: BinaryIO, event_count: int
+) -> None:
+    """Write the given number of generated events to a binary market data
+    file, one block at a time.
+    """
+    file.write(
+        MARKET_DATA_HEADER.pack(
+            MARKET_DATA_MAGIC,
+            MARKET_DATA_VERSION,
+            sys.byteorder == "little",
+            event_count,
+        )
+    )
+    offsets: List[int] = column_offsets(event_count)
+    written: int = 0
+    for columns in generator.blocks(event_count):
+        for column, offset in zip(columns, offsets):
+            file.seek(offset + written * column.itemsize)
+            column.tofile(file)
+        written += len(columns[0])
+
+
+def write_csv_market_data(
+    generator: MarketDataGenerator, file: TextIO, event_count: int
+) -> None:
+    """Write the given number of generated events to a CSV market data file,
+    one block at a time.
+    """
+    file.write(CSV_HEADER)
+    for columns in generator.blocks(event_count):
+        file.write(
+            "".join(
+                (
+                    "%.6f,%d,Insert,%d,%s,%d,%.2f,%s\n"
+                    % (
+                        time,
+                        instrument,
+                        order_id,
+                        CSV_SIDES[side],
+                        volume,
+                        price / INPUT_SCALING,
+                        CSV_LIFESPANS[lifespan],
+                    )
+                    if operation == MarketEventOperation.INSERT
+                    else "%.6f,%d,Amend,%d,,%d,,\n"
+                    % (time, instrument, order_id, volume)
+                    if operation == MarketEventOperation.AMEND
+                    else "%.6f,%d,Cancel,%d,,,,\n" % (time, instrument, order_id)
+                )
+                for (
+                    time,
+                    instrument,
+                    operation,
+                    order_id,
+                    side,
+                    volume,
+                    price,
+                    lifespan,
+                ) in zip(*columns)
+            )
+        )
+
+
+def generate_market_data_file(
+    filename: pathlib.Path, event_count: int, generator: MarketDataGenerator
+) -> None:
+    """Write a market data file of generated events.
+
+    The file is written in the binary format if its name ends in
+    BINARY_MARKET_DATA_SUFFIX and as CSV otherwise, compressed if its
+    extension is one of those in COMPRESSED_MARKET_DATA.
+    """
+    if is_binary_market_data(str(filename)):
+        with filename.open("wb") as target:
+            write_binary_market_data(generator, target, event_count)
+        return
+
+    opener = COMPRESSED_MARKET_DATA.get(os.path.splitext(filename)[1].lower())
+    if opener is None:
+        target = filename.open("w", newline="")
+    else:
+        target = opener(filename, "wt", newline="")
+    with target:
+        write_csv_market_data(generator, target, event_count)
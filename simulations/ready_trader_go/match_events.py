@@ -22,8 +22,20 @@ import logging
 import queue
 import threading
 
-from typing import Any, Callable, List, Optional, TextIO, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
 
+from .order_book import TOP_LEVEL_COUNT, IOrderListener, OrderBook
+from .timer import Timer
 from .types import Instrument, Lifespan, Side
 
 
@@ -33,6 +45,8 @@ class MatchEventOperation(enum.IntEnum):
     INSERT = 2
     HEDGE = 3
     TRADE = 4
+    BOOK = 5
+    LEVEL = 6
 
 
 class MatchEvent:
@@ -119,6 +133,60 @@ class MatchEvents:
         for callback in self.event_occurred:
             callback(event)
 
+    def book(self, now: float, book: OrderBook, market: IOrderListener) -> None:
+        """Create a keyframe of the top levels of the market's orders in an
+        order book.
+
+        A keyframe is a book event, carrying the last traded price, followed
+        by a level event for each of the top price levels on either side,
+        counting only the orders whose listener is the given market. A reader
+        of the match events replaces the market orders in its copy of the book
+        with the levels of each keyframe; competitors' orders, which are in
+        the match events, are not part of the levels.
+        """
+        levels: Dict[Side, Dict[int, int]] = {Side.SELL: dict(), Side.BUY: dict()}
+        for order in book.resting_orders():
+            if order.listener is market:
+                side_levels = levels[order.side]
+                if order.price in side_levels:
+                    side_levels[order.price] += order.remaining_volume
+                elif len(side_levels) < TOP_LEVEL_COUNT:
+                    side_levels[order.price] = order.remaining_volume
+
+        events: List[MatchEvent] = [
+            MatchEvent(
+                now,
+                "",
+                MatchEventOperation.BOOK,
+                0,
+                book.instrument,
+                None,
+                0,
+                book.last_traded_price(),
+                None,
+                None,
+            )
+        ]
+        for side, side_levels in levels.items():
+            events.extend(
+                MatchEvent(
+                    now,
+                    "",
+                    MatchEventOperation.LEVEL,
+                    0,
+                    book.instrument,
+                    side,
+                    volume,
+                    price,
+                    None,
+                    None,
+                )
+                for price, volume in side_levels.items()
+            )
+        for event in events:
+            for callback in self.event_occurred:
+                callback(event)
+
     def cancel(self, now: float, name: str, order_id: int, diff: int) -> None:
         """Create a new cancel event."""
         event = MatchEvent(
@@ -219,6 +287,43 @@ class MatchEvents:
             callback(event)
 
 
+class BookKeyframes:
+    """A source of periodic order book keyframes for the match events.
+
+    Keyframes stand in for the market orders from the market data file when
+    those are left out of the match events (see MarketEventsReader). The
+    market is the listener of those orders.
+    """
+
+    def __init__(
+        self,
+        match_events: MatchEvents,
+        order_books: Iterable[OrderBook],
+        market: IOrderListener,
+        timer: Timer,
+        interval: float,
+    ):
+        """Initialise a new instance of the BookKeyframes class."""
+        self.interval: float = interval
+        self.market: IOrderListener = market
+        self.match_events: MatchEvents = match_events
+        self.order_books: Tuple[OrderBook, ...] = tuple(order_books)
+
+        self.__next_time: float = 0.0
+
+        # Connect signals
+        timer.timer_ticked.append(self.on_timer_tick)
+
+    def on_timer_tick(self, timer: Timer, now: float, tick_number: int) -> None:
+        """Called each time the timer ticks."""
+        if now >= self.__next_time:
+            self.__next_time += self.interval
+            if self.__next_time <= now:
+                self.__next_time = now + self.interval
+            for book in self.order_books:
+                self.match_events.book(now, book, self.market)
+
+
 class MatchEventsWriter:
     """A processor of match events that it writes to a file."""
 
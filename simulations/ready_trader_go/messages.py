@@ -19,11 +19,14 @@ import asyncio
 import enum
 import logging
 import struct
+import time
 
-from typing import Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import ready_trader_go.order_book as order_book
 
+from .latency import TOTAL, WRITE, LatencyRecorder
+
 
 @enum.unique
 class MessageType(enum.IntEnum):
@@ -49,94 +52,366 @@ class MessageType(enum.IntEnum):
     HEDGE_EVENT = 103
     LOGIN_EVENT = 104
     TRADE_EVENT = 105
+    BOOK_EVENT = 106
+    LEVEL_EVENT = 107
 
 
 # Standard message header: message length (2 bytes) and type (1 byte)
 HEADER = struct.Struct("!HB")  # Length, message type
+HEADER_SIZE: int = HEADER.size
+
+# Handlers are called with the unpacked fields of a message
+MessageHandler = Callable[..., None]
+MessageUnpacker = Callable[..., Tuple[Any, ...]]
+
+# Expected message length (including the header), unpacker and handler for
+# each type of message a connection accepts
+DispatchTable = Dict[int, Tuple[int, MessageUnpacker, MessageHandler]]
+
+
+class MessageSpec:
+    """The layout of one type of message.
+
+    Each field has a name and a struct format (without a byte order). A
+    field whose format holds more than one value, such as "5I", is unpacked
+    as a tuple of those values.
+    """
+
+    __slots__ = ("fields", "size", "struct", "type", "unpack_from")
+
+    def __init__(self, typ: MessageType, *fields: Tuple[str, str]):
+        """Initialise a new instance of the MessageSpec class."""
+        self.type: MessageType = typ
+        self.fields: Tuple[str, ...] = tuple(name for name, _ in fields)
+        self.struct: struct.Struct = struct.Struct("!" + "".join(f for _, f in fields))
+        self.size: int = HEADER_SIZE + self.struct.size
 
-# Auto-trader to matching engine messages
-AMEND_MESSAGE = struct.Struct("!II")  # Client order id and new volume
-CANCEL_MESSAGE = struct.Struct("!I")  # Client order id
-HEDGE_MESSAGE = struct.Struct("!IBII")  # Client order id, side, price, volume
-INSERT_MESSAGE = struct.Struct(
-    "!IBIIB"
-)  # Client order id, side, price, volume and lifespan
-LOGIN_MESSAGE = struct.Struct("!50s50s")  # Name, secret
-
-# Matching engine to auto-trader messages
-ERROR_MESSAGE = struct.Struct("!I50s")  # message
-HEDGE_FILLED_MESSAGE = struct.Struct("!III")  # Client order id, price, volume
+        counts = [
+            len(struct.unpack("!" + f, bytes(struct.calcsize("!" + f))))
+            for _, f in fields
+        ]
+        if all(c == 1 for c in counts):
+            self.unpack_from: MessageUnpacker = self.struct.unpack_from
+        else:
+            self.unpack_from = _grouped_unpacker(self.struct, counts)
+
+    def new_message(self) -> bytearray:
+        """Return a buffer for a message of this type with its header filled in."""
+        message = bytearray(self.size)
+        HEADER.pack_into(message, 0, self.size, self.type)
+        return message
+
+
+def _grouped_unpacker(packer: struct.Struct, counts: List[int]) -> MessageUnpacker:
+    """Return a function which unpacks a message in one go and then gathers
+    the values of each field holding more than one into a tuple.
+
+    The function is generated, like those of a named tuple, so that it does
+    no more work than a hand-written one would.
+    """
+    items: List[str] = list()
+    start: int = 0
+    for count in counts:
+        items.append(
+            "v[%d:%d]" % (start, start + count) if count > 1 else "v[%d]" % start
+        )
+        start += count
+    source = (
+        "def grouped_unpack_from(buffer, offset=0):\n"
+        "    v = unpack_from(buffer, offset)\n"
+        "    return (%s,)\n" % ", ".join(items)
+    )
+    namespace: Dict[str, Any] = {"unpack_from": packer.unpack_from}
+    exec(source, namespace)
+    return namespace["grouped_unpack_from"]
+
+
+# The layout of every message, keyed by message type. Prices and volumes on
+# order book and trade ticks messages are listed best first.
+_LEVELS = "%dI" % order_book.TOP_LEVEL_COUNT
+MESSAGES: Dict[int, MessageSpec] = {
+    spec.type: spec
+    for spec in (
+        # Auto-trader to matching engine messages
+        MessageSpec(MessageType.AMEND_ORDER, ("client_order_id", "I"), ("volume", "I")),
+        MessageSpec(MessageType.CANCEL_ORDER, ("client_order_id", "I")),
+        MessageSpec(
+            MessageType.HEDGE_ORDER,
+            ("client_order_id", "I"),
+            ("side", "B"),
+            ("price", "I"),
+            ("volume", "I"),
+        ),
+        MessageSpec(
+            MessageType.INSERT_ORDER,
+            ("client_order_id", "I"),
+            ("side", "B"),
+            ("price", "I"),
+            ("volume", "I"),
+            ("lifespan", "B"),
+        ),
+        MessageSpec(MessageType.LOGIN, ("name", "50s"), ("secret", "50s")),
+        # Matching engine to auto-trader messages
+        MessageSpec(MessageType.ERROR, ("client_order_id", "I"), ("message", "50s")),
+        MessageSpec(
+            MessageType.HEDGE_FILLED,
+            ("client_order_id", "I"),
+            ("average_price", "I"),
+            ("volume", "I"),
+        ),
+        MessageSpec(
+            MessageType.ORDER_FILLED,
+            ("client_order_id", "I"),
+            ("price", "I"),
+            ("volume", "I"),
+        ),
+        MessageSpec(
+            MessageType.ORDER_STATUS,
+            ("client_order_id", "I"),
+            ("fill_volume", "I"),
+            ("remaining_volume", "I"),
+            ("fees", "i"),
+        ),
+        MessageSpec(
+            MessageType.ORDER_BOOK_UPDATE,
+            ("instrument", "B"),
+            ("sequence_number", "I"),
+            ("ask_prices", _LEVELS),
+            ("ask_volumes", _LEVELS),
+            ("bid_prices", _LEVELS),
+            ("bid_volumes", _LEVELS),
+        ),
+        MessageSpec(
+            MessageType.TRADE_TICKS,
+            ("instrument", "B"),
+            ("sequence_number", "I"),
+            ("ask_prices", _LEVELS),
+            ("ask_volumes", _LEVELS),
+            ("bid_prices", _LEVELS),
+            ("bid_volumes", _LEVELS),
+        ),
+        # Matching engine to HUD messages
+        MessageSpec(
+            MessageType.AMEND_EVENT,
+            ("time", "d"),
+            ("competitor_id", "I"),
+            ("order_id", "I"),
+            ("volume_delta", "i"),
+        ),
+        MessageSpec(
+            MessageType.CANCEL_EVENT,
+            ("time", "d"),
+            ("competitor_id", "I"),
+            ("order_id", "I"),
+        ),
+        MessageSpec(
+            MessageType.INSERT_EVENT,
+            ("time", "d"),
+            ("competitor_id", "I"),
+            ("order_id", "I"),
+            ("instrument", "B"),
+            ("side", "B"),
+            ("volume", "I"),
+            ("price", "I"),
+            ("lifespan", "B"),
+        ),
+        MessageSpec(
+            MessageType.HEDGE_EVENT,
+            ("time", "d"),
+            ("competitor_id", "I"),
+            ("side", "B"),
+            ("instrument", "B"),
+            ("volume", "I"),
+            ("price", "d"),
+        ),
+        MessageSpec(MessageType.LOGIN_EVENT, ("name", "50s"), ("competitor_id", "I")),
+        MessageSpec(
+            MessageType.TRADE_EVENT,
+            ("time", "d"),
+            ("competitor_id", "I"),
+            ("order_id", "I"),
+            ("side", "B"),
+            ("instrument", "B"),
+            ("volume", "I"),
+            ("price", "I"),
+            ("fee", "i"),
+        ),
+        MessageSpec(
+            MessageType.BOOK_EVENT,
+            ("time", "d"),
+            ("instrument", "B"),
+            ("last_traded_price", "I"),
+        ),
+        MessageSpec(
+            MessageType.LEVEL_EVENT,
+            ("time", "d"),
+            ("instrument", "B"),
+            ("side", "B"),
+            ("volume", "I"),
+            ("price", "I"),
+        ),
+    )
+}
+
+
+def dispatch_table(handlers: Dict[MessageType, MessageHandler]) -> DispatchTable:
+    """Return a dispatch table for the given message handlers."""
+    return {
+        typ: (MESSAGES[typ].size, MESSAGES[typ].unpack_from, handler)
+        for typ, handler in handlers.items()
+    }
+
+
+# Message body layouts and cumulative message sizes (derived from MESSAGES)
+AMEND_MESSAGE = MESSAGES[MessageType.AMEND_ORDER].struct
+CANCEL_MESSAGE = MESSAGES[MessageType.CANCEL_ORDER].struct
+HEDGE_MESSAGE = MESSAGES[MessageType.HEDGE_ORDER].struct
+INSERT_MESSAGE = MESSAGES[MessageType.INSERT_ORDER].struct
+LOGIN_MESSAGE = MESSAGES[MessageType.LOGIN].struct
+
+ERROR_MESSAGE = MESSAGES[MessageType.ERROR].struct
+HEDGE_FILLED_MESSAGE = MESSAGES[MessageType.HEDGE_FILLED].struct
+ORDER_FILLED_MESSAGE = MESSAGES[MessageType.ORDER_FILLED].struct
+ORDER_STATUS_MESSAGE = MESSAGES[MessageType.ORDER_STATUS].struct
+
+AMEND_EVENT_MESSAGE = MESSAGES[MessageType.AMEND_EVENT].struct
+CANCEL_EVENT_MESSAGE = MESSAGES[MessageType.CANCEL_EVENT].struct
+INSERT_EVENT_MESSAGE = MESSAGES[MessageType.INSERT_EVENT].struct
+LOGIN_EVENT_MESSAGE = MESSAGES[MessageType.LOGIN_EVENT].struct
+HEDGE_EVENT_MESSAGE = MESSAGES[MessageType.HEDGE_EVENT].struct
+TRADE_EVENT_MESSAGE = MESSAGES[MessageType.TRADE_EVENT].struct
+BOOK_EVENT_MESSAGE = MESSAGES[MessageType.BOOK_EVENT].struct
+LEVEL_EVENT_MESSAGE = MESSAGES[MessageType.LEVEL_EVENT].struct
+
+AMEND_MESSAGE_SIZE: int = MESSAGES[MessageType.AMEND_ORDER].size
+CANCEL_MESSAGE_SIZE: int = MESSAGES[MessageType.CANCEL_ORDER].size
+HEDGE_MESSAGE_SIZE: int = MESSAGES[MessageType.HEDGE_ORDER].size
+INSERT_MESSAGE_SIZE: int = MESSAGES[MessageType.INSERT_ORDER].size
+LOGIN_MESSAGE_SIZE: int = MESSAGES[MessageType.LOGIN].size
+
+ERROR_MESSAGE_SIZE: int = MESSAGES[MessageType.ERROR].size
+HEDGE_FILLED_MESSAGE_SIZE: int = MESSAGES[MessageType.HEDGE_FILLED].size
+ORDER_FILLED_MESSAGE_SIZE: int = MESSAGES[MessageType.ORDER_FILLED].size
+ORDER_STATUS_MESSAGE_SIZE: int = MESSAGES[MessageType.ORDER_STATUS].size
+
+AMEND_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.AMEND_EVENT].size
+CANCEL_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.CANCEL_EVENT].size
+INSERT_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.INSERT_EVENT].size
+HEDGE_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.HEDGE_EVENT].size
+TRADE_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.TRADE_EVENT].size
+LOGIN_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.LOGIN_EVENT].size
+BOOK_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.BOOK_EVENT].size
+LEVEL_EVENT_MESSAGE_SIZE: int = MESSAGES[MessageType.LEVEL_EVENT].size
+
+# Order book and trade ticks messages are packed in two parts, so that the
+# prices and volumes need only be repacked when they change
 ORDER_BOOK_HEADER = struct.Struct("!BI")  # Instrument and sequence number
-ORDER_BOOK_MESSAGE = struct.Struct(
-    "!%dI" % (4 * order_book.TOP_LEVEL_COUNT)
-)  # Prices & volumes for best bids & asks
-ORDER_FILLED_MESSAGE = struct.Struct("!III")  # Client order id, price, volume
-ORDER_STATUS_MESSAGE = struct.Struct(
-    "!IIIi"
-)  # Client order id, fill volume, remaining volume and fees
+ORDER_BOOK_MESSAGE = struct.Struct("!" + 4 * _LEVELS)  # Prices & volumes
 TRADE_TICKS_HEADER = struct.Struct("!BI")  # Instrument and sequence number
-TRADE_TICKS_MESSAGE = struct.Struct(
-    "!%dI" % (4 * order_book.TOP_LEVEL_COUNT)
-)  # Prices & volumes for best bids & asks
-
-# Helpers for decoding order book and trade ticks messages
-BOOK_PART = struct.Struct("!%dI" % order_book.TOP_LEVEL_COUNT)
-TICKS_PART = struct.Struct("!%dI" % order_book.TOP_LEVEL_COUNT)
-
-# Matching engine to HUD messages
-AMEND_EVENT_MESSAGE = struct.Struct("!dIIi")  # Time, team id, order id, volume delta
-CANCEL_EVENT_MESSAGE = struct.Struct("!dII")  # Time, team id, order id
-INSERT_EVENT_MESSAGE = struct.Struct(
-    "!dIIBBIIB"
-)  # Time, team id, order id, inst, side, volume, price, lifespan
-LOGIN_EVENT_MESSAGE = struct.Struct("!50sI")  # Team name, team id
-HEDGE_EVENT_MESSAGE = struct.Struct(
-    "!dIBBId"
-)  # Time, team id, side, instrument, volume, price
-TRADE_EVENT_MESSAGE = struct.Struct(
-    "!dIIBBIIi"
-)  # Time, team id, order id, side, instrument, volume, price, fee
-
-# Cumulative message sizes
-HEADER_SIZE: int = HEADER.size
+TRADE_TICKS_MESSAGE = struct.Struct("!" + 4 * _LEVELS)  # Prices & volumes
+
+ORDER_BOOK_HEADER_SIZE: int = HEADER_SIZE + ORDER_BOOK_HEADER.size
+ORDER_BOOK_MESSAGE_SIZE: int = MESSAGES[MessageType.ORDER_BOOK_UPDATE].size
+TRADE_TICKS_HEADER_SIZE: int = HEADER_SIZE + TRADE_TICKS_HEADER.size
+TRADE_TICKS_MESSAGE_SIZE: int = MESSAGES[MessageType.TRADE_TICKS].size
+
+# Helpers for decoding the prices and volumes of order book and trade ticks messages
+BOOK_PART = struct.Struct("!" + _LEVELS)
+TICKS_PART = struct.Struct("!" + _LEVELS)
 
-AMEND_MESSAGE_SIZE: int = HEADER.size + AMEND_MESSAGE.size
-CANCEL_MESSAGE_SIZE: int = HEADER.size + CANCEL_MESSAGE.size
-HEDGE_MESSAGE_SIZE: int = HEADER.size + HEDGE_MESSAGE.size
-INSERT_MESSAGE_SIZE: int = HEADER.size + INSERT_MESSAGE.size
-LOGIN_MESSAGE_SIZE: int = HEADER.size + LOGIN_MESSAGE.size
+# The length field of the header limits the size of a message
+MAX_MESSAGE_SIZE: int = 2**16 - 1
 
-ERROR_MESSAGE_SIZE: int = HEADER.size + ERROR_MESSAGE.size
-HEDGE_FILLED_MESSAGE_SIZE: int = HEADER.size + HEDGE_FILLED_MESSAGE.size
-ORDER_BOOK_HEADER_SIZE: int = HEADER.size + ORDER_BOOK_HEADER.size
-ORDER_BOOK_MESSAGE_SIZE: int = ORDER_BOOK_HEADER_SIZE + ORDER_BOOK_MESSAGE.size
-ORDER_FILLED_MESSAGE_SIZE: int = HEADER.size + ORDER_FILLED_MESSAGE.size
-ORDER_STATUS_MESSAGE_SIZE: int = HEADER.size + ORDER_STATUS_MESSAGE.size
-TRADE_TICKS_HEADER_SIZE: int = HEADER.size + TRADE_TICKS_HEADER.size
-TRADE_TICKS_MESSAGE_SIZE: int = TRADE_TICKS_HEADER_SIZE + TRADE_TICKS_MESSAGE.size
+# Transports for the execution channel: TCP, or a Unix domain socket when the
+# exchange simulator and auto-traders run on the same machine
+EXECUTION_TYPES = ("tcp", "unix")
 
-AMEND_EVENT_MESSAGE_SIZE: int = HEADER.size + AMEND_EVENT_MESSAGE.size
-CANCEL_EVENT_MESSAGE_SIZE: int = HEADER.size + CANCEL_EVENT_MESSAGE.size
-INSERT_EVENT_MESSAGE_SIZE: int = HEADER.size + INSERT_EVENT_MESSAGE.size
-HEDGE_EVENT_MESSAGE_SIZE: int = HEADER.size + HEDGE_EVENT_MESSAGE.size
-TRADE_EVENT_MESSAGE_SIZE: int = HEADER.size + TRADE_EVENT_MESSAGE.size
-LOGIN_EVENT_MESSAGE_SIZE: int = HEADER.size + LOGIN_EVENT_MESSAGE.size
+# Size of the buffer into which each connection receives data. It holds at
+# least one message of the largest size in addition to a partial message.
+RECEIVE_BUFFER_SIZE: int = 2**17
 
 
-class Connection(asyncio.Protocol):
-    """A stream-based network connection."""
+class Connection(asyncio.BufferedProtocol):
+    """A stream-based network connection.
+
+    Data is received straight into a reusable buffer and each complete
+    message is handed to on_message in place. The data passed to on_message
+    is only valid until it returns.
+
+    Messages sent with _write are collected and written to the transport
+    together, either once all of the messages received in one go have been
+    handled or, for messages sent from other callbacks, on the next
+    iteration of the event loop.
+    """
 
     def __init__(self):
         """Initialize a new instance of the Connection class."""
         self._closing: bool = False
-        self._data: bytes = b""
         self._file_number: int = 0
         self._connection_transport: Optional[asyncio.Transport] = None
 
+        # Outgoing message counters
+        self.flush_count: int = 0
+        self.frame_count: int = 0
+        self.max_frames_per_flush: int = 0
+
+        # Records how long each stage of handling a message takes, if set. The
+        # receive time is when the data being handled arrived and the reply
+        # time, if not zero, is when replies that are being timed were ready.
+        self.latency: Optional[LatencyRecorder] = None
+        self._receive_time: int = 0
+        self._reply_time: int = 0
+
+        self.__flush_handle: Optional[asyncio.Handle] = None
         self.__logger = logging.getLogger("CONNECTION")
+        self.__pending_frames: int = 0
+        self.__receive_buffer: bytearray = bytearray(RECEIVE_BUFFER_SIZE)
+        self.__receive_end: int = 0
+        self.__receive_start: int = 0
+        self.__receive_view: memoryview = memoryview(self.__receive_buffer)
+        self.__send_buffer: bytearray = bytearray()
+
+    def buffer_updated(self, nbytes: int) -> None:
+        """Called when data has been received into the buffer."""
+        if self.latency is not None:
+            self._receive_time = time.perf_counter_ns()
+
+        buffer: bytearray = self.__receive_buffer
+        end: int = self.__receive_end + nbytes
+        upto: int = self.__receive_start
+
+        while not self._closing and end - upto >= HEADER_SIZE:
+            length, typ = HEADER.unpack_from(buffer, upto)
+            if length < HEADER_SIZE:
+                self.__logger.warning(
+                    "fd=%d received malformed message: length=%d type=%d",
+                    self._file_number,
+                    length,
+                    typ,
+                )
+                self.close()
+                break
+            if upto + length > end:
+                break
+
+            self.on_message(typ, buffer, upto + HEADER_SIZE, length)
+
+            upto += length
+
+        if upto == end or self._closing:
+            # Nothing left to process (or worth processing)
+            upto = end = 0
+        self.__receive_start = upto
+        self.__receive_end = end
+
+        if self.__pending_frames:
+            self._flush()
+        self._reply_time = 0
 
     def close(self):
         """Close the connection."""
+        if self.__pending_frames:
+            self._flush()
         self._closing = True
         if (
             self._connection_transport is not None
@@ -152,6 +427,18 @@ class Connection(asyncio.Protocol):
             )
         else:
             self.__logger.info("fd=%d connection lost", self._file_number)
+        if self.flush_count:
+            self.__logger.info(
+                "fd=%d sent %d messages in %d writes: max_per_write=%d",
+                self._file_number,
+                self.frame_count,
+                self.flush_count,
+                self.max_frames_per_flush,
+            )
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+        self.__pending_frames = 0
         self._connection_transport = None
 
     def connection_made(self, transport: asyncio.transports.BaseTransport) -> None:
@@ -159,33 +446,52 @@ class Connection(asyncio.Protocol):
         sock = transport.get_extra_info("socket")
         if sock is not None:
             self._file_number = sock.fileno()
+        peer = transport.get_extra_info("peername")
+        if isinstance(peer, tuple):
+            peer = "%s:%d" % peer[:2]
         self.__logger.info(
-            "fd=%d connection established: peer=%s:%d",
+            "fd=%d connection established: peer=%s",
             self._file_number,
-            *(transport.get_extra_info("peername") or ("unknown", 0))
+            peer or "unknown",
         )
         self._connection_transport = transport
 
-    def data_received(self, data: bytes) -> None:
-        """Called when data is received."""
-        if self._data:
-            self._data += data
-        else:
-            self._data = data
-
-        upto: int = 0
-        data_length: int = len(self._data)
-
-        while not self._closing and upto < data_length - HEADER_SIZE:
-            length, typ = HEADER.unpack_from(self._data, upto)
-            if upto + length > data_length:
-                break
-
-            self.on_message(typ, self._data, upto + HEADER_SIZE, length)
-
-            upto += length
-
-        self._data = self._data[upto:]
+    def _flush(self) -> None:
+        """Write the messages collected since the last flush to the transport."""
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+
+        frames: int = self.__pending_frames
+        self.__pending_frames = 0
+        self.flush_count += 1
+        self.frame_count += frames
+        if frames > self.max_frames_per_flush:
+            self.max_frames_per_flush = frames
+
+        # The transport may keep the buffer, so start a new one
+        data: bytearray = self.__send_buffer
+        self.__send_buffer = bytearray()
+        if self._connection_transport is not None:
+            self._connection_transport.write(data)
+            if self._reply_time and frames:
+                now: int = self.latency.lap(WRITE, self._reply_time)
+                self.latency.record(TOTAL, now - self._receive_time)
+                self._reply_time = 0
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        """Return the free part of the receive buffer.
+
+        If too little space is left, the partial message at the end of the
+        data received so far is first moved to the start of the buffer.
+        """
+        if RECEIVE_BUFFER_SIZE - self.__receive_end < MAX_MESSAGE_SIZE:
+            start: int = self.__receive_start
+            end: int = self.__receive_end
+            self.__receive_buffer[: end - start] = self.__receive_buffer[start:end]
+            self.__receive_start = 0
+            self.__receive_end = end - start
+        return self.__receive_view[self.__receive_end :]
 
     def on_message(self, typ: int, data: bytes, start: int, length: int) -> None:
         """Callback when an individual message has been received."""
@@ -194,6 +500,15 @@ class Connection(asyncio.Protocol):
         """Send a message."""
         self._connection_transport.write(HEADER.pack(length, typ) + data)
 
+    def _write(self, message: bytes) -> None:
+        """Add a complete message, including its header, to the messages to be
+        written to the transport at the next flush.
+        """
+        self.__send_buffer += message
+        self.__pending_frames += 1
+        if self.__flush_handle is None:
+            self.__flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
 
 class Subscription(asyncio.DatagramProtocol):
     """A packet-based network receiver."""
@@ -15,20 +15,44 @@
 #     You should have received a copy of the GNU Affero General Public
 #     License along with Ready Trader Go.  If not, see
 #     <https://www.gnu.org/licenses/>.
-from bisect import bisect, insort_left
-import collections
+import itertools
+import sys
 
-from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from bisect import insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .types import Instrument, Lifespan, Side
+from .price_levels import (
+    BookSide,
+    LadderBookSide,
+    LevelView,
+    PriceLevel,
+    SortedBookSide,
+)
+from .types import Instrument, Lifespan, MarketEventOperation, Side
 
 
 MINIMUM_BID = 1
 MAXIMUM_ASK = 2**31 - 1
 TOP_LEVEL_COUNT = 5
 
+ORDER_BOOK_TYPES = ("ladder", "sorted")
+
 
 class IOrderListener(object):
+    # Set to True to receive fills through on_orders_filled instead of
+    # on_order_filled
+    aggregate_fills: bool = False
+
+    def on_batch_applied(self, now: float, book, events: List[Tuple]) -> None:
+        """Called by OrderBook.apply_batch with the inserts, amends and cancels
+        of the orders it has applied.
+
+        Each event is a tuple of time, operation, order id, side, volume,
+        price and lifespan (the last four may be None for amends and cancels,
+        which carry the negative change in volume).
+        """
+        pass
+
     def on_order_amended(self, now: float, order, volume_removed: int) -> None:
         """Called when the order is amended."""
         pass
@@ -47,6 +71,15 @@ class IOrderListener(object):
         """Called when the order is partially or completely filled."""
         pass
 
+    def on_orders_filled(self, now: float, fills: List[Tuple]) -> None:
+        """Called once per aggressive order with the fills of this listener's
+        orders, if aggregate_fills is set.
+
+        Each fill is a tuple of order, price, volume and fee, in the order in
+        which they occurred.
+        """
+        pass
+
 
 class Order(object):
     """A request to buy or sell at a given price."""
@@ -56,6 +89,8 @@ class Order(object):
         "instrument",
         "lifespan",
         "listener",
+        "next_order",
+        "prev_order",
         "price",
         "remaining_volume",
         "side",
@@ -83,6 +118,8 @@ class Order(object):
         self.total_fees: int = 0
         self.volume: int = volume
         self.listener: IOrderListener = listener
+        self.next_order: Optional[Order] = None
+        self.prev_order: Optional[Order] = None
 
     def __str__(self):
         """Return a string containing a description of this order object."""
@@ -103,22 +140,149 @@ class Order(object):
         return s % args
 
 
+class BookSnapshot(object):
+    """An immutable view of every level of an order book at a given version.
+
+    Snapshots are safe to keep, and to read from other threads, while the
+    order book they were taken from continues to change.
+    """
+
+    __slots__ = ("asks", "bids", "instrument", "last_traded_price", "version")
+
+    def __init__(
+        self,
+        instrument: Instrument,
+        version: int,
+        asks: Tuple[LevelView, ...],
+        bids: Tuple[LevelView, ...],
+        last_traded_price: Optional[int],
+    ):
+        """Initialise a new instance of the BookSnapshot class."""
+        self.asks: Tuple[LevelView, ...] = asks
+        self.bids: Tuple[LevelView, ...] = bids
+        self.instrument: Instrument = instrument
+        self.last_traded_price: Optional[int] = last_traded_price
+        self.version: int = version
+
+    def best_ask(self) -> Optional[int]:
+        """Return the best ask price, or None if there were no ask orders."""
+        return self.asks[0].price if self.asks else None
+
+    def best_bid(self) -> Optional[int]:
+        """Return the best bid price, or None if there were no bid orders."""
+        return self.bids[0].price if self.bids else None
+
+    def midpoint_price(self) -> Optional[float]:
+        """Return the midpoint price."""
+        if self.asks and self.bids:
+            return (self.bids[0].price + self.asks[0].price) / 2.0
+        return None
+
+    def top_levels(
+        self,
+        ask_prices: List[int],
+        ask_volumes: List[int],
+        bid_prices: List[int],
+        bid_volumes: List[int],
+    ) -> None:
+        """Populate the supplied lists with the top levels of this snapshot."""
+        for prices, volumes, levels in (
+            (ask_prices, ask_volumes, self.asks),
+            (bid_prices, bid_volumes, self.bids),
+        ):
+            for i in range(TOP_LEVEL_COUNT):
+                if i < len(levels):
+                    prices[i] = levels[i].price
+                    volumes[i] = levels[i].volume
+                else:
+                    prices[i] = volumes[i] = 0
+
+
+class OrderPool(object):
+    """A free list of orders which can be reused once they have left the book.
+
+    Replaying a market data file inserts millions of short-lived orders, so
+    recycling them avoids most of the allocation and garbage collection work.
+    """
+
+    def __init__(self):
+        """Initialise a new instance of the OrderPool class."""
+        self.__free: List[Order] = list()
+
+    def __len__(self) -> int:
+        """Return the number of orders available for reuse."""
+        return len(self.__free)
+
+    def acquire(
+        self,
+        client_order_id: int,
+        instrument: Instrument,
+        lifespan: Lifespan,
+        side: Side,
+        price: int,
+        volume: int,
+        listener: Optional[IOrderListener] = None,
+    ) -> Order:
+        """Return an order with the given attributes, reusing one if possible."""
+        if not self.__free:
+            return Order(
+                client_order_id, instrument, lifespan, side, price, volume, listener
+            )
+
+        order = self.__free.pop()
+        order.client_order_id = client_order_id
+        order.instrument = instrument
+        order.lifespan = lifespan
+        order.side = side
+        order.price = price
+        order.remaining_volume = volume
+        order.total_fees = 0
+        order.volume = volume
+        order.listener = listener
+        return order
+
+    def release(self, order: Order) -> None:
+        """Return an order which is no longer referenced to the pool."""
+        self.__free.append(order)
+
+
 class OrderBook(object):
     """A collection of orders arranged by the price-time priority principle."""
 
-    def __init__(self, instrument: Instrument, maker_fee: float, taker_fee: float):
-        """Initialise a new instance of the OrderBook class."""
+    def __init__(
+        self,
+        instrument: Instrument,
+        maker_fee: float,
+        taker_fee: float,
+        asks: Optional[BookSide] = None,
+        bids: Optional[BookSide] = None,
+    ):
+        """Initialise a new instance of the OrderBook class.
+
+        By default the price levels on each side of the book are kept in
+        sorted lists, alternative arrangements can be supplied using the
+        asks and bids arguments (see OrderBookFactory).
+        """
         self.instrument: Instrument = instrument
         self.maker_fee: float = maker_fee
         self.taker_fee: float = taker_fee
 
-        self.__ask_prices: List[int] = []
-        self.__ask_ticks: Dict[int, int] = collections.defaultdict(int)
-        self.__bid_prices: List[int] = []
-        self.__bid_ticks: Dict[int, int] = collections.defaultdict(int)
+        self.__asks: BookSide = asks if asks is not None else SortedBookSide(Side.SELL)
+        self.__ask_ticks: Dict[int, int] = dict()
+        self.__ask_tick_keys: List[int] = list()
+        self.__bids: BookSide = bids if bids is not None else SortedBookSide(Side.BUY)
+        self.__bid_ticks: Dict[int, int] = dict()
+        self.__bid_tick_keys: List[int] = list()
+        self.__batch_traded: bool = False
+        self.__fills: List[Tuple] = list()
+        self.__in_batch: bool = False
         self.__last_traded_price: Optional[int] = None
-        self.__levels: Dict[int, Deque[Order]] = {}
-        self.__total_volumes: Dict[int, int] = {}
+        self.__snapshot: Optional[BookSnapshot] = None
+        self.__top: Tuple[Tuple[int, ...], ...] = ((0,) * TOP_LEVEL_COUNT,) * 4
+        self.__top_version: int = 0
+
+        # Incremented every time an order is placed, traded, cancelled or amended
+        self.version: int = 0
 
         # Signals
         self.trade_occurred: List[Callable[[Any], None]] = list()
@@ -150,45 +314,203 @@ class OrderBook(object):
             diff = order.volume - (
                 fill_volume if new_volume < fill_volume else new_volume
             )
-            self.remove_volume_from_level(order.price, diff, order.side)
+            self.remove_volume_from_level(order, diff)
             order.volume -= diff
             order.remaining_volume -= diff
+            self.version += 1
             if order.listener:
                 order.listener.on_order_amended(now, order, diff)
 
+    def apply_batch(
+        self,
+        events: Iterable[Any],
+        orders: Dict[int, Order],
+        listener: IOrderListener,
+        pool: Optional["OrderPool"] = None,
+    ) -> None:
+        """Apply a contiguous block of market events to this order book.
+
+        Each event must have time, operation, order_id, side, volume, price
+        and lifespan attributes (see MarketEvent). Orders inserted by the
+        batch are given the supplied listener and, while they rest in the
+        book, are kept in the orders dictionary which is used to look up the
+        targets of amend and cancel events.
+
+        Rather than the per-order placed, amended and cancelled callbacks,
+        the listener's on_batch_applied method is called once with all of the
+        events applied. Any pending events are also passed on before an
+        insert that trades, so that they are always reported ahead of the
+        resulting fills. The trade_occurred signal fires once per batch.
+
+        If a pool is supplied, inserted orders are taken from it and orders
+        which leave the book without being filled (or which never rest in
+        it) are returned to it. The listener is responsible for releasing
+        resting orders that are completely filled.
+        """
+        asks: BookSide = self.__asks
+        bids: BookSide = self.__bids
+        instrument: Instrument = self.instrument
+        applied: List[Tuple] = list()
+        now: float = 0.0
+
+        self.__batch_traded = False
+        self.__in_batch = True
+        try:
+            for evt in events:
+                now = evt.time
+                if evt.operation == MarketEventOperation.INSERT:
+                    if pool is not None:
+                        order = pool.acquire(
+                            evt.order_id,
+                            instrument,
+                            evt.lifespan,
+                            evt.side,
+                            evt.price,
+                            evt.volume,
+                            listener,
+                        )
+                    else:
+                        order = Order(
+                            evt.order_id,
+                            instrument,
+                            evt.lifespan,
+                            evt.side,
+                            evt.price,
+                            evt.volume,
+                            listener,
+                        )
+                    applied.append(
+                        (
+                            now,
+                            MarketEventOperation.INSERT,
+                            order.client_order_id,
+                            order.side,
+                            abs(order.volume),
+                            order.price,
+                            order.lifespan,
+                        )
+                    )
+
+                    if order.side == Side.SELL:
+                        best = bids.best_level()
+                        if best is not None and order.price <= best.price:
+                            listener.on_batch_applied(now, self, applied)
+                            applied = list()
+                            self.trade_ask(now, order)
+                    else:
+                        best = asks.best_level()
+                        if best is not None and order.price >= best.price:
+                            listener.on_batch_applied(now, self, applied)
+                            applied = list()
+                            self.trade_bid(now, order)
+
+                    if order.remaining_volume > 0:
+                        if order.lifespan == Lifespan.FILL_AND_KILL:
+                            applied.append(
+                                (
+                                    now,
+                                    MarketEventOperation.CANCEL,
+                                    order.client_order_id,
+                                    None,
+                                    -order.remaining_volume,
+                                    None,
+                                    None,
+                                )
+                            )
+                            order.remaining_volume = 0
+                        else:
+                            book_side = asks if order.side == Side.SELL else bids
+                            level = book_side.get_level(order.price)
+                            if level is None:
+                                level = book_side.add_level(order.price)
+                            level.append(order)
+                            book_side.adjust_volume(level, order.remaining_volume)
+                            self.version += 1
+                            orders[order.client_order_id] = order
+                            continue
+
+                    if pool is not None:
+                        pool.release(order)
+                    continue
+
+                order = orders.get(evt.order_id)
+                if order is None or order.remaining_volume == 0:
+                    continue
+
+                if evt.operation == MarketEventOperation.CANCEL:
+                    diff = order.remaining_volume
+                    self.remove_volume_from_level(order, diff)
+                    order.remaining_volume = 0
+                    operation = MarketEventOperation.CANCEL
+                elif evt.volume < 0:
+                    # evt.operation must be MarketEventOperation.AMEND
+                    new_volume = order.volume + evt.volume
+                    fill_volume = order.volume - order.remaining_volume
+                    diff = order.volume - (
+                        fill_volume if new_volume < fill_volume else new_volume
+                    )
+                    self.remove_volume_from_level(order, diff)
+                    order.volume -= diff
+                    order.remaining_volume -= diff
+                    operation = MarketEventOperation.AMEND
+                else:
+                    continue
+
+                self.version += 1
+                if order.remaining_volume == 0:
+                    del orders[order.client_order_id]
+                    if pool is not None:
+                        pool.release(order)
+                applied.append(
+                    (now, operation, order.client_order_id, None, -diff, None, None)
+                )
+        finally:
+            self.__in_batch = False
+
+        if applied:
+            listener.on_batch_applied(now, self, applied)
+
+        if self.__batch_traded:
+            for callback in self.trade_occurred:
+                callback(self)
+
     def best_ask(self) -> Optional[int]:
         """Return the current best ask price, or None if there are no ask orders."""
-        return -self.__ask_prices[-1] if self.__ask_prices else None
+        level = self.__asks.best_level()
+        return level.price if level is not None else None
 
     def best_bid(self) -> Optional[int]:
         """Return the current best ask price, or None if there are no ask orders."""
-        return self.__bid_prices[-1] if self.__bid_prices else None
+        level = self.__bids.best_level()
+        return level.price if level is not None else None
 
     def cancel(self, now: float, order: Order) -> None:
         """Cancel an order in this order book."""
         if order.remaining_volume > 0:
-            self.remove_volume_from_level(
-                order.price, order.remaining_volume, order.side
-            )
+            self.remove_volume_from_level(order, order.remaining_volume)
             remaining = order.remaining_volume
             order.remaining_volume = 0
+            self.version += 1
             if order.listener:
                 order.listener.on_order_cancelled(now, order, remaining)
 
+    def depth(self, side: Side, limit_price: int) -> Tuple[int, int]:
+        """Return the total volume and value of the orders on the given side of
+        this book at prices which are the same as, or better than, the limit.
+        """
+        book_side = self.__asks if side == Side.SELL else self.__bids
+        return book_side.sweep(limit_price, sys.maxsize)
+
     def insert(self, now: float, order: Order) -> None:
         """Insert a new order into this order book."""
-        if (
-            order.side == Side.SELL
-            and self.__bid_prices
-            and order.price <= self.__bid_prices[-1]
-        ):
-            self.trade_ask(now, order)
-        elif (
-            order.side == Side.BUY
-            and self.__ask_prices
-            and order.price >= self.__ask_prices[-1]
-        ):
-            self.trade_bid(now, order)
+        if order.side == Side.SELL:
+            best_bid = self.__bids.best_level()
+            if best_bid is not None and order.price <= best_bid.price:
+                self.trade_ask(now, order)
+        else:
+            best_ask = self.__asks.best_level()
+            if best_ask is not None and order.price >= best_ask.price:
+                self.trade_bid(now, order)
 
         if order.remaining_volume > 0:
             if order.lifespan == Lifespan.FILL_AND_KILL:
@@ -205,38 +527,91 @@ class OrderBook(object):
 
     def midpoint_price(self) -> Optional[float]:
         """Return the midpoint price."""
-        if self.__bid_prices and self.__ask_prices:
-            return (self.__bid_prices[-1] + -self.__ask_prices[-1]) / 2.0
+        best_bid = self.__bids.best_level()
+        best_ask = self.__asks.best_level()
+        if best_bid is not None and best_ask is not None:
+            return (best_bid.price + best_ask.price) / 2.0
         return None
 
     def place(self, now: float, order: Order) -> None:
         """Place an order that does not match any existing order in this order book."""
-        price = order.price
+        book_side = self.__asks if order.side == Side.SELL else self.__bids
+        level = book_side.get_level(order.price)
+        if level is None:
+            level = book_side.add_level(order.price)
 
-        if price not in self.__levels:
-            self.__levels[price] = collections.deque()
-            self.__total_volumes[price] = 0
-            if order.side == Side.SELL:
-                insort_left(self.__ask_prices, -price)
-            else:
-                insort_left(self.__bid_prices, price)
-
-        self.__levels[price].append(order)
-        self.__total_volumes[price] += order.remaining_volume
+        level.append(order)
+        book_side.adjust_volume(level, order.remaining_volume)
+        self.version += 1
 
         if order.listener:
             order.listener.on_order_placed(now, order)
 
-    def remove_volume_from_level(self, price: int, volume: int, side: Side) -> None:
-        if self.__total_volumes[price] == volume:
-            del self.__levels[price]
-            del self.__total_volumes[price]
-            if side == Side.SELL:
-                self.__ask_prices.pop(bisect(self.__ask_prices, -price) - 1)
-            elif side == Side.BUY:
-                self.__bid_prices.pop(bisect(self.__bid_prices, price) - 1)
-        else:
-            self.__total_volumes[price] -= volume
+    def remove_volume_from_level(self, order: Order, volume: int) -> None:
+        """Remove volume belonging to a resting order from its price level.
+
+        The order is unlinked from the level if none of its volume remains.
+        """
+        book_side = self.__asks if order.side == Side.SELL else self.__bids
+        level = book_side.get_level(order.price)
+        book_side.adjust_volume(level, -volume)
+        if level.total_volume == 0:
+            book_side.remove_level(level)
+        elif volume == order.remaining_volume:
+            level.remove(order)
+
+    def restore(
+        self,
+        orders: Iterable[Order],
+        last_traded_price: Optional[int],
+        version: int,
+    ) -> None:
+        """Restore the state of this order book from a checkpoint.
+
+        The book must be empty. Orders are placed in the given sequence,
+        which must be their time priority, and listeners are not notified.
+        """
+        if len(self.__asks) or len(self.__bids):
+            raise RuntimeError("cannot restore into an order book which is not empty")
+
+        for order in orders:
+            book_side = self.__asks if order.side == Side.SELL else self.__bids
+            level = book_side.get_level(order.price)
+            if level is None:
+                level = book_side.add_level(order.price)
+            level.append(order)
+            book_side.adjust_volume(level, order.remaining_volume)
+
+        self.__last_traded_price = last_traded_price
+        self.version = version
+
+    def resting_orders(self) -> Iterator[Order]:
+        """Return an iterator over the orders resting in this book.
+
+        Asks are followed by bids, each from the best price outwards and in
+        time priority within a price level.
+        """
+        for book_side in (self.__asks, self.__bids):
+            for level in book_side.levels():
+                yield from level
+
+    def snapshot(self) -> BookSnapshot:
+        """Return an immutable view of this order book.
+
+        Levels which have not changed since an earlier snapshot share their
+        views with it, and the snapshot itself is reused until the version
+        changes.
+        """
+        snapshot = self.__snapshot
+        if snapshot is None or snapshot.version != self.version:
+            snapshot = self.__snapshot = BookSnapshot(
+                self.instrument,
+                self.version,
+                tuple(level.view() for level in self.__asks.levels()),
+                tuple(level.view() for level in self.__bids.levels()),
+                self.__last_traded_price,
+            )
+        return snapshot
 
     def top_levels(
         self,
@@ -246,74 +621,121 @@ class OrderBook(object):
         bid_volumes: List[int],
     ) -> None:
         """Populate the supplied lists with the top levels for this book."""
-        i = 0
-        j = len(self.__ask_prices) - 1
-        while i < TOP_LEVEL_COUNT and j >= 0:
-            ask_prices[i] = -self.__ask_prices[j]
-            ask_volumes[i] = self.__total_volumes[ask_prices[i]]
-            i += 1
-            j -= 1
-        while i < TOP_LEVEL_COUNT:
-            ask_prices[i] = ask_volumes[i] = 0
-            i += 1
+        top = self.__top_snapshot()
+        ask_prices[:] = top[0]
+        ask_volumes[:] = top[1]
+        bid_prices[:] = top[2]
+        bid_volumes[:] = top[3]
+
+    def top_levels_if_changed(
+        self, since: int
+    ) -> Optional[Tuple[Tuple[int, ...], ...]]:
+        """Return the top levels if this book has changed since the given version.
+
+        The result is a tuple of ask prices, ask volumes, bid prices and bid
+        volumes, or None if the version is unchanged. Callers should remember
+        the current value of the version attribute for the next call.
+        """
+        if since == self.version:
+            return None
+        return self.__top_snapshot()
 
-        i = 0
-        j = len(self.__bid_prices) - 1
-        while i < TOP_LEVEL_COUNT and j >= 0:
-            bid_prices[i] = self.__bid_prices[j]
-            bid_volumes[i] = self.__total_volumes[bid_prices[i]]
-            i += 1
-            j -= 1
-        while i < TOP_LEVEL_COUNT:
-            bid_prices[i] = bid_volumes[i] = 0
-            i += 1
+    def __top_snapshot(self) -> Tuple[Tuple[int, ...], ...]:
+        """Return the top levels for this book, rebuilding them if necessary."""
+        if self.__top_version == self.version:
+            return self.__top
+
+        ask_prices = [0] * TOP_LEVEL_COUNT
+        ask_volumes = [0] * TOP_LEVEL_COUNT
+        for i, level in enumerate(
+            itertools.islice(self.__asks.levels(), TOP_LEVEL_COUNT)
+        ):
+            ask_prices[i] = level.price
+            ask_volumes[i] = level.total_volume
+
+        bid_prices = [0] * TOP_LEVEL_COUNT
+        bid_volumes = [0] * TOP_LEVEL_COUNT
+        for i, level in enumerate(
+            itertools.islice(self.__bids.levels(), TOP_LEVEL_COUNT)
+        ):
+            bid_prices[i] = level.price
+            bid_volumes[i] = level.total_volume
+
+        self.__top = (
+            tuple(ask_prices),
+            tuple(ask_volumes),
+            tuple(bid_prices),
+            tuple(bid_volumes),
+        )
+        self.__top_version = self.version
+        return self.__top
 
     def trade_ask(self, now: float, order: Order) -> None:
         """Check to see if any existing bid orders match the specified ask order."""
-        best_bid = self.__bid_prices[-1]
+        bids = self.__bids
+        best_bid = bids.best_level()
 
         while (
             order.remaining_volume > 0
-            and best_bid >= order.price
-            and self.__total_volumes[best_bid] > 0
+            and best_bid.price >= order.price
+            and best_bid.total_volume > 0
         ):
             self.trade_level(now, order, best_bid)
-            if self.__total_volumes[best_bid] == 0:
-                del self.__levels[best_bid]
-                del self.__total_volumes[best_bid]
-                self.__bid_prices.pop()
-                if not self.__bid_prices:
+            if best_bid.total_volume == 0:
+                bids.remove_level(best_bid)
+                best_bid = bids.best_level()
+                if best_bid is None:
                     break
-                best_bid = self.__bid_prices[-1]
+
+        self.__trade_complete(now)
 
     def trade_bid(self, now: float, order: Order) -> None:
         """Check to see if any existing ask orders match the specified bid order."""
-        best_ask = -self.__ask_prices[-1]
+        asks = self.__asks
+        best_ask = asks.best_level()
 
         while (
             order.remaining_volume > 0
-            and best_ask <= order.price
-            and self.__total_volumes[best_ask] > 0
+            and best_ask.price <= order.price
+            and best_ask.total_volume > 0
         ):
             self.trade_level(now, order, best_ask)
-            if self.__total_volumes[best_ask] == 0:
-                del self.__levels[best_ask]
-                del self.__total_volumes[best_ask]
-                self.__ask_prices.pop()
-                if not self.__ask_prices:
+            if best_ask.total_volume == 0:
+                asks.remove_level(best_ask)
+                best_ask = asks.best_level()
+                if best_ask is None:
                     break
-                best_ask = -self.__ask_prices[-1]
 
-    def trade_level(self, now: float, order: Order, best_price: int) -> None:
+        self.__trade_complete(now)
+
+    def __trade_complete(self, now: float) -> None:
+        """Deliver aggregated fills and signal that an order has traded."""
+        if self.__fills:
+            fills = self.__fills
+            self.__fills = list()
+            grouped: Dict[IOrderListener, List[Tuple]] = dict()
+            for listener, order, price, volume, fee in fills:
+                if listener in grouped:
+                    grouped[listener].append((order, price, volume, fee))
+                else:
+                    grouped[listener] = [(order, price, volume, fee)]
+            for listener, listener_fills in grouped.items():
+                listener.on_orders_filled(now, listener_fills)
+
+        if self.__in_batch:
+            self.__batch_traded = True
+        else:
+            for callback in self.trade_occurred:
+                callback(self)
+
+    def trade_level(self, now: float, order: Order, level: PriceLevel) -> None:
         """Match the specified order with existing orders at the given level."""
+        best_price: int = level.price
         remaining: int = order.remaining_volume
-        order_queue: Deque[Order] = self.__levels[best_price]
-        total_volume: int = self.__total_volumes[best_price]
+        total_volume: int = level.total_volume
 
         while remaining > 0 and total_volume > 0:
-            while order_queue[0].remaining_volume == 0:
-                order_queue.popleft()
-            passive: Order = order_queue[0]
+            passive: Order = level.head
             volume: int = (
                 remaining
                 if remaining < passive.remaining_volume
@@ -324,28 +746,62 @@ class OrderBook(object):
             remaining -= volume
             passive.remaining_volume -= volume
             passive.total_fees += fee
-            if passive.listener:
-                passive.listener.on_order_filled(now, passive, best_price, volume, fee)
+            if passive.remaining_volume == 0:
+                level.remove(passive)
+            listener = passive.listener
+            if listener:
+                if listener.aggregate_fills:
+                    self.__fills.append((listener, passive, best_price, volume, fee))
+                else:
+                    listener.on_order_filled(now, passive, best_price, volume, fee)
 
-        self.__total_volumes[best_price] = total_volume
+        if order.side == Side.BUY:
+            self.__asks.adjust_volume(level, total_volume - level.total_volume)
+        else:
+            self.__bids.adjust_volume(level, total_volume - level.total_volume)
+        self.version += 1
         traded_volume_at_this_level: int = order.remaining_volume - remaining
 
         if order.side == Side.BUY:
-            self.__ask_ticks[best_price] += traded_volume_at_this_level
+            ticks = self.__ask_ticks
+            if best_price in ticks:
+                ticks[best_price] += traded_volume_at_this_level
+            else:
+                self.__add_tick(
+                    ticks,
+                    self.__ask_tick_keys,
+                    1,
+                    best_price,
+                    traded_volume_at_this_level,
+                )
         else:
-            self.__bid_ticks[best_price] += traded_volume_at_this_level
+            ticks = self.__bid_ticks
+            if best_price in ticks:
+                ticks[best_price] += traded_volume_at_this_level
+            else:
+                self.__add_tick(
+                    ticks,
+                    self.__bid_tick_keys,
+                    -1,
+                    best_price,
+                    traded_volume_at_this_level,
+                )
 
         fee: int = round(best_price * traded_volume_at_this_level * self.taker_fee)
         order.remaining_volume = remaining
         order.total_fees += fee
-        if order.listener:
-            order.listener.on_order_filled(
-                now, order, best_price, traded_volume_at_this_level, fee
-            )
+        listener = order.listener
+        if listener:
+            if listener.aggregate_fills:
+                self.__fills.append(
+                    (listener, order, best_price, traded_volume_at_this_level, fee)
+                )
+            else:
+                listener.on_order_filled(
+                    now, order, best_price, traded_volume_at_this_level, fee
+                )
 
         self.__last_traded_price = best_price
-        for callback in self.trade_occurred:
-            callback(self)
 
     def trade_ticks(
         self,
@@ -355,60 +811,93 @@ class OrderBook(object):
         bid_volumes: List[int],
     ) -> bool:
         """Return True and populate the lists if there have been trades."""
-        if self.__ask_ticks or self.__bid_ticks:
-            prices = sorted(self.__ask_ticks.keys())[:TOP_LEVEL_COUNT]
-            volumes = tuple(self.__ask_ticks[p] for p in prices)
-            ask_prices[:] = prices + [0] * (TOP_LEVEL_COUNT - len(prices))
-            ask_volumes[:] = volumes + (0,) * (TOP_LEVEL_COUNT - len(volumes))
-
-            prices = sorted(self.__bid_ticks.keys(), reverse=True)[:TOP_LEVEL_COUNT]
-            volumes = tuple(self.__bid_ticks[p] for p in prices)
-            bid_prices[:] = prices + [0] * (TOP_LEVEL_COUNT - len(prices))
-            bid_volumes[:] = volumes + (0,) * (TOP_LEVEL_COUNT - len(volumes))
-
-            self.__ask_ticks.clear()
-            self.__bid_ticks.clear()
-
+        if self.__ask_tick_keys or self.__bid_tick_keys:
+            self.__fill_ticks(
+                self.__ask_ticks, self.__ask_tick_keys, 1, ask_prices, ask_volumes
+            )
+            self.__fill_ticks(
+                self.__bid_ticks, self.__bid_tick_keys, -1, bid_prices, bid_volumes
+            )
             return True
 
         return False
 
+    @staticmethod
+    def __add_tick(
+        ticks: Dict[int, int], keys: List[int], sign: int, price: int, volume: int
+    ) -> None:
+        """Start aggregating trade ticks at a price not seen since the last
+        publish.
+
+        Only the best TOP_LEVEL_COUNT prices are kept, ordered by sign * price
+        (sign is 1 for ask ticks and -1 for bid ticks). A price that
+        does not make the cut can never rejoin it before the next publish, so
+        it is simply dropped.
+        """
+        key: int = sign * price
+        if len(keys) < TOP_LEVEL_COUNT:
+            insort(keys, key)
+        elif key < keys[-1]:
+            del ticks[sign * keys.pop()]
+            insort(keys, key)
+        else:
+            return
+        ticks[price] = volume
+
+    @staticmethod
+    def __fill_ticks(
+        ticks: Dict[int, int],
+        keys: List[int],
+        sign: int,
+        prices: List[int],
+        volumes: List[int],
+    ) -> None:
+        """Copy the aggregated ticks into the given lists and reset them."""
+        i: int = 0
+        for key in keys:
+            price: int = sign * key
+            prices[i] = price
+            volumes[i] = ticks[price]
+            i += 1
+        while i < TOP_LEVEL_COUNT:
+            prices[i] = volumes[i] = 0
+            i += 1
+        keys.clear()
+        ticks.clear()
+
     def try_trade(self, side: Side, limit_price: int, volume: int) -> Tuple[int, int]:
         """Return the volume that would trade and the average price per lot for
         the requested trade without changing the order book.
         """
-        total_volume: int = 0
-        total_value: int = 0
-
-        if side == Side.ASK:
-            i = len(self.__bid_prices) - 1
-            while (
-                total_volume < volume
-                and i >= 0
-                and self.__bid_prices[i]
-                and self.__bid_prices[i] >= limit_price
-            ):
-                price: int = self.__bid_prices[i]
-                available: int = self.__total_volumes[price]
-                required: int = volume - total_volume
-                weight: int = required if required <= available else available
-                total_volume += weight
-                total_value += weight * price
-                i -= 1
-        else:
-            i = len(self.__ask_prices) - 1
-            while (
-                total_volume < volume
-                and i >= 0
-                and -self.__ask_prices[i]
-                and -self.__ask_prices[i] <= limit_price
-            ):
-                price: int = -self.__ask_prices[i]
-                available: int = self.__total_volumes[price]
-                required: int = volume - total_volume
-                weight: int = required if required <= available else available
-                total_volume += weight
-                total_value += weight * price
-                i -= 1
-
+        book_side = self.__bids if side == Side.ASK else self.__asks
+        total_volume, total_value = book_side.sweep(limit_price, volume)
         return total_volume, total_value // total_volume if total_volume > 0 else 0
+
+
+class OrderBookFactory:
+    """A factory class for OrderBooks."""
+
+    def __init__(self, typ: str, tick_size: float):
+        """Initialise a new instance of the OrderBookFactory class.
+
+        The type may be "sorted", which keeps the price levels in sorted
+        lists, or "ladder", which keeps them in tick-indexed arrays.
+        """
+        if typ not in ORDER_BOOK_TYPES:
+            raise ValueError("unknown order book type: %s" % typ)
+        self.typ: str = typ
+        self.tick_size: int = int(tick_size * 100.0)  # convert tick size to cents
+
+    def create(
+        self, instrument: Instrument, maker_fee: float, taker_fee: float
+    ) -> OrderBook:
+        """Return a new instance of the OrderBook class."""
+        if self.typ == "ladder":
+            return OrderBook(
+                instrument,
+                maker_fee,
+                taker_fee,
+                LadderBookSide(Side.SELL, self.tick_size),
+                LadderBookSide(Side.BUY, self.tick_size),
+            )
+        return OrderBook(instrument, maker_fee, taker_fee)
@@ -0,0 +1,498 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+from bisect import bisect, insort_left
+
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .types import Side
+
+
+# Number of ticks a ladder starts with and the most it is allowed to span
+MINIMUM_LADDER_SIZE = 1024
+MAXIMUM_LADDER_SIZE = 1 << 16
+
+
+class LevelView(NamedTuple):
+    """An immutable copy of a price level.
+
+    The orders are given as (client order id, remaining volume) pairs in
+    time priority.
+    """
+
+    price: int
+    volume: int
+    orders: Tuple[Tuple[int, int], ...]
+
+
+class PriceLevel(object):
+    """The orders resting at a single price on one side of an order book.
+
+    Orders are kept in time priority in an intrusive doubly-linked list (using
+    the next_order and prev_order slots of each order) so that any order can
+    be removed as soon as it is cancelled or fully amended away.
+    """
+
+    __slots__ = ("cached_view", "head", "price", "tail", "total_volume")
+
+    def __init__(self, price: int):
+        """Initialise a new instance of the PriceLevel class."""
+        self.cached_view: Optional[LevelView] = None
+        self.head = None
+        self.price: int = price
+        self.tail = None
+        self.total_volume: int = 0
+
+    def __iter__(self) -> Iterator:
+        """Return an iterator over the orders at this level in time priority."""
+        order = self.head
+        while order is not None:
+            yield order
+            order = order.next_order
+
+    def append(self, order) -> None:
+        """Add an order to the back of the queue."""
+        self.cached_view = None
+        tail = self.tail
+        order.prev_order = tail
+        order.next_order = None
+        if tail is None:
+            self.head = order
+        else:
+            tail.next_order = order
+        self.tail = order
+
+    def remove(self, order) -> None:
+        """Unlink an order from the queue."""
+        self.cached_view = None
+        prev_order = order.prev_order
+        next_order = order.next_order
+        if prev_order is None:
+            self.head = next_order
+        else:
+            prev_order.next_order = next_order
+        if next_order is None:
+            self.tail = prev_order
+        else:
+            next_order.prev_order = prev_order
+        order.next_order = order.prev_order = None
+
+    def view(self) -> LevelView:
+        """Return an immutable view of this level.
+
+        The view is kept until the level next changes, so that unchanged
+        levels are shared between book snapshots.
+        """
+        if self.cached_view is None:
+            self.cached_view = LevelView(
+                self.price,
+                self.total_volume,
+                tuple((o.client_order_id, o.remaining_volume) for o in self),
+            )
+        return self.cached_view
+
+
+class DepthIndex(object):
+    """Cumulative volume and value of a run of price levels.
+
+    The volume and value (volume multiplied by price) at each position are
+    held in a pair of Fenwick trees so that both updates and prefix sums take
+    logarithmic time.
+    """
+
+    __slots__ = ("size", "values", "volumes")
+
+    def __init__(self, size: int):
+        """Initialise a new instance of the DepthIndex class."""
+        self.size: int = size
+        self.values: List[int] = [0] * (size + 1)
+        self.volumes: List[int] = [0] * (size + 1)
+
+    def add(self, position: int, volume: int, value: int) -> None:
+        """Add volume and value at the given position."""
+        size: int = self.size
+        values: List[int] = self.values
+        volumes: List[int] = self.volumes
+        i: int = position + 1
+        while i <= size:
+            volumes[i] += volume
+            values[i] += value
+            i += i & -i
+
+    def prefix(self, position: int) -> Tuple[int, int]:
+        """Return the total volume and value from the start up to a position."""
+        values: List[int] = self.values
+        volumes: List[int] = self.volumes
+        total_volume: int = 0
+        total_value: int = 0
+        i: int = position + 1
+        while i > 0:
+            total_volume += volumes[i]
+            total_value += values[i]
+            i -= i & -i
+        return total_volume, total_value
+
+    def search(self, volume: int) -> int:
+        """Return the first position at which the total volume reaches the
+        given volume, or the size of the index if it never does.
+        """
+        size: int = self.size
+        volumes: List[int] = self.volumes
+        position: int = 0
+        step: int = 1 << (size.bit_length() - 1)
+        while step:
+            i = position + step
+            if i <= size and volumes[i] < volume:
+                position = i
+                volume -= volumes[i]
+            step >>= 1
+        return position
+
+
+class BookSide(object):
+    """The price levels on one side of an order book."""
+
+    def __init__(self, side: Side):
+        """Initialise a new instance of the BookSide class."""
+        self.side: Side = side
+
+    def __len__(self) -> int:
+        """Return the number of price levels on this side."""
+        raise NotImplementedError()
+
+    def add_level(self, price: int) -> PriceLevel:
+        """Create and return an empty level for a price not already present."""
+        raise NotImplementedError()
+
+    def adjust_volume(self, level: PriceLevel, volume: int) -> None:
+        """Add the given (possibly negative) volume to a level on this side."""
+        level.cached_view = None
+        level.total_volume += volume
+
+    def best_level(self) -> Optional[PriceLevel]:
+        """Return the best price level, or None if this side is empty."""
+        raise NotImplementedError()
+
+    def get_level(self, price: int) -> Optional[PriceLevel]:
+        """Return the level at the given price, or None if there isn't one."""
+        raise NotImplementedError()
+
+    def levels(self) -> Iterator[PriceLevel]:
+        """Return an iterator over the levels on this side, best price first."""
+        raise NotImplementedError()
+
+    def remove_level(self, level: PriceLevel) -> None:
+        """Remove the given level from this side."""
+        raise NotImplementedError()
+
+    def sweep(self, limit_price: int, volume: int) -> Tuple[int, int]:
+        """Return the volume and total value of the levels that an order for
+        the given volume and limit price would trade against.
+        """
+        is_bid: bool = self.side == Side.BUY
+        total_volume: int = 0
+        total_value: int = 0
+        for level in self.levels():
+            if total_volume >= volume or (
+                level.price < limit_price if is_bid else level.price > limit_price
+            ):
+                break
+            available: int = level.total_volume
+            required: int = volume - total_volume
+            weight: int = required if required <= available else available
+            total_volume += weight
+            total_value += weight * level.price
+        return total_volume, total_value
+
+
+class SortedBookSide(BookSide):
+    """Price levels kept in a bisect-sorted list of prices.
+
+    Prices are stored so that the best price is always at the end of the
+    list (ask prices are negated).
+    """
+
+    def __init__(self, side: Side):
+        """Initialise a new instance of the SortedBookSide class."""
+        super().__init__(side)
+        self.__keys: List[int] = []
+        self.__levels: Dict[int, PriceLevel] = {}
+        self.__sign: int = -1 if side == Side.SELL else 1
+
+    def __len__(self) -> int:
+        """Return the number of price levels on this side."""
+        return len(self.__keys)
+
+    def add_level(self, price: int) -> PriceLevel:
+        """Create and return an empty level for a price not already present."""
+        level = self.__levels[price] = PriceLevel(price)
+        insort_left(self.__keys, self.__sign * price)
+        return level
+
+    def best_level(self) -> Optional[PriceLevel]:
+        """Return the best price level, or None if this side is empty."""
+        if self.__keys:
+            return self.__levels[self.__sign * self.__keys[-1]]
+        return None
+
+    def get_level(self, price: int) -> Optional[PriceLevel]:
+        """Return the level at the given price, or None if there isn't one."""
+        return self.__levels.get(price)
+
+    def levels(self) -> Iterator[PriceLevel]:
+        """Return an iterator over the levels on this side, best price first."""
+        levels = self.__levels
+        sign = self.__sign
+        return (levels[sign * k] for k in reversed(self.__keys))
+
+    def remove_level(self, level: PriceLevel) -> None:
+        """Remove the given level from this side."""
+        del self.__levels[level.price]
+        key = self.__sign * level.price
+        if self.__keys[-1] == key:
+            self.__keys.pop()
+        else:
+            self.__keys.pop(bisect(self.__keys, key) - 1)
+
+
+class LadderBookSide(BookSide):
+    """Price levels kept in a dense array indexed by tick.
+
+    The ladder covers a window of prices that is re-centred (and grown) when
+    a price falls outside of it. Prices which are not a multiple of the tick
+    size, or which would stretch the window beyond MAXIMUM_LADDER_SIZE ticks,
+    are kept in a SortedBookSide instead.
+
+    A DepthIndex over the ladder, ordered from the best possible price
+    outward, allows sweeps to be calculated in logarithmic time.
+    """
+
+    def __init__(self, side: Side, tick_size: int):
+        """Initialise a new instance of the LadderBookSide class."""
+        super().__init__(side)
+        self.__base: int = 0
+        self.__best: int = -1
+        self.__count: int = 0
+        self.__depth: DepthIndex = DepthIndex(MINIMUM_LADDER_SIZE)
+        self.__is_bid: bool = side == Side.BUY
+        self.__outliers: SortedBookSide = SortedBookSide(side)
+        self.__slots: List[Optional[PriceLevel]] = [None] * MINIMUM_LADDER_SIZE
+        self.__tick_size: int = tick_size
+
+    def __len__(self) -> int:
+        """Return the number of price levels on this side."""
+        return self.__count + len(self.__outliers)
+
+    def __index(self, price: int) -> int:
+        """Return the ladder index of the given price, or -1 if not in the window."""
+        offset: int = price - self.__base
+        if offset < 0 or offset % self.__tick_size:
+            return -1
+        index: int = offset // self.__tick_size
+        return index if index < len(self.__slots) else -1
+
+    def __recentre(self, price: int) -> bool:
+        """Try to move the window so that it covers the given price."""
+        tick_size: int = self.__tick_size
+        if price % tick_size:
+            return False
+
+        low: int = price
+        high: int = price
+        if self.__count:
+            live = [level for level in self.__slots if level is not None]
+            low = min(low, live[0].price)
+            high = max(high, live[-1].price)
+        else:
+            live = []
+
+        span: int = (high - low) // tick_size + 1
+        if span > MAXIMUM_LADDER_SIZE:
+            return False
+
+        size: int = MINIMUM_LADDER_SIZE
+        while size < 2 * span and size < MAXIMUM_LADDER_SIZE:
+            size *= 2
+
+        self.__base = low - ((size - span) // 2) * tick_size
+        self.__slots = slots = [None] * size
+        for level in live:
+            slots[(level.price - self.__base) // tick_size] = level
+
+        # Outliers which are covered by the new window move into the ladder
+        for level in tuple(self.__outliers.levels()):
+            index = self.__index(level.price)
+            if index >= 0:
+                self.__outliers.remove_level(level)
+                slots[index] = level
+                self.__count += 1
+                live.append(level)
+        live.sort(key=lambda lvl: lvl.price)
+
+        self.__depth = depth = DepthIndex(size)
+        for level in live:
+            index = (level.price - self.__base) // tick_size
+            depth.add(
+                size - 1 - index if self.__is_bid else index,
+                level.total_volume,
+                level.total_volume * level.price,
+            )
+
+        if live:
+            best = live[-1] if self.__is_bid else live[0]
+            self.__best = (best.price - self.__base) // tick_size
+
+        return True
+
+    def add_level(self, price: int) -> PriceLevel:
+        """Create and return an empty level for a price not already present."""
+        index: int = self.__index(price)
+        if index < 0:
+            if not self.__recentre(price):
+                return self.__outliers.add_level(price)
+            index = (price - self.__base) // self.__tick_size
+
+        level = self.__slots[index] = PriceLevel(price)
+        self.__count += 1
+        best: int = self.__best
+        if best < 0 or (index > best if self.__is_bid else index < best):
+            self.__best = index
+        return level
+
+    def adjust_volume(self, level: PriceLevel, volume: int) -> None:
+        """Add the given (possibly negative) volume to a level on this side."""
+        level.cached_view = None
+        level.total_volume += volume
+        index: int = self.__index(level.price)
+        if index >= 0:
+            self.__depth.add(
+                len(self.__slots) - 1 - index if self.__is_bid else index,
+                volume,
+                volume * level.price,
+            )
+
+    def best_level(self) -> Optional[PriceLevel]:
+        """Return the best price level, or None if this side is empty."""
+        level = self.__slots[self.__best] if self.__count else None
+        if self.__outliers:
+            outlier = self.__outliers.best_level()
+            if (
+                level is None
+                or (self.__is_bid and outlier.price > level.price)
+                or (not self.__is_bid and outlier.price < level.price)
+            ):
+                return outlier
+        return level
+
+    def get_level(self, price: int) -> Optional[PriceLevel]:
+        """Return the level at the given price, or None if there isn't one."""
+        index: int = self.__index(price)
+        if index >= 0:
+            return self.__slots[index]
+        return self.__outliers.get_level(price)
+
+    def __ladder_levels(self) -> Iterator[PriceLevel]:
+        """Return an iterator over the levels in the ladder, best price first."""
+        if not self.__count:
+            return
+        slots = self.__slots
+        remaining: int = self.__count
+        i: int = self.__best
+        step: int = -1 if self.__is_bid else 1
+        while remaining:
+            level = slots[i]
+            if level is not None:
+                yield level
+                remaining -= 1
+            i += step
+
+    def levels(self) -> Iterator[PriceLevel]:
+        """Return an iterator over the levels on this side, best price first."""
+        if not self.__outliers:
+            yield from self.__ladder_levels()
+            return
+
+        # Merge the ladder with the outliers, both of which are in price order
+        is_bid: bool = self.__is_bid
+        others = self.__outliers.levels()
+        other = next(others, None)
+        for level in self.__ladder_levels():
+            while other is not None and (
+                other.price > level.price if is_bid else other.price < level.price
+            ):
+                yield other
+                other = next(others, None)
+            yield level
+        while other is not None:
+            yield other
+            other = next(others, None)
+
+    def remove_level(self, level: PriceLevel) -> None:
+        """Remove the given level from this side."""
+        index: int = self.__index(level.price)
+        if index < 0 or self.__slots[index] is not level:
+            self.__outliers.remove_level(level)
+            return
+
+        slots = self.__slots
+        slots[index] = None
+        self.__count -= 1
+        if not self.__count:
+            self.__best = -1
+        elif index == self.__best:
+            if self.__is_bid:
+                index -= 1
+                while slots[index] is None:
+                    index -= 1
+            else:
+                index += 1
+                while slots[index] is None:
+                    index += 1
+            self.__best = index
+
+    def sweep(self, limit_price: int, volume: int) -> Tuple[int, int]:
+        """Return the volume and total value of the levels that an order for
+        the given volume and limit price would trade against.
+        """
+        if self.__outliers:
+            return BookSide.sweep(self, limit_price, volume)
+
+        base: int = self.__base
+        size: int = len(self.__slots)
+        tick_size: int = self.__tick_size
+
+        # Find the position in the depth index of the last level within the limit
+        if self.__is_bid:
+            index = -((base - limit_price) // tick_size)
+            if index >= size:
+                return 0, 0
+            last = size - 1 - (index if index > 0 else 0)
+        else:
+            index = (limit_price - base) // tick_size
+            if index < 0:
+                return 0, 0
+            last = index if index < size else size - 1
+
+        depth: DepthIndex = self.__depth
+        available, value = depth.prefix(last)
+        if available <= volume:
+            return available, value
+
+        position: int = depth.search(volume)
+        before, value = depth.prefix(position - 1)
+        index = size - 1 - position if self.__is_bid else position
+        return volume, value + (volume - before) * (base + index * tick_size)
@@ -17,7 +17,6 @@
 #     <https://www.gnu.org/licenses/>.
 import asyncio
 import logging
-import time
 import random
 
 from typing import Any, Callable, List, Optional
@@ -26,10 +25,15 @@ from typing import Any, Callable, List, Optional
 class Timer:
     """A timer."""
 
-    def __init__(self, tick_interval: float, speed: float):
-        """Initialise a new instance of the timer class."""
+    def __init__(self, tick_interval: float, speed: float, seed: Optional[int] = None):
+        """Initialise a new instance of the timer class.
+
+        Times are taken from the event loop's clock. The seed, if given, makes
+        the jitter applied to each tick reproducible.
+        """
         self.__event_loop: Optional[asyncio.AbstractEventLoop] = None
         self.__logger: logging.Logger = logging.getLogger("TIMER")
+        self.__random: random.Random = random.Random(seed)
         self.__speed: float = speed
         self.__start_time: float = 0.0
         self.__tick_timer_handle: Optional[asyncio.TimerHandle] = None
@@ -43,13 +47,13 @@ class Timer:
     def advance(self) -> float:
         """Advance the timer."""
         if self.__start_time:
-            now = (time.monotonic() - self.__start_time) * self.__speed
+            now = (self.__event_loop.time() - self.__start_time) * self.__speed
             return now
         return 0.0
 
     def __on_timer_tick(self, tick_time: float, tick_number: int):
         """Called on each timer tick."""
-        now = (time.monotonic() - self.__start_time) * self.__speed
+        now = (self.__event_loop.time() - self.__start_time) * self.__speed
 
         # There may have been a delay, so work out which tick this really is
         # We also need to prevent "skipping" ticks backwards due to negative random jitter
@@ -65,7 +69,7 @@ class Timer:
 
         # Generate random jitter, which can be +/- 20% of standard tick interval
         limit = self.__tick_interval * 0.2
-        jitter = random.uniform(-limit, +limit) / self.__speed
+        jitter = self.__random.uniform(-limit, +limit) / self.__speed
 
         self.__tick_timer_handle = self.__event_loop.call_at(
             self.__start_time + jitter + tick_time / self.__speed,
@@ -74,13 +78,29 @@ class Timer:
             tick_number + 1,
         )
 
-    def start(self) -> None:
-        """Start this timer."""
+    def start(self, elapsed: float = 0.0) -> None:
+        """Start this timer.
+
+        If elapsed is given, the timer starts as if that much (simulated) time
+        had already passed. A timer with a tick interval of zero does not tick
+        and serves only as a clock (see advance and schedule).
+        """
         self.__event_loop = asyncio.get_running_loop()
-        self.__start_time = time.monotonic()
+        self.__start_time = self.__event_loop.time() - elapsed / self.__speed
         for callback in self.timer_started:
             callback(self, self.__start_time)
-        self.__on_timer_tick(0.0, 1)
+        if self.__tick_interval > 0.0:
+            self.__on_timer_tick(0.0, 1)
+
+    def schedule(
+        self, elapsed: float, callback: Callable[..., Any], *args: Any
+    ) -> asyncio.TimerHandle:
+        """Arrange for the callback to be called when the given amount of
+        (simulated) time has elapsed.
+        """
+        return self.__event_loop.call_at(
+            self.__start_time + elapsed / self.__speed, callback, *args
+        )
 
     def shutdown(self, now: float, reason: str) -> None:
         """Shut down this timer."""
@@ -26,6 +26,7 @@ from typing import Any, Dict
 
 from .application import Application
 from .base_auto_trader import BaseAutoTrader
+from .messages import EXECUTION_TYPES
 from .pubsub import SubscriberFactory
 
 
@@ -51,6 +52,25 @@ def __validate_json_object(config, section, required_keys, value_types):
         raise Exception("Element of inappropriate type in %s configuration" % section)
 
 
+def __validate_execution(config):
+    execution = config["Execution"]
+    if type(execution) is not dict:
+        raise Exception("Execution configuration should be a JSON object")
+    if type(execution.get("Type", "tcp")) is not str:
+        raise Exception("Element of inappropriate type in Execution configuration")
+    if execution.get("Type", "tcp") not in EXECUTION_TYPES:
+        raise Exception(
+            "Execution.Type must be one of: %s" % ", ".join(EXECUTION_TYPES)
+        )
+    if execution.get("Type", "tcp") == "unix":
+        if not hasattr(socket, "AF_UNIX"):
+            raise Exception("Unix domain sockets are not supported on this platform")
+        __validate_json_object(config, "Execution", ("Path",), (str,))
+    else:
+        __validate_json_object(config, "Execution", ("Host", "Port"), (str, int))
+        __validate_hostname(config, "Execution", "Host")
+
+
 def __config_validator(config):
     """Return True if the specified config is valid, otherwise raise an exception."""
     if type(config) is not dict:
@@ -58,11 +78,9 @@ def __config_validator(config):
     if any(k not in config for k in ("Execution", "Information", "TeamName", "Secret")):
         raise Exception("A required key is missing from the configuration")
 
-    __validate_json_object(config, "Execution", ("Host", "Port"), (str, int))
+    __validate_execution(config)
     __validate_json_object(config, "Information", ("Type", "Name"), (str, str))
 
-    __validate_hostname(config, "Execution", "Host")
-
     if type(config["TeamName"]) is not str:
         raise Exception("TeamName has inappropriate type")
     if len(config["TeamName"]) < 1 or len(config["TeamName"]) > 50:
@@ -88,7 +106,12 @@ async def __start_autotrader(
 
     exec_ = config["Execution"]
     try:
-        await loop.create_connection(lambda: auto_trader, exec_["Host"], exec_["Port"])
+        if exec_.get("Type", "tcp") == "unix":
+            await loop.create_unix_connection(lambda: auto_trader, exec_["Path"])
+        else:
+            await loop.create_connection(
+                lambda: auto_trader, exec_["Host"], exec_["Port"]
+            )
     except OSError as e:
         logger.error("execution connection failed: %s", e.strerror)
         loop.stop()
@@ -17,6 +17,8 @@
 #     <https://www.gnu.org/licenses/>.
 import enum
 
+from typing import Any, Callable
+
 
 class Instrument(enum.IntEnum):
     FUTURE = 0
@@ -43,6 +45,15 @@ class Lifespan(enum.IntEnum):
     G = GOOD_FOR_DAY
 
 
+class MarketEventOperation(enum.IntEnum):
+    AMEND = 0
+    CANCEL = 1
+    INSERT = 2
+    Amend = AMEND
+    Cancel = CANCEL
+    Insert = INSERT
+
+
 class ICompetitor:
     def disconnect(self, now: float) -> None:
         """Disconnect this competitor."""
@@ -80,6 +91,16 @@ class IController:
         """Return the current time after accounting for events."""
         raise NotImplementedError()
 
+    def backlogged(self, now: float) -> bool:
+        """Return True if market events due before the given time are still
+        pending."""
+        raise NotImplementedError()
+
+    def call_in_order(self, now: float, callback: Callable[..., Any], *args) -> None:
+        """Call the callback once market events due before the given time have
+        been applied."""
+        raise NotImplementedError()
+
 
 class IExecutionConnection:
     def close(self):
@@ -13,6 +13,7 @@ class UnhedgedLots:
         """Initialise a new instance of the UnhedgedLots class."""
         self.callback: Callable[[], None] = callback
         self.relative_position: int = 0
+        self.resume_delay: Optional[float] = None
         self.timer_handle: Optional[asyncio.TimerHandle] = None
 
     @property
@@ -47,6 +48,31 @@ class UnhedgedLots:
 
         self.relative_position = new_relative_position
 
+    def remaining_time(self) -> Optional[float]:
+        """Return the number of seconds before the unhedged lots timer expires,
+        or None if there are no unhedged lots.
+        """
+        if self.unhedged_lot_count == 0 or self.timer_handle.cancelled():
+            return None
+        remaining = self.timer_handle.when() - asyncio.get_running_loop().time()
+        return remaining if remaining > 0.0 else 0.0
+
+    def restore(self, relative_position: int, remaining_time: Optional[float]) -> None:
+        """Restore the relative position and the time left on the timer.
+
+        The timer is not started until resume is called.
+        """
+        self.relative_position = relative_position
+        self.resume_delay = remaining_time
+
+    def resume(self) -> None:
+        """Start the unhedged lots timer, if one was restored."""
+        if self.resume_delay is not None:
+            self.timer_handle = asyncio.get_running_loop().call_later(
+                self.resume_delay, self.callback
+            )
+            self.resume_delay = None
+
 
 class UnhedgedLotsFactory:
     """A factory class for UnhedgedLots instances."""
@@ -0,0 +1,119 @@
+# Copyright 2021 Optiver Asia Pacific Pty. Ltd.
+#
+# This file is part of Ready Trader Go.
+#
+#     Ready Trader Go is free software: you can redistribute it and/or
+#     modify it under the terms of the GNU Affero General Public License
+#     as published by the Free Software Foundation, either version 3 of
+#     the License, or (at your option) any later version.
+#
+#     Ready Trader Go is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public
+#     License along with Ready Trader Go.  If not, see
+#     <https://www.gnu.org/licenses/>.
+import asyncio
+import selectors
+import time
+
+from typing import List, Optional, Tuple
+
+# Wall-clock seconds to wait for auto-traders to send something before the
+# virtual clock moves on
+DEFAULT_IDLE_TIME = 0.005
+
+
+class VirtualClockSelector(selectors.DefaultSelector):
+    """A selector which, once its event loop's clock is virtual, waits only
+    briefly for input and then moves the clock on to the time of the next
+    scheduled callback.
+    """
+
+    def __init__(self, idle_time: float):
+        """Initialise a new instance of the VirtualClockSelector class."""
+        super().__init__()
+        self.event_loop: Optional[VirtualClockEventLoop] = None
+        self.idle_time: float = idle_time
+
+    def select(
+        self, timeout: Optional[float] = None
+    ) -> List[Tuple[selectors.SelectorKey, int]]:
+        """Wait for input, jumping the virtual clock forward by the timeout
+        if there is none.
+
+        If anything has been sent to the auto-traders since the last wait,
+        they are given the idle time to respond before the clock jumps.
+        """
+        loop = self.event_loop
+        if loop is None or not loop.is_virtual() or timeout is None or timeout <= 0.0:
+            return super().select(timeout)
+
+        events = super().select(self.idle_time if loop.take_output() else 0.0)
+        if events:
+            # Handling the input may produce output in turn
+            loop.notify_output()
+        else:
+            loop.jump(timeout)
+        return events
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """An event loop with a clock that can be switched to virtual time.
+
+    Until start_virtual_time is called the loop behaves like any other. From
+    then on its clock stands still while there is work to do and then jumps
+    straight to the next scheduled callback (such as a market event, timer
+    tick or unhedged lots deadline). Whenever notify_output has been called
+    since the last jump, the clock first waits until the auto-traders have
+    been quiet for the idle time. A match then runs as fast as the simulator
+    and auto-traders can process it and its outcome does not depend on the
+    speed of the machine.
+    """
+
+    def __init__(self, idle_time: float = DEFAULT_IDLE_TIME):
+        """Initialise a new instance of the VirtualClockEventLoop class."""
+        self.__now: float = 0.0
+        self.__output: bool = False
+        self.__virtual: bool = False
+        self.jump_count: int = 0
+        self.skipped_time: float = 0.0
+
+        selector = VirtualClockSelector(idle_time)
+        super().__init__(selector)
+        selector.event_loop = self
+
+    def is_virtual(self) -> bool:
+        """Return True if the clock is running in virtual time."""
+        return self.__virtual
+
+    def jump(self, seconds: float) -> None:
+        """Move the virtual clock forward by the given number of seconds."""
+        self.__now += seconds
+        self.jump_count += 1
+        self.skipped_time += seconds
+
+    def notify_output(self) -> None:
+        """Note that something has been sent to the auto-traders, which must
+        be given time to respond before the clock next jumps.
+        """
+        self.__output = True
+
+    def take_output(self) -> bool:
+        """Return True, and clear the note, if notify_output has been called
+        since this method was last called.
+        """
+        output, self.__output = self.__output, False
+        return output
+
+    def start_virtual_time(self) -> None:
+        """Switch the clock to virtual time, starting from the current time."""
+        if not self.__virtual:
+            self.__now = time.monotonic()
+            self.__virtual = True
+
+    def time(self) -> float:
+        """Return the time according to the event loop's clock."""
+        return self.__now if self.__virtual else time.monotonic()
@@ -24,7 +24,10 @@ import time
 import traceback
 import os
 
+import ready_trader_go.checkpoint
 import ready_trader_go.exchange
+import ready_trader_go.market_data
+import ready_trader_go.market_generator
 import ready_trader_go.trader
 
 try:
@@ -33,6 +36,44 @@ except ImportError:
     hud_main = hud_replay = None
 
 
+def convert(args) -> None:
+    """Convert market data files from CSV to binary."""
+    for path in args.filenames:
+        if not path.is_file():
+            print("'%s' is not a regular file" % str(path), file=sys.stderr)
+            continue
+
+        output = ready_trader_go.market_data.convert_market_data_file(path)
+        print("converted '%s' to '%s'" % (str(path), str(output)))
+
+
+def generate(args) -> None:
+    """Generate a market data file of random market events."""
+    try:
+        generator = ready_trader_go.market_generator.MarketDataGenerator(
+            args.rate, args.depth, args.cancel_ratio, args.volatility, args.seed
+        )
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return
+
+    ready_trader_go.market_generator.generate_market_data_file(
+        args.filename, args.events, generator
+    )
+    print("generated %d market events in '%s'" % (args.events, str(args.filename)))
+
+
+def index(args) -> None:
+    """Build the index files of market data files."""
+    for path in args.filenames:
+        if not path.is_file():
+            print("'%s' is not a regular file" % str(path), file=sys.stderr)
+            continue
+
+        output = ready_trader_go.checkpoint.build_market_index(str(path), args.interval)
+        print("indexed '%s' in '%s'" % (str(path), output))
+
+
 def no_heads_up_display() -> None:
     print(
         "Cannot run the Ready Trader Go heads-up display. This could\n"
@@ -150,6 +191,96 @@ def main() -> None:
     )
     replay_parser.set_defaults(func=replay)
 
+    convert_parser = subparsers.add_parser(
+        "convert",
+        aliases=["co"],
+        description=(
+            "Convert market data files from CSV to the binary format, which"
+            " the exchange simulator reads when the MarketDataFile setting"
+            " ends in '.bin'."
+        ),
+        help="convert market data files to binary",
+    )
+    convert_parser.add_argument(
+        "filenames",
+        nargs="+",
+        help="names of the market data files to convert",
+        type=pathlib.Path,
+    )
+    convert_parser.set_defaults(func=convert)
+
+    gen_parser = subparsers.add_parser(
+        "gen",
+        aliases=["ge"],
+        description=(
+            "Generate a market data file of random market events for load"
+            " testing. The file is binary if its name ends in '.bin', otherwise"
+            " CSV (compressed if its name ends in '.gz', '.xz' or '.bz2')."
+        ),
+        help="generate a market data file",
+    )
+    gen_parser.add_argument(
+        "--events",
+        default=1000000,
+        help="number of market events to generate (default %(default)s)",
+        type=int,
+    )
+    gen_parser.add_argument(
+        "--rate",
+        default=ready_trader_go.market_generator.DEFAULT_RATE,
+        help="market events per second of market time (default %(default)s)",
+        type=float,
+    )
+    gen_parser.add_argument(
+        "--depth",
+        default=ready_trader_go.market_generator.DEFAULT_DEPTH,
+        help="price levels either side of the midpoint (default %(default)s)",
+        type=int,
+    )
+    gen_parser.add_argument(
+        "--cancel-ratio",
+        default=ready_trader_go.market_generator.DEFAULT_CANCEL_RATIO,
+        help="share of events that cancel or amend orders (default %(default)s)",
+        type=float,
+    )
+    gen_parser.add_argument(
+        "--volatility",
+        default=ready_trader_go.market_generator.DEFAULT_VOLATILITY,
+        help="volatility of the midpoint per root second (default %(default)s)",
+        type=float,
+    )
+    gen_parser.add_argument(
+        "--seed", default=0, help="random seed (default %(default)s)", type=int
+    )
+    gen_parser.add_argument(
+        "filename", help="name of the market data file to write", type=pathlib.Path
+    )
+    gen_parser.set_defaults(func=generate)
+
+    index_parser = subparsers.add_parser(
+        "index",
+        aliases=["ix"],
+        description=(
+            "Build an index of market data files, which the exchange simulator"
+            " uses to start a match at the market time given by the StartTime"
+            " setting."
+        ),
+        help="index market data files",
+    )
+    index_parser.add_argument(
+        "--interval",
+        default=ready_trader_go.checkpoint.INDEX_INTERVAL,
+        help="market time in seconds between index entries (default %(default)s)",
+        type=float,
+    )
+    index_parser.add_argument(
+        "filenames",
+        nargs="+",
+        help="names of the market data files to index",
+        type=pathlib.Path,
+    )
+    index_parser.set_defaults(func=index)
+
     args = parser.parse_args()
     args.func(args)
 